@@ -1,19 +1,26 @@
 import os
-from flask import Flask
+from flask import Flask, jsonify, make_response
 from flask_cors import CORS
 from config import config_dict
+from helpers.compression import CompressionMiddleware, ContentDecodingError, DecompressedBodyTooLarge
+from helpers.json_provider import configure_json
 
 app = Flask(__name__)
 app.config.from_object(config_dict[os.getenv('APP_CONFIG', 'development')])
+# encode responses and decode request bodies with the fastest JSON library installed, unless configured otherwise
+configure_json(app)
 # add support for CORS for all end points
 CORS(app, resources={r"/*": {"origins": "*"}})
 
 # for removing trailing slashes enforcement
 app.url_map.strict_slashes = False
+# decompress request bodies and compress responses, as negotiated with Content-Encoding and Accept-Encoding
+app.wsgi_app = CompressionMiddleware(app.wsgi_app, app.config)
 
 from models.user import db
 from auth.views import auth_blueprint
 from hierarchy.views import hierarchy_blueprint
+from hierarchy.read_cache import warm_read_cache
 app.register_blueprint(auth_blueprint)
 app.register_blueprint(hierarchy_blueprint)
 
@@ -21,6 +28,18 @@ app.register_blueprint(hierarchy_blueprint)
 @app.before_first_request
 def create_tables():
     db.create_all()
+    # load the hierarchy read cache before the first request is served
+    warm_read_cache()
+
+
+@app.errorhandler(ContentDecodingError)
+@app.errorhandler(DecompressedBodyTooLarge)
+def content_decoding_error(error):
+    response = {
+        'status': 'fail',
+        'message': error.description
+    }
+    return make_response(jsonify(response)), error.code
 
 
 if __name__ == '__main__':
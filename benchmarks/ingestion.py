@@ -0,0 +1,147 @@
+import gc
+import json
+import time
+import tracemalloc
+from flask import current_app
+from benchmarks.org_generator import generate_org
+from helpers.validate import check_hierarchy_structure, decode_hierarchy, strip_names
+from hierarchy.operations import restructure_hierarchy
+from hierarchy.parse_hierarchy import compile_hierarchy
+from hierarchy.read_cache import read_cache
+from models.model_mixin import db
+
+
+def measure(stage, trace_memory, prepare=None):
+    """
+    Runs a benchmark stage and measures it. The wall time is measured on its own, since tracing memory allocations
+    slows the code down, and the peak memory is measured on a second, traced run
+    :param stage: callable to measure. Its return value is kept
+    :param trace_memory: bool. Whether to measure the peak memory
+    :param prepare: callable run, untimed, before each run of the stage
+    :return: tuple of the stage's return value, its wall time in seconds and its peak memory in bytes (or None)
+    """
+    if prepare:
+        prepare()
+    gc.collect()
+    start = time.perf_counter()
+    result = stage()
+    seconds = time.perf_counter() - start
+
+    peak_memory = None
+    if trace_memory:
+        if prepare:
+            prepare()
+        gc.collect()
+        tracemalloc.start()
+        stage()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, seconds, peak_memory
+
+
+def reset_database():
+    """
+    Empties the employee table, the hierarchy versions and the structures of every storage strategy, and drops the
+    read cache
+    """
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    read_cache.clear()
+
+
+def move_employees(hierarchy_dict, every=100):
+    """
+    Changes a hierarchy the way a new upload of the same organization usually does, by moving every so many
+    employees up to the supervisor of their supervisor
+    :param hierarchy_dict: dict. The flat {employee: supervisor} hierarchy
+    :param every: int. One employee out of every that many is moved
+    :return: the changed hierarchy: dict
+    """
+    moved = dict(hierarchy_dict)
+    for position, (employee, supervisor) in enumerate(hierarchy_dict.items()):
+        if position % every == 0 and supervisor in hierarchy_dict:
+            moved[employee] = hierarchy_dict[supervisor]
+    return moved
+
+
+def benchmark_ingestion(hierarchy_dict, trace_memory=True):
+    """
+    Benchmarks each stage of ingesting a posted hierarchy, the way the structure endpoint runs them. The hierarchy is
+    stored with restructure_hierarchy, both into an empty database and over a stored hierarchy which differs from it
+    in a few employees. The database stages run against the database the app is currently configured with, which
+    they empty
+    :param hierarchy_dict: dict. The flat {employee: supervisor} hierarchy
+    :param trace_memory: bool. Whether to measure the peak memory of each stage
+    :return: dict with the wall time, peak memory and rows per second of each stage
+    """
+    raw_data = json.dumps(hierarchy_dict).encode()
+    employees = len(hierarchy_dict) + 1
+    stages = {}
+
+    def record(name, stage, prepare=None):
+        result, seconds, peak_memory = measure(stage, trace_memory, prepare)
+        stages[name] = {
+            'seconds': seconds,
+            'peak_memory_bytes': peak_memory,
+            'rows_per_second': employees / seconds if seconds else None
+        }
+        return result
+
+    def store_previous_upload():
+        reset_database()
+        restructure_hierarchy(move_employees(decoded_dict))
+
+    decoded_dict, _ = record('decode', lambda: decode_hierarchy(raw_data))
+    record('validate_structure', lambda: check_hierarchy_structure(strip_names(decoded_dict)[0]))
+    record('compile', lambda: compile_hierarchy(decoded_dict, gap=current_app.config['HIERARCHY_GAP']))
+    record('restructure_empty', lambda: restructure_hierarchy(decoded_dict), reset_database)
+    record('restructure_populated', lambda: restructure_hierarchy(decoded_dict), store_previous_upload)
+    record('refresh_read_cache', read_cache.refresh)
+    reset_database()
+
+    return {
+        'employees': employees,
+        'payload_bytes': len(raw_data),
+        'total_seconds': sum(stage['seconds'] for stage in stages.values()),
+        'stages': stages
+    }
+
+
+def run_benchmarks(app, shapes, sizes, seed=0, database_uri='sqlite://', trace_memory=True):
+    """
+    Runs the ingestion benchmark on generated organizations of every shape and size. The database configuration of
+    the app is switched to database_uri for the duration of the run and restored afterwards. The tables of that
+    database are emptied, so it should not be a database in use. Maintenance runs inline during the run, so the read
+    cache refresh which follows each restructure doesn't overlap the next measurement. It is part of the restructure
+    stages, and is timed on its own as the refresh_read_cache stage
+    :param app: the Flask app
+    :param shapes: list of shapes, see benchmarks.org_generator.SHAPES
+    :param sizes: list of the number of employees of the generated organizations
+    :param seed: int. The seed for the generated organizations
+    :param database_uri: str. The database the restructure stages write to
+    :param trace_memory: bool. Whether to measure the peak memory of each stage
+    :return: dict of the machine readable results
+    """
+    previous_config = {key: app.config[key]
+                       for key in ('SQLALCHEMY_DATABASE_URI', 'SQLALCHEMY_ECHO', 'RUN_MAINTENANCE_IN_BACKGROUND')}
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_ECHO'] = False
+    app.config['RUN_MAINTENANCE_IN_BACKGROUND'] = False
+    results = []
+    try:
+        with app.app_context():
+            db.create_all()
+            for shape in shapes:
+                for size in sizes:
+                    result = benchmark_ingestion(generate_org(shape, size, seed), trace_memory)
+                    result['shape'] = shape
+                    results.append(result)
+            db.session.remove()
+    finally:
+        app.config.update(previous_config)
+    return {
+        'seed': seed,
+        'database': database_uri,
+        'results': results
+    }
@@ -0,0 +1,46 @@
+import random
+
+# the shapes of organization the generator can create
+SHAPES = ('flat', 'deep', 'balanced', 'random')
+
+
+def employee_name(number):
+    """
+    Gets the name of the generated employee with the given number
+    :param number: int. The number of the employee, 0 being the CEO
+    :return: name: str
+    """
+    return f'Employee {number:07d}'
+
+
+def generate_org(shape, size, seed=0, branching=8):
+    """
+    Generates a flat {employee: supervisor} hierarchy, as it would be posted to the structure endpoint. Employee 0 is
+    the CEO and the rest are placed according to the shape:
+    - flat: everyone reports to the CEO
+    - deep: a single chain where every employee reports to the previous one
+    - balanced: a complete tree where every supervisor has `branching` subordinates
+    - random: every employee reports to a random employee created before them, and the entries are shuffled
+    :param shape: str. One of SHAPES
+    :param size: int. The number of employees, including the CEO
+    :param seed: int. The seed of the random generator, so the same org can be generated again
+    :param branching: int. The number of subordinates of each supervisor in the balanced shape
+    :return: hierarchy: dict
+    """
+    if shape not in SHAPES:
+        raise ValueError(f'shape should be one of {SHAPES}')
+    if size < 1:
+        raise ValueError('size should be at least 1')
+
+    names = [employee_name(number) for number in range(size)]
+    if shape == 'flat':
+        return {names[number]: names[0] for number in range(1, size)}
+    if shape == 'deep':
+        return {names[number]: names[number - 1] for number in range(1, size)}
+    if shape == 'balanced':
+        return {names[number]: names[(number - 1) // branching] for number in range(1, size)}
+
+    generator = random.Random(seed)
+    entries = [(names[number], names[generator.randrange(number)]) for number in range(1, size)]
+    generator.shuffle(entries)
+    return dict(entries)
@@ -0,0 +1,155 @@
+import gc
+import time
+from benchmarks.org_generator import generate_org
+from helpers.json_provider import JSON_PROVIDERS, StdlibJSONProvider
+from hierarchy.parse_hierarchy import compile_hierarchy
+from models.employee import Employee
+
+
+def nested_hierarchy(tree):
+    """
+    Builds the nested {employee: {subordinate: {...}}} hierarchy the structure endpoint sends for a compiled tree
+    :param tree: CompactTree
+    :return: dict
+    """
+    nested = {}
+    levels = [nested]
+    for name, depth in tree.depth_rows():
+        del levels[depth + 1:]
+        subordinates = levels[depth][name] = {}
+        levels.append(subordinates)
+    return nested
+
+
+def response_payloads(hierarchy_dict):
+    """
+    Builds the bodies the API sends and receives for a hierarchy, the way the views build them
+    :param hierarchy_dict: dict. The flat {employee: supervisor} hierarchy
+    :return: dict mapping the name of each payload to a tuple of the object to encode and whether its keys are sorted
+    """
+    tree, ids = compile_hierarchy(hierarchy_dict)
+    employees = list(Employee.hierarchy_rows(tree, ids))
+    names = {employee['employee_id']: employee['name'] for employee in employees}
+    positions = {employee['employee_id']: position for position, employee in enumerate(employees)}
+    return {
+        # the response of the structure endpoint, nested as deep as the organization
+        'structure': ({'status': 'success', 'version': 1, 'employee_hierarchy': nested_hierarchy(tree)}, True),
+        # the response of the batch supervisors endpoint for every employee
+        'supervisors': ({'status': 'success', 'supervisors': [
+            {
+                'employee': employee['name'],
+                'found': True,
+                'supervisor': names.get(employee['supervisor_id']),
+                'supervisor_of_supervisor': None
+            }
+            for employee in employees
+        ]}, True),
+        # the lines of the descendants stream of the top most supervisor, each encoded on its own
+        'descendants': ([
+            {'name': employee['name'], 'supervisor': names.get(employee['supervisor_id']), 'cursor': employee['lft']}
+            for employee in employees[1:]
+        ], False),
+        # the snapshot of the hierarchy kept by the snapshot storage
+        'snapshot': ({
+            'names': [employee['name'] for employee in employees],
+            'parents': [positions.get(employee['supervisor_id'], -1) for employee in employees]
+        }, False)
+    }
+
+
+def _encoder(provider, name, sort_keys):
+    if name == 'descendants':
+        return lambda records: [provider.dumps(record, sort_keys=sort_keys) for record in records]
+    return lambda obj: provider.dumps(obj, sort_keys=sort_keys)
+
+
+def time_best(stage, argument, repeat):
+    """
+    Runs a stage a number of times and measures the fastest run
+    :param stage: callable to measure
+    :param argument: the argument the stage is called with
+    :param repeat: int. The number of runs
+    :return: tuple of the stage's return value and the wall time of the fastest run in seconds
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = stage(argument)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return result, best
+
+
+def benchmark_serialization(hierarchy_dict, providers=None, repeat=3):
+    """
+    Benchmarks encoding the response bodies of a hierarchy and decoding its posted body with each JSON provider.
+    Payloads a provider can't encode, like the structure of a deep organization which nests deeper than the
+    recursion limit, are reported with None times
+    :param hierarchy_dict: dict. The flat {employee: supervisor} hierarchy
+    :param providers: list of provider names, see helpers.json_provider.JSON_PROVIDERS. Defaults to all installed
+    :param repeat: int. The number of runs of each measurement, of which the fastest is reported
+    :return: dict with the size of each payload and the seconds, throughput and speedup over the standard library of
+    each provider
+    """
+    providers = [JSON_PROVIDERS[name] for name in (providers or JSON_PROVIDERS)]
+    payloads = response_payloads(hierarchy_dict)
+    posted = StdlibJSONProvider.dumps(hierarchy_dict).encode()
+
+    results = {}
+    for name, (obj, sort_keys) in payloads.items():
+        results[name] = {'operation': 'encode', 'bytes': None, 'providers': {}}
+        for provider in providers:
+            try:
+                encoded, seconds = time_best(_encoder(provider, name, sort_keys), obj, repeat)
+            except RecursionError:
+                results[name]['providers'][provider.name] = {'seconds': None, 'megabytes_per_second': None}
+                continue
+            size = sum(map(len, encoded)) if isinstance(encoded, list) else len(encoded)
+            results[name]['bytes'] = size
+            results[name]['providers'][provider.name] = {
+                'seconds': seconds,
+                'megabytes_per_second': size / seconds / 1e6 if seconds else None
+            }
+
+    results['structure_request'] = {'operation': 'decode', 'bytes': len(posted), 'providers': {}}
+    for provider in providers:
+        _, seconds = time_best(provider.loads, posted, repeat)
+        results['structure_request']['providers'][provider.name] = {
+            'seconds': seconds,
+            'megabytes_per_second': len(posted) / seconds / 1e6 if seconds else None
+        }
+
+    for result in results.values():
+        stdlib_seconds = result['providers'].get(StdlibJSONProvider.name, {}).get('seconds')
+        for measured in result['providers'].values():
+            measured['speedup'] = (
+                stdlib_seconds / measured['seconds'] if stdlib_seconds and measured['seconds'] else None)
+    return {
+        'employees': len(hierarchy_dict) + 1,
+        'payloads': results
+    }
+
+
+def run_serialization_benchmarks(shapes, sizes, seed=0, providers=None, repeat=3):
+    """
+    Runs the serialization benchmark on generated organizations of every shape and size
+    :param shapes: list of shapes, see benchmarks.org_generator.SHAPES
+    :param sizes: list of the number of employees of the generated organizations
+    :param seed: int. The seed for the generated organizations
+    :param providers: list of provider names. Defaults to all installed
+    :param repeat: int. The number of runs of each measurement, of which the fastest is reported
+    :return: dict of the machine readable results
+    """
+    results = []
+    for shape in shapes:
+        for size in sizes:
+            result = benchmark_serialization(generate_org(shape, size, seed), providers, repeat)
+            result['shape'] = shape
+            results.append(result)
+    return {
+        'seed': seed,
+        'providers': list(providers or JSON_PROVIDERS),
+        'results': results
+    }
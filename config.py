@@ -11,6 +11,43 @@ class Config:
     DEBUG = True
     SQLALCHEMY_ECHO = False
     SECRET_KEY = os.getenv('SECRET', 'randomnessshouldbereplaced')
+    # the type of the employee ids: 'uuid' for UUID hex strings or 'integer' for compact integer ids.
+    # This is read when the models are defined, so it can only be changed together with the database schema
+    EMPLOYEE_ID_TYPE = os.getenv('EMPLOYEE_ID_TYPE', 'uuid')
+    # the number of rows sent to the database in each executemany batch of a bulk insert
+    BULK_INSERT_CHUNK_SIZE = int(os.getenv('BULK_INSERT_CHUNK_SIZE', 5000))
+    # when an upload changes at least this share of the employees, the hierarchy is written to a shadow table which
+    # then replaces the employee table, instead of changing the employee table row by row
+    HIERARCHY_REBUILD_RATIO = float(os.getenv('HIERARCHY_REBUILD_RATIO', 0.5))
+    # the difference between consecutive lft and rgt values of an uploaded hierarchy. The free numbers in between let
+    # single employees be added or moved without renumbering the whole tree
+    HIERARCHY_GAP = int(os.getenv('HIERARCHY_GAP', 64))
+    # whether maintenance work, like dropping replaced tables and rebalancing the lft and rgt gaps, runs in a
+    # background thread instead of delaying the response
+    RUN_MAINTENANCE_IN_BACKGROUND = True
+    # how the hierarchy is read, see hierarchy.storage. 'ancestor_index' answers supervisor lookups from the binary
+    # lifting table of the read cache, 'nested_set' from range queries of the employee table, 'closure_table' and
+    # 'materialized_path' keep an extra table which is synced on every change, and 'snapshot' answers reads from a
+    # serialized copy of the whole hierarchy loaded into memory
+    HIERARCHY_STORAGE = os.getenv('HIERARCHY_STORAGE', 'ancestor_index')
+    # the seconds after which the in-process read cache checks whether another process stored a newer hierarchy
+    # version. 0 never checks, which is only right when a single process writes and reads the hierarchy
+    HIERARCHY_CACHE_TTL = float(os.getenv('HIERARCHY_CACHE_TTL', 1))
+    # the number of employees read from the database in each keyset page while streaming a reporting tree
+    DESCENDANTS_PAGE_SIZE = int(os.getenv('DESCENDANTS_PAGE_SIZE', 1000))
+    # the number of results a name search returns when no limit is asked for
+    SEARCH_RESULTS_LIMIT = int(os.getenv('SEARCH_RESULTS_LIMIT', 10))
+    # the number of managers the manager stats return when no limit is asked for
+    MANAGER_STATS_LIMIT = int(os.getenv('MANAGER_STATS_LIMIT', 10))
+    # responses smaller than this number of bytes are sent uncompressed, since compressing them saves too little
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+    # the compression level of responses, from 1 (fastest) to 9 (smallest) for gzip. zstd uses it up to 19
+    COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', 6))
+    # the most bytes a compressed request body may decompress to. Larger ones are rejected with 413 as they are read
+    MAX_DECOMPRESSED_SIZE = int(os.getenv('MAX_DECOMPRESSED_SIZE', 256 * 1024 * 1024))
+    # the library responses are encoded and request bodies decoded with: 'orjson', 'stdlib' or 'auto' for the fastest
+    # one installed, see helpers.json_provider
+    JSON_PROVIDER = os.getenv('JSON_PROVIDER', 'auto')
 
 
 class Production(Config):
@@ -26,6 +63,7 @@ class Testing(Config):
     """
     SQLALCHEMY_DATABASE_URI = 'sqlite:///personio_testing.db'
     TESTING = True
+    RUN_MAINTENANCE_IN_BACKGROUND = False
     SECRET_KEY = 'anotherrandomstringfortesting'
 
 
@@ -0,0 +1,294 @@
+import io
+import zlib
+from werkzeug.datastructures import Headers
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from werkzeug.http import parse_accept_header, parse_cache_control_header
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import get_input_stream
+
+try:
+    import zstandard
+except ImportError:
+    # zstd is optional, gzip is always available
+    zstandard = None
+
+# the number of compressed bytes read from the request body at a time
+READ_CHUNK_SIZE = 64 * 1024
+
+# the wbits of zlib for the gzip format
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class ContentDecodingError(BadRequest):
+    """
+    Raised while the request body is read, when it can't be decompressed with its Content-Encoding
+    """
+    description = 'The request body could not be decompressed with its Content-Encoding.'
+
+
+class DecompressedBodyTooLarge(RequestEntityTooLarge):
+    """
+    Raised while the request body is read, when it decompresses to more bytes than the MAX_DECOMPRESSED_SIZE config
+    """
+    description = 'The request body is too large once decompressed.'
+
+
+class GzipDecodingStream(io.RawIOBase):
+    """
+    A readable stream of the decompressed gzip request body. The body is decompressed as it is read, and no read
+    decompresses more than it returns, so a small body expanding to a huge one is never held in memory as a whole.
+    Reading stops with DecompressedBodyTooLarge once the body grows over the limit. Several gzip members one after
+    the other are read as one body
+    """
+
+    def __init__(self, raw, limit=None):
+        """
+        :param raw: the stream of the compressed body
+        :param limit: int. The most bytes the body may decompress to, or None for no limit
+        """
+        self.raw = raw
+        self.remaining = limit
+        self.decompressor = zlib.decompressobj(GZIP_WBITS)
+        self.pending = b''
+        self.started = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = len(buffer)
+        if self.remaining is not None:
+            # one byte over the limit is enough to tell the body is too large
+            size = min(size, self.remaining + 1)
+        try:
+            while True:
+                if not self.pending:
+                    self.pending = self.raw.read(READ_CHUNK_SIZE)
+                    if not self.pending:
+                        if self.started and not self.decompressor.eof:
+                            raise ContentDecodingError()
+                        return 0
+                self.started = True
+                data = self.decompressor.decompress(self.pending, size)
+                self.pending = self.decompressor.unconsumed_tail
+                if self.decompressor.eof:
+                    # another gzip member may follow
+                    self.pending = self.decompressor.unused_data + self.pending
+                    self.decompressor = zlib.decompressobj(GZIP_WBITS)
+                    self.started = False
+                if data:
+                    return _fill(self, buffer, data)
+        except zlib.error:
+            raise ContentDecodingError()
+
+
+class ZstdDecodingStream(io.RawIOBase):
+    """
+    A readable stream of the decompressed zstd request body, decompressed as it is read. Reading stops with
+    DecompressedBodyTooLarge once the body grows over the limit
+    """
+
+    def __init__(self, raw, limit=None):
+        """
+        :param raw: the stream of the compressed body
+        :param limit: int. The most bytes the body may decompress to, or None for no limit
+        """
+        self.reader = zstandard.ZstdDecompressor().stream_reader(raw, read_size=READ_CHUNK_SIZE)
+        self.remaining = limit
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = len(buffer) if self.remaining is None else min(len(buffer), self.remaining + 1)
+        try:
+            data = self.reader.read(size)
+        except zstandard.ZstdError:
+            raise ContentDecodingError()
+        return _fill(self, buffer, data)
+
+
+def _fill(stream, buffer, data):
+    """
+    Copies decompressed data into the buffer of a read, counting it against the limit of the stream
+    :param stream: the decoding stream, with the number of bytes it may still return as remaining
+    :param buffer: the buffer of the read
+    :param data: bytes. The decompressed data, at most as long as the buffer
+    :return: the number of bytes copied: int
+    :raises: DecompressedBodyTooLarge when the data goes over the limit
+    """
+    if stream.remaining is not None:
+        if len(data) > stream.remaining:
+            raise DecompressedBodyTooLarge()
+        stream.remaining -= len(data)
+    buffer[:len(data)] = data
+    return len(data)
+
+
+def _gzip_compressor(level):
+    return zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+
+
+def _zstd_compressor(level):
+    return zstandard.ZstdCompressor(level=min(level, 19)).compressobj()
+
+
+# the supported content codings, the preferred first, with the stream decoding a request body, the function creating
+# a compressor for a response body and the flush mode which sends everything compressed so far
+CODINGS = {'gzip': (GzipDecodingStream, _gzip_compressor, zlib.Z_SYNC_FLUSH)}
+if zstandard is not None:
+    CODINGS = {'zstd': (ZstdDecodingStream, _zstd_compressor, zstandard.COMPRESSOBJ_FLUSH_BLOCK), **CODINGS}
+
+
+class CompressionMiddleware:
+    """
+    WSGI middleware which decompresses request bodies sent with a Content-Encoding and compresses response bodies
+    for clients which send an Accept-Encoding, with gzip or, if the zstandard package is installed, zstd.
+
+    Request bodies are decompressed as the application reads them. Response bodies are compressed as they are sent,
+    so streamed responses stay streamed. The first COMPRESSION_MIN_SIZE bytes of a response are gathered before the
+    headers are sent, and a response which ends before that is sent uncompressed
+    """
+
+    def __init__(self, wsgi_app, config):
+        """
+        :param wsgi_app: the WSGI application to wrap
+        :param config: the configuration of the app, read on every request
+        """
+        self.wsgi_app = wsgi_app
+        self.config = config
+
+    def __call__(self, environ, start_response):
+        content_encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if content_encoding and content_encoding != 'identity':
+            if content_encoding not in CODINGS:
+                response = Response(
+                    '{"message":"The Content-Encoding should be one of %s.","status":"fail"}\n' % ', '.join(CODINGS),
+                    status=415, mimetype='application/json')
+                response.headers['Accept-Encoding'] = ', '.join(CODINGS)
+                return response(environ, start_response)
+            self.decode_request(environ, CODINGS[content_encoding][0], self.config['MAX_DECOMPRESSED_SIZE'])
+
+        coding = self.response_coding(environ)
+        if coding is None:
+            return self.wsgi_app(environ, start_response)
+        return self.compress_response(environ, start_response, coding)
+
+    @staticmethod
+    def decode_request(environ, decoding_stream, limit=None):
+        """
+        Replaces the request body with its decompressed stream. Its length is unknown until it is read to the end, so
+        the stream itself stops the read once the body decompresses to more than the limit
+        :param environ: the WSGI environment
+        :param decoding_stream: the stream class decompressing the body
+        :param limit: int. The most bytes the body may decompress to, or None for no limit
+        """
+        environ['wsgi.input'] = io.BufferedReader(decoding_stream(get_input_stream(environ), limit))
+        environ['wsgi.input_terminated'] = True
+        environ.pop('CONTENT_LENGTH', None)
+        environ.pop('HTTP_CONTENT_ENCODING', None)
+
+    @staticmethod
+    def response_coding(environ):
+        """
+        Chooses how the response is compressed, from the Accept-Encoding of the request
+        :param environ: the WSGI environment
+        :return: the name of the content coding or None to send the response uncompressed
+        """
+        if environ.get('REQUEST_METHOD') == 'HEAD':
+            return None
+        accepted = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING'))
+        return accepted.best_match(list(CODINGS))
+
+    def compress_response(self, environ, start_response, coding):
+        """
+        Runs the application and compresses its response with the given coding, unless the response is too small or
+        shouldn't be compressed
+        :return: iterable of the response body
+        """
+        captured = []
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return lambda data: None
+
+        app_iter = self.wsgi_app(environ, capture_start_response)
+        chunks = iter(app_iter)
+        status, headers, exc_info = captured
+        headers = Headers(headers)
+
+        compressible = (
+            not status.startswith(('204', '304')) and 'Content-Encoding' not in headers
+            and 'no-transform' not in parse_cache_control_header(headers.get('Cache-Control'))
+        )
+        # gather the start of the body to see if it's large enough to be worth compressing
+        start = []
+        gathered = 0
+        finished = False
+        if compressible:
+            minimum_size = self.config['COMPRESSION_MIN_SIZE']
+            while gathered < minimum_size:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    finished = True
+                    break
+                start.append(chunk)
+                gathered += len(chunk)
+
+        if not compressible or (finished and gathered < self.config['COMPRESSION_MIN_SIZE']):
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return _ClosingIterator(start, chunks, app_iter)
+
+        _, compressor_factory, flush_mode = CODINGS[coding]
+        compressor = compressor_factory(self.config['COMPRESSION_LEVEL'])
+        headers['Content-Encoding'] = coding
+        headers.add('Vary', 'Accept-Encoding')
+        etag = headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            # the compressed body differs byte by byte from the uncompressed one, so its ETag can only be weak
+            headers['ETag'] = 'W/' + etag
+        if finished:
+            body = compressor.compress(b''.join(start)) + compressor.flush()
+            headers['Content-Length'] = str(len(body))
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return _ClosingIterator([body], iter(()), app_iter)
+
+        headers.pop('Content-Length', None)
+        start_response(status, headers.to_wsgi_list(), exc_info)
+        return _ClosingIterator([], _compress(compressor, flush_mode, start, chunks), app_iter)
+
+
+def _compress(compressor, flush_mode, start, chunks):
+    """
+    Compresses the chunks of a response body as they are produced. Each chunk is flushed, so a streamed response
+    reaches the client as it is produced instead of when the compressor's window is full
+    :param compressor: the compressor of the chosen content coding
+    :param flush_mode: the flush mode of the compressor which sends everything compressed so far
+    :param start: list of the chunks already gathered
+    :param chunks: iterator of the rest of the chunks
+    :return: generator of compressed chunks
+    """
+    yield compressor.compress(b''.join(start)) + compressor.flush(flush_mode)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(flush_mode)
+    yield compressor.flush()
+
+
+class _ClosingIterator:
+    """
+    The response body, which closes the application's body when the server is done with it, as WSGI requires
+    """
+
+    def __init__(self, start, chunks, app_iter):
+        self.start = start
+        self.chunks = chunks
+        self.app_iter = app_iter
+
+    def __iter__(self):
+        yield from self.start
+        yield from self.chunks
+
+    def close(self):
+        close = getattr(self.app_iter, 'close', None)
+        if close is not None:
+            close()
@@ -0,0 +1,171 @@
+import json
+from flask.json import JSONDecoder, JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    # orjson is optional, the standard library is always available
+    orjson = None
+
+# the Flask conversion of the values JSON has no type for, like dates
+_default = JSONEncoder().default
+
+
+class StdlibJSONProvider:
+    """
+    Encodes and decodes JSON with the standard library. It is always available, and is the reference the faster
+    providers behave like
+    """
+    name = 'stdlib'
+    encoder = JSONEncoder
+    decoder = JSONDecoder
+
+    @staticmethod
+    def dumps(obj, sort_keys=False, ensure_ascii=True):
+        """
+        Encodes an object to compact JSON
+        :param obj: object to encode
+        :param sort_keys: bool. Whether the keys of dictionaries should be sorted
+        :param ensure_ascii: bool. Whether non ASCII characters should be escaped
+        :return: JSON text: str
+        """
+        return json.dumps(obj, separators=(',', ':'), sort_keys=sort_keys, ensure_ascii=ensure_ascii,
+                          default=_default)
+
+    @staticmethod
+    def loads(data):
+        """
+        Decodes JSON text
+        :param data: str or bytes
+        :return: decoded object
+        """
+        return json.loads(data)
+
+
+if orjson is not None:
+    def _orjson_dumps(obj, default, sort_keys, indent, ensure_ascii):
+        """
+        Encodes an object to JSON with orjson, with the options of the standard library encoder
+        :return: JSON text: str or None if orjson can't encode it the way the standard library would
+        """
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            text = orjson.dumps(obj, default=default, option=option).decode()
+        except orjson.JSONEncodeError:
+            return None
+        if ensure_ascii and not text.isascii():
+            # orjson never escapes non ASCII characters
+            return None
+        return text
+
+    class OrjsonEncoder(JSONEncoder):
+        """
+        The Flask JSON encoder with orjson doing the encoding. Values orjson doesn't support natively go through the
+        default method of the Flask encoder, so dates are still sent as HTTP dates. Anything orjson can't encode, like
+        integers over 64 bits or nesting deeper than 254 levels, is encoded by the standard library instead. Unlike the
+        standard library, NaN and infinities are encoded as null
+        """
+
+        def encode(self, o):
+            text = _orjson_dumps(o, self.default, self.sort_keys, self.indent, self.ensure_ascii)
+            return super().encode(o) if text is None else text
+
+    class OrjsonDecoder(JSONDecoder):
+        """
+        The Flask JSON decoder with orjson doing the decoding. Anything orjson rejects, like NaN, is decoded by the
+        standard library instead, which also raises the usual error for invalid JSON
+        """
+
+        def decode(self, s, *args, **kwargs):
+            if self.object_hook or self.object_pairs_hook or self.parse_float is not float:
+                return super().decode(s, *args, **kwargs)
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError:
+                return super().decode(s, *args, **kwargs)
+
+    class OrjsonJSONProvider:
+        """
+        Encodes and decodes JSON with orjson, which is written in Rust and several times faster than the standard
+        library. It falls back to the standard library for whatever orjson doesn't support
+        """
+        name = 'orjson'
+        encoder = OrjsonEncoder
+        decoder = OrjsonDecoder
+
+        @staticmethod
+        def dumps(obj, sort_keys=False, ensure_ascii=True):
+            text = _orjson_dumps(obj, _default, sort_keys, None, ensure_ascii)
+            if text is None:
+                return StdlibJSONProvider.dumps(obj, sort_keys=sort_keys, ensure_ascii=ensure_ascii)
+            return text
+
+        @staticmethod
+        def loads(data):
+            try:
+                return orjson.loads(data)
+            except orjson.JSONDecodeError:
+                return json.loads(data)
+
+
+# the JSON providers which can be used, the fastest first
+JSON_PROVIDERS = {provider.name: provider for provider in (
+    ([OrjsonJSONProvider] if orjson is not None else []) + [StdlibJSONProvider])}
+
+# the provider used by the helpers, set by configure_json
+json_provider = StdlibJSONProvider
+
+
+def get_json_provider(name):
+    """
+    Gets a JSON provider by its name
+    :param name: str. One of JSON_PROVIDERS, or 'auto' for the fastest one installed
+    :return: provider class
+    :raises: ValueError when there is no such provider installed
+    """
+    if name == 'auto':
+        return next(iter(JSON_PROVIDERS.values()))
+    if name not in JSON_PROVIDERS:
+        raise ValueError(
+            f"The JSON provider should be 'auto' or one of the installed providers: {list(JSON_PROVIDERS)}")
+    return JSON_PROVIDERS[name]
+
+
+def configure_json(app):
+    """
+    Makes the app encode its responses and decode request bodies with the provider chosen by the JSON_PROVIDER
+    config, so jsonify and request.get_json use it. The posted hierarchy is still decoded by the standard library,
+    since finding duplicate keys needs its object_pairs_hook
+    :param app: the Flask app
+    :return: provider class
+    """
+    global json_provider
+    json_provider = get_json_provider(app.config['JSON_PROVIDER'])
+    app.json_encoder = json_provider.encoder
+    app.json_decoder = json_provider.decoder
+    return json_provider
+
+
+def dumps(obj, sort_keys=False, ensure_ascii=True):
+    """
+    Encodes an object to compact JSON with the configured provider
+    :param obj: object to encode
+    :param sort_keys: bool. Whether the keys of dictionaries should be sorted
+    :param ensure_ascii: bool. Whether non ASCII characters should be escaped
+    :return: JSON text: str
+    """
+    return json_provider.dumps(obj, sort_keys=sort_keys, ensure_ascii=ensure_ascii)
+
+
+def loads(data):
+    """
+    Decodes JSON text with the configured provider
+    :param data: str or bytes
+    :return: decoded object
+    :raises: ValueError when the data is not valid JSON
+    """
+    return json_provider.loads(data)
@@ -0,0 +1,167 @@
+from collections.abc import Iterator
+from json.encoder import encode_basestring, encode_basestring_ascii
+from operator import itemgetter
+from flask import Response, current_app, stream_with_context
+from flask.json import JSONEncoder
+from helpers import json_provider
+
+# the number of characters gathered before a chunk is sent to the client
+DEFAULT_CHUNK_SIZE = 16 * 1024
+
+# marks the end of an iterator, since None is a valid JSON value
+_END = object()
+
+_scalar_encoder = JSONEncoder(separators=(',', ':'))
+
+
+class StreamedObject:
+    """
+    An iterable of (key, value) pairs which is encoded as a JSON object, in its own order, while it is consumed. It
+    lets an object too large to build in memory be produced as the response is sent
+    """
+    __slots__ = ('items',)
+
+    def __init__(self, items):
+        """
+        :param items: iterable of (key, value) pairs
+        """
+        self.items = items
+
+
+def _encode_scalar(value):
+    """
+    Encodes a value which is not a container (dict, list or tuple) or a string
+    :param value: int, float, bool, None or any other value the Flask JSON encoder supports
+    :return: encoded value: str
+    """
+    return _scalar_encoder.encode(value)
+
+
+def _iter_tokens(obj, sort_keys, encode_string):
+    """
+    Walks the given object with an explicit stack of iterators instead of recursion, and yields the JSON text for it
+    piece by piece. The depth of the object is only limited by memory, not by the recursion limit. Iterators, like
+    generators, are encoded as lists and StreamedObjects as objects, and both are only consumed as the text is
+    produced
+    :param obj: object to encode
+    :param sort_keys: bool. Whether the keys of dictionaries should be sorted
+    :param encode_string: callable used to encode strings
+    :return: generator of JSON text pieces
+    """
+    # each stack item is the iterator of a parent container, whether it's a dictionary and its closing character
+    stack = []
+    iterator = iter((obj,))
+    is_dict = False
+    closer = ''
+    first = True
+
+    while True:
+        item = next(iterator, _END)
+        if item is _END:
+            if not stack:
+                return
+            yield closer
+            iterator, is_dict, closer = stack.pop()
+            first = False
+            continue
+
+        if not first:
+            yield ','
+        first = False
+
+        if is_dict:
+            key, value = item
+            yield encode_string(key if isinstance(key, str) else _encode_scalar(key)) + ':'
+        else:
+            value = item
+
+        if isinstance(value, str):
+            yield encode_string(value)
+        elif isinstance(value, dict):
+            stack.append((iterator, is_dict, closer))
+            items = sorted(value.items(), key=itemgetter(0)) if sort_keys else value.items()
+            iterator, is_dict, closer, first = iter(items), True, '}', True
+            yield '{'
+        elif isinstance(value, StreamedObject):
+            stack.append((iterator, is_dict, closer))
+            iterator, is_dict, closer, first = iter(value.items), True, '}', True
+            yield '{'
+        elif isinstance(value, (list, tuple, Iterator)):
+            stack.append((iterator, is_dict, closer))
+            iterator, is_dict, closer, first = iter(value), False, ']', True
+            yield '['
+        else:
+            yield _encode_scalar(value)
+
+
+def iter_json(obj, sort_keys=False, ensure_ascii=True, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Encodes the given object to JSON iteratively, yielding the text in chunks of about chunk_size characters
+    :param obj: object to encode
+    :param sort_keys: bool. Whether the keys of dictionaries should be sorted
+    :param ensure_ascii: bool. Whether non ASCII characters should be escaped
+    :param chunk_size: int. The number of characters gathered before a chunk is yielded
+    :return: generator of JSON text chunks
+    """
+    encode_string = encode_basestring_ascii if ensure_ascii else encode_basestring
+    buffer = []
+    buffered = 0
+    for token in _iter_tokens(obj, sort_keys, encode_string):
+        buffer.append(token)
+        buffered += len(token)
+        if buffered >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_json_response(obj, status=200, with_context=False):
+    """
+    Creates a streamed JSON response for the given object. The JSON text is produced as the response is sent, so
+    large or deeply nested objects are neither built in memory as a whole nor encoded recursively. Lists given as
+    generators and StreamedObjects are only produced while the response is sent, after the request context is gone,
+    unless with_context is set. It follows the JSON_SORT_KEYS and JSON_AS_ASCII settings of the app, just like
+    jsonify does, except that StreamedObjects keep their own order
+    :param obj: object to send as JSON
+    :param status: int. The status code of the response
+    :param with_context: bool. Whether to keep the request context until the response is sent, so the generators
+    can read from the database
+    :return: response: Response
+    """
+    chunks = iter_json(
+        obj,
+        sort_keys=current_app.config['JSON_SORT_KEYS'],
+        ensure_ascii=current_app.config['JSON_AS_ASCII']
+    )
+    if with_context:
+        chunks = stream_with_context(chunks)
+    return Response(chunks, status=status, mimetype=current_app.config['JSONIFY_MIMETYPE'])
+
+
+def stream_ndjson_response(records, status=200):
+    """
+    Creates a streamed newline delimited JSON (NDJSON) response, with one JSON document per line for each record.
+    The records are produced as the response is sent, within the request context, and lines are gathered into
+    chunks of about DEFAULT_CHUNK_SIZE characters. It follows the JSON_AS_ASCII setting of the app
+    :param records: iterable of JSON serializable records
+    :param status: int. The status code of the response
+    :return: response: Response
+    """
+    ensure_ascii = current_app.config['JSON_AS_ASCII']
+
+    def chunks():
+        buffer = []
+        buffered = 0
+        for record in records:
+            line = json_provider.dumps(record, ensure_ascii=ensure_ascii) + '\n'
+            buffer.append(line)
+            buffered += len(line)
+            if buffered >= DEFAULT_CHUNK_SIZE:
+                yield ''.join(buffer)
+                buffer = []
+                buffered = 0
+        if buffer:
+            yield ''.join(buffer)
+    return Response(stream_with_context(chunks()), status=status, mimetype='application/x-ndjson')
@@ -1,6 +1,7 @@
 import json
 import logging
 import uuid
+from helpers import json_provider
 
 
 def validate_uuid(id_string):
@@ -30,7 +31,7 @@ def validate_json(json_data):
     :return: dict / bool. The parsed dictionary or false if the data is not valid json
     """
     try:
-        return json.loads(json_data)
+        return json_provider.loads(json_data)
     except (ValueError, TypeError) as error:
         logging.error(f"Invalid JSON. Reason: {error}")
         return False
@@ -58,3 +59,119 @@ def check_json_contains_loop(json_data):
                 correct_dict[key] = value
         return duplicates
     return json.loads(json_data, object_pairs_hook=find_duplicated_key)
+
+
+def decode_hierarchy(json_data):
+    """
+    Decodes the posted hierarchy JSON in a single pass. While decoding, it collects the keys which appear more than
+    once in the JSON. This would imply that the employee has more than one supervisor.
+    :param json_data: bytes / str JSON to decode
+    :return: tuple of the decoded dictionary (or False if the data is not a valid JSON object) and the list of
+    duplicated keys
+    """
+    duplicates = []
+
+    def build_dict(ordered_pairs):
+        """
+        Hook function used to build the decoded dictionary while recording the duplicate keys. The last value of a
+        duplicated key is kept, just like json.loads does
+        :param ordered_pairs: List of tuples which are key-value pairs
+        :return: decoded dictionary
+        """
+        decoded_dict = {}
+        for key, value in ordered_pairs:
+            if key in decoded_dict:
+                duplicates.append(key)
+            decoded_dict[key] = value
+        return decoded_dict
+
+    try:
+        hierarchy_dict = json.loads(json_data, object_pairs_hook=build_dict)
+    except (ValueError, TypeError) as error:
+        logging.error(f"Invalid JSON. Reason: {error}")
+        return False, []
+    if not isinstance(hierarchy_dict, dict):
+        logging.error(f"Invalid JSON. Reason: expected an object, got {type(hierarchy_dict).__name__}")
+        return False, []
+    return hierarchy_dict, duplicates
+
+
+def strip_names(hierarchy_dict):
+    """
+    Strips the whitespace around the employee and supervisor names, the way the Employee class does. Names which are
+    the same once stripped are the same employee, so an employee who appears more than once is reported like a
+    duplicate key. The dictionary is only copied when a name has whitespace around it
+    :param hierarchy_dict: dict. The flat dictionary mapping each employee to their supervisor
+    :return: tuple of the dictionary with the stripped names and the list of the employees who appear more than once
+    """
+    if all(employee == employee.strip() and (not isinstance(supervisor, str) or supervisor == supervisor.strip())
+           for employee, supervisor in hierarchy_dict.items()):
+        return hierarchy_dict, []
+    stripped_dict = {}
+    duplicates = []
+    for employee, supervisor in hierarchy_dict.items():
+        employee = employee.strip()
+        if employee in stripped_dict:
+            duplicates.append(employee)
+        stripped_dict[employee] = supervisor.strip() if isinstance(supervisor, str) else supervisor
+    return stripped_dict, duplicates
+
+
+def check_hierarchy_structure(hierarchy_dict):
+    """
+    Checks the structure of the {employee: supervisor} dictionary in one linear pass. Each employee's chain of
+    supervisors is walked up once, coloring the employees on the way, so every employee is visited a single time.
+    It finds:
+    - invalid: employees whose supervisor is not a name (string)
+    - empty: employees whose name or whose supervisor's name is an empty string
+    - self_supervised: employees who are their own supervisor
+    - cycles: groups of employees who supervise each other in a loop, e.g. A -> B -> A
+    - roots: the supervisors who are not supervised by anyone, in the order they first appear
+    :param hierarchy_dict: dict. The flat dictionary mapping each employee to their supervisor
+    :return: dict with the lists of invalid, empty, self_supervised, cycles and roots
+    """
+    invalid = []
+    empty = []
+    self_supervised = []
+    cycles = []
+    roots = []
+    seen_roots = set()
+
+    # maps each visited employee to the number of the walk which first reached them
+    walk_of = {}
+    for walk, (employee, supervisor) in enumerate(hierarchy_dict.items()):
+        if not isinstance(supervisor, str):
+            invalid.append(employee)
+            continue
+        if not employee or not supervisor:
+            empty.append(employee)
+            continue
+        if supervisor == employee:
+            self_supervised.append(employee)
+            continue
+        if supervisor not in hierarchy_dict and supervisor not in seen_roots:
+            seen_roots.add(supervisor)
+            roots.append(supervisor)
+
+        # walk up the chain of supervisors until reaching a root or an employee visited before
+        path = []
+        name = employee
+        while name in hierarchy_dict and name not in walk_of:
+            walk_of[name] = walk
+            path.append(name)
+            name = hierarchy_dict[name]
+            if not isinstance(name, str) or name == path[-1]:
+                # the chain ends at an invalid or self supervised employee, which is reported on its own
+                break
+        else:
+            if walk_of.get(name) == walk:
+                # this walk reached an employee it had already visited, so the chain loops back on itself
+                cycles.append(path[path.index(name):])
+
+    return {
+        'invalid': invalid,
+        'empty': empty,
+        'self_supervised': self_supervised,
+        'cycles': cycles,
+        'roots': roots
+    }
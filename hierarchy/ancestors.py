@@ -0,0 +1,122 @@
+import sys
+from array import array
+from hierarchy.compact_tree import INDEX_TYPE
+from hierarchy.euler_tour import EulerTourIndex
+from hierarchy.name_search import NameSearchIndex
+from models.employee import Employee
+from models.model_mixin import db
+
+
+class AncestorIndex:
+    """
+    An in-memory binary lifting table of the hierarchy. jumps[level][i] is the index of the supervisor 2 ** level
+    levels above employee i, or -1 if there is none, so the supervisor any number of levels above an employee is
+    found in O(log depth) steps. Employees are indexed in the order of their lft values, so every supervisor comes
+    before the employees they supervise
+    """
+    __slots__ = ('names', 'parents', 'depths', 'jumps', '_indexes', '_euler_tour', '_name_search')
+
+    def __init__(self, names, parents):
+        """
+        Builds the table from the names and the supervisor (parent) index of each employee
+        :param names: list of employee names, each supervisor before their subordinates
+        :param parents: array of the index of the supervisor of each employee, -1 for the top most supervisor
+        """
+        self.names = names
+        self.parents = parents
+        self._indexes = {name: index for index, name in enumerate(names)}
+        self._euler_tour = None
+        self._name_search = None
+
+        depths = array(INDEX_TYPE, [0]) * len(names)
+        for index, parent in enumerate(parents):
+            if parent >= 0:
+                depths[index] = depths[parent] + 1
+        self.depths = depths
+
+        jumps = [parents]
+        max_depth = max(depths, default=0)
+        while (1 << len(jumps)) <= max_depth:
+            previous = jumps[-1]
+            jumps.append(array(INDEX_TYPE, (previous[parent] if parent >= 0 else -1 for parent in previous)))
+        self.jumps = jumps
+
+    @classmethod
+    def from_stored(cls):
+        """
+        Builds the table from the stored employees in one query
+        :return: index: AncestorIndex
+        """
+        rows = db.session.query(Employee.employee_id, Employee.name, Employee.supervisor_id).order_by(Employee.lft)
+        positions = {}
+        names = []
+        parents = array(INDEX_TYPE)
+        intern = sys.intern
+        for employee_id, name, supervisor_id in rows:
+            positions[employee_id] = len(names)
+            names.append(intern(name))
+            parents.append(positions.get(supervisor_id, -1))
+        return cls(names, parents)
+
+    def __len__(self):
+        return len(self.names)
+
+    def index(self, name):
+        """
+        Gets the index of the employee with the given name
+        :param name: str. The name of the employee
+        :return: index: int or None if there is no such employee
+        """
+        return self._indexes.get(name)
+
+    def ancestor(self, index, levels):
+        """
+        Gets the supervisor a number of levels above an employee, jumping by the powers of two making up the number
+        :param index: int. The index of the employee
+        :param levels: int. How many levels up to go, at least 1
+        :return: index of the supervisor: int or -1 if the hierarchy is not that deep above the employee
+        """
+        if levels > self.depths[index]:
+            return -1
+        level = 0
+        while levels:
+            if levels & 1:
+                index = self.jumps[level][index]
+            levels >>= 1
+            level += 1
+        return index
+
+    def euler_tour(self):
+        """
+        Gets the Euler tour index of the hierarchy for lowest common manager lookups. It takes O(n log n) memory, so
+        it is only built when first needed, once for each loaded hierarchy
+        :return: index: EulerTourIndex
+        """
+        if self._euler_tour is None:
+            self._euler_tour = EulerTourIndex(self.parents, self.depths)
+        return self._euler_tour
+
+    def name_search(self):
+        """
+        Gets the name search index of the hierarchy. It is built once for each loaded hierarchy, by the read cache
+        when it loads the hierarchy, or else when first needed
+        :return: index: NameSearchIndex
+        """
+        if self._name_search is None:
+            self._name_search = NameSearchIndex(self.names, self.parents)
+        return self._name_search
+
+    def chain(self, index, limit=None):
+        """
+        Gets the names of the supervisors above an employee
+        :param index: int. The index of the employee
+        :param limit: int. The maximum number of supervisors to get, or None for all of them
+        :return: list of names, the immediate supervisor first
+        """
+        names = []
+        parent = self.parents[index]
+        while parent >= 0 and (limit is None or len(names) < limit):
+            names.append(self.names[parent])
+            parent = self.parents[parent]
+        return names
+
@@ -0,0 +1,188 @@
+import sys
+from array import array
+
+# the array type code used for all the integer arrays. Signed 32 bit integers are enough for hundreds of millions of
+# employees and keep each value at 4 bytes
+INDEX_TYPE = 'i'
+
+
+class CompactTree:
+    """
+    A compact representation of the organization tree. Employees are identified by their position (index) and all
+    the tree data is kept in contiguous integer arrays instead of one Employee object per node:
+
+    - names: the interned name of each employee
+    - parents: the index of the supervisor of each employee, -1 for a root
+    - child_offsets and children: the subordinates of employee i are children[child_offsets[i]:child_offsets[i + 1]]
+    - lft and rgt: the nested sets values of each employee following the modified preorder tree traversal
+    - depths and headcounts: the number of supervisors above and of employees under each employee
+
+    The constructor is the trusted bulk-construction path. It doesn't validate the values it is given, so it should
+    only be fed data that has already been validated.
+    """
+    __slots__ = ('names', 'parents', 'child_offsets', 'children', 'roots', 'lft', 'rgt', 'depths', 'headcounts',
+                 '_preorder', '_indexes')
+
+    def __init__(self, names, parents, child_order=None, indexes=None, gap=1):
+        """
+        Builds the tree from the names and the supervisor (parent) index of each employee
+        :param names: list of employee names
+        :param parents: array of the index of the supervisor of each employee, -1 for a root
+        :param child_order: iterable of indexes. The order in which subordinates are listed under their supervisor.
+        Defaults to the order of the indexes
+        :param indexes: dict mapping each name to its index, if already available
+        :param gap: int. The difference between consecutive lft and rgt values
+        """
+        size = len(names)
+        self.names = names
+        self.parents = parents
+        self._indexes = indexes
+        if child_order is None:
+            child_order = range(size)
+
+        # count the subordinates of each employee, then turn the counts into offsets in the children array
+        child_offsets = array(INDEX_TYPE, [0]) * (size + 1)
+        for parent in parents:
+            if parent >= 0:
+                child_offsets[parent + 1] += 1
+        for index in range(size):
+            child_offsets[index + 1] += child_offsets[index]
+
+        children = array(INDEX_TYPE, [0]) * child_offsets[size]
+        next_free = child_offsets[:size]
+        roots = array(INDEX_TYPE)
+        for index in child_order:
+            parent = parents[index]
+            if parent < 0:
+                roots.append(index)
+            else:
+                children[next_free[parent]] = index
+                next_free[parent] += 1
+
+        self.child_offsets = child_offsets
+        self.children = children
+        self.roots = roots
+        self.lft = array(INDEX_TYPE, [0]) * size
+        self.rgt = array(INDEX_TYPE, [0]) * size
+        self.depths = array(INDEX_TYPE, [0]) * size
+        self.headcounts = array(INDEX_TYPE, [0]) * size
+        self._preorder = array(INDEX_TYPE)
+        self._number(gap)
+
+    @classmethod
+    def from_hierarchy_dict(cls, hierarchy_dict, gap=1):
+        """
+        Builds the tree from the flat {employee: supervisor} dictionary. Subordinates are kept in the order in which
+        they appear in the dictionary
+        :param hierarchy_dict: dict. The flat dictionary mapping each employee to their supervisor
+        :param gap: int. The difference between consecutive lft and rgt values
+        :return: tree: CompactTree
+        """
+        indexes = {}
+        names = []
+        parents = array(INDEX_TYPE)
+        child_order = array(INDEX_TYPE)
+        intern = sys.intern
+        for employee, supervisor in hierarchy_dict.items():
+            supervisor_index = indexes.get(supervisor)
+            if supervisor_index is None:
+                supervisor_index = indexes[supervisor] = len(names)
+                names.append(intern(supervisor))
+                parents.append(-1)
+            employee_index = indexes.get(employee)
+            if employee_index is None:
+                employee_index = indexes[employee] = len(names)
+                names.append(intern(employee))
+                parents.append(-1)
+            parents[employee_index] = supervisor_index
+            child_order.append(employee_index)
+
+        # the roots are not anyone's subordinate, so they are added to the order in which they were first seen
+        for index, parent in enumerate(parents):
+            if parent < 0:
+                child_order.append(index)
+        return cls(names, parents, child_order, indexes, gap)
+
+    def _number(self, gap):
+        """
+        Sets the lft, rgt, depth and headcount values of every employee with an iterative preorder traversal
+        :param gap: int. The difference between consecutive lft and rgt values
+        """
+        child_offsets, children, lft, rgt = self.child_offsets, self.children, self.lft, self.rgt
+        depths, headcounts, preorder = self.depths, self.headcounts, self._preorder
+        counter = 0
+        for root in self.roots:
+            counter += gap
+            lft[root] = counter
+            preorder.append(root)
+            # each stack item is an employee and the position of the next subordinate of theirs to visit
+            stack = [root]
+            positions = [child_offsets[root]]
+            while stack:
+                employee = stack[-1]
+                position = positions[-1]
+                if position < child_offsets[employee + 1]:
+                    positions[-1] = position + 1
+                    subordinate = children[position]
+                    counter += gap
+                    lft[subordinate] = counter
+                    depths[subordinate] = len(stack)
+                    preorder.append(subordinate)
+                    stack.append(subordinate)
+                    positions.append(child_offsets[subordinate])
+                else:
+                    counter += gap
+                    rgt[employee] = counter
+                    # every employee under this one took two values of the interval between lft and rgt
+                    headcounts[employee] = ((counter - lft[employee]) // gap - 1) // 2
+                    stack.pop()
+                    positions.pop()
+
+    def __len__(self):
+        return len(self.names)
+
+    def index(self, name):
+        """
+        Gets the index of the employee with the given name
+        :param name: str. The name of the employee
+        :return: index: int or None if there is no such employee
+        """
+        if self._indexes is None:
+            self._indexes = {employee_name: index for index, employee_name in enumerate(self.names)}
+        return self._indexes.get(name)
+
+    def subordinates(self, index):
+        """
+        Gets the indexes of the employees directly supervised by the given employee
+        :param index: int. The index of the supervisor
+        :return: array of indexes
+        """
+        return self.children[self.child_offsets[index]:self.child_offsets[index + 1]]
+
+    def direct_reports(self, index):
+        """
+        Gets the number of employees directly supervised by the given employee
+        :param index: int. The index of the supervisor
+        :return: int
+        """
+        return self.child_offsets[index + 1] - self.child_offsets[index]
+
+    def preorder(self):
+        """
+        Gets the indexes of all the employees in the order of their lft values. Employees which are not reachable
+        from a root are left out
+        :return: array of indexes
+        """
+        return self._preorder
+
+    def depth_rows(self):
+        """
+        Gets the name and depth of every employee in the order of their lft values, the rows
+        hierarchy.org_chart.org_chart nests
+        :return: generator of (name, depth) tuples
+        """
+        names, depths = self.names, self.depths
+        return ((names[index], depths[index]) for index in self._preorder)
+
+    def __repr__(self):
+        return f'CompactTree: ({len(self.names)} employees, {len(self.roots)} roots)'
@@ -0,0 +1,67 @@
+from datetime import timedelta, timezone
+from functools import wraps
+from flask import Response, make_response, request
+from hierarchy.read_cache import read_cache
+from hierarchy.versions import count_versions_created
+
+
+def version_validators():
+    """
+    Gets the validators of the current hierarchy version, from the read cache. Every answer of a read endpoint
+    depends only on the stored hierarchy, so it stays valid until the next version is stored
+    :return: tuple of the ETag and the Last-Modified time in UTC, or (None, None) if the hierarchy was never stored
+    """
+    version = read_cache.version()
+    if not version:
+        return None, None
+    version_id, created_at = version
+    # the creation time tells apart versions of databases whose version ids started over
+    timestamp = int(created_at.replace(tzinfo=timezone.utc).timestamp() * 1000000)
+    return f'{version_id}-{timestamp:x}', created_at
+
+
+def not_modified_since(last_modified, if_modified_since):
+    """
+    Checks whether the current version is not newer than an If-Modified-Since time. The header only has whole
+    seconds, so when the version was created in that very second, it is only taken as unchanged if no other version
+    was created in that second too. Otherwise the client may have an earlier version from the same second
+    :param last_modified: datetime. When the current version was created, in UTC
+    :param if_modified_since: datetime. The time sent in the If-Modified-Since header
+    :return: bool
+    """
+    if if_modified_since.tzinfo is not None:
+        if_modified_since = if_modified_since.astimezone(timezone.utc).replace(tzinfo=None)
+    created_second = last_modified.replace(microsecond=0)
+    if created_second != if_modified_since:
+        return created_second < if_modified_since
+    return count_versions_created(if_modified_since, if_modified_since + timedelta(seconds=1)) == 1
+
+
+def conditional_get(func):
+    """
+    Decorates a read view to answer conditional requests. A request whose If-None-Match has the ETag of the current
+    hierarchy version, or whose If-Modified-Since is not older than it, gets a 304 Not Modified before the view
+    runs. The ETag takes precedence, so If-Modified-Since is ignored when If-None-Match is sent. Successful answers
+    of the view get the ETag and Last-Modified headers
+    """
+    @wraps(func)
+    def check_version(*args, **kwargs):
+        etag, last_modified = version_validators()
+        if etag is None:
+            return func(*args, **kwargs)
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            not_modified = (request.if_modified_since is not None and
+                            not_modified_since(last_modified, request.if_modified_since))
+        if not_modified:
+            response = Response(status=304)
+        else:
+            response = make_response(func(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        return response
+    return check_version
@@ -9,6 +9,8 @@ class Employee:
     This model helps us implement a nested sets model to store and easily access hierarchical data in a relational
     database
     """
+    __slots__ = ('_name', '_supervisor', '_subordinates', '_lft', '_rgt', '_employee_id', '_supervisor_id')
+
     def __init__(self, name, supervisor=None):
         self.name = name
         self.supervisor = supervisor
@@ -0,0 +1,77 @@
+from array import array
+
+# the array type code of the sparse table. Its values combine a depth and an index, so they need 64 bits
+KEY_TYPE = 'q'
+
+
+class EulerTourIndex:
+    """
+    Finds the lowest common manager of two employees in O(1). The Euler tour lists the employees in the order a
+    depth first walk of the hierarchy visits them, including every return to a supervisor, so the lowest common
+    manager of two employees is the shallowest employee of the tour between their first visits. A sparse table
+    holds the shallowest employee of every range of the tour whose length is a power of two, and any range is
+    covered by two of them.
+
+    The tour and each level of the sparse table are arrays of 2n - 1 values, so the index takes O(n log n) memory
+    """
+    __slots__ = ('depths', 'first_visits', 'size', 'table')
+
+    def __init__(self, parents, depths):
+        """
+        Builds the tour and the sparse table
+        :param parents: array of the index of the supervisor of each employee, -1 for the top most supervisor. Every
+        supervisor comes before the employees they supervise, in the order of their lft values
+        :param depths: array of the number of supervisors above each employee
+        """
+        size = len(parents)
+        self.size = size
+        self.depths = depths
+        first_visits = array('i', [0]) * size
+
+        # each employee is keyed by their depth and index, so the smallest key of a range is its shallowest employee
+        tour = array(KEY_TYPE)
+        stack = []
+        for employee, parent in enumerate(parents):
+            # return to the employee's supervisor, visiting everyone on the way back up
+            while stack and stack[-1] != parent:
+                stack.pop()
+                if stack:
+                    tour.append(depths[stack[-1]] * size + stack[-1])
+            first_visits[employee] = len(tour)
+            tour.append(depths[employee] * size + employee)
+            stack.append(employee)
+        while stack:
+            stack.pop()
+            if stack:
+                tour.append(depths[stack[-1]] * size + stack[-1])
+        self.first_visits = first_visits
+
+        table = [tour]
+        width = 1
+        while width * 2 <= len(tour):
+            previous = table[-1]
+            table.append(array(KEY_TYPE, map(min, previous[:len(previous) - width], previous[width:])))
+            width *= 2
+        self.table = table
+
+    def common_manager(self, first, second):
+        """
+        Gets the lowest common manager of two employees. If one of them supervises the other, it is them
+        :param first: int. The index of the first employee
+        :param second: int. The index of the second employee
+        :return: index of the lowest common manager: int
+        """
+        start, end = sorted((self.first_visits[first], self.first_visits[second]))
+        level = (end - start + 1).bit_length() - 1
+        row = self.table[level]
+        return min(row[start], row[end - (1 << level) + 1]) % self.size
+
+    def distance(self, first, second):
+        """
+        Gets the number of reporting lines between two employees, going up to their lowest common manager and down
+        :param first: int. The index of the first employee
+        :param second: int. The index of the second employee
+        :return: tuple of the index of the lowest common manager and the distance: (int, int)
+        """
+        manager = self.common_manager(first, second)
+        return manager, self.depths[first] + self.depths[second] - 2 * self.depths[manager]
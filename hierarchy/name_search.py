@@ -0,0 +1,230 @@
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from hierarchy.compact_tree import INDEX_TYPE
+
+# how matches are ranked, the best first
+EXACT, PREFIX, FUZZY = 'exact', 'prefix', 'fuzzy'
+MATCH_RANKS = {EXACT: 0, PREFIX: 1, FUZZY: 2}
+
+# the number of fuzzy candidates with the most trigrams in common with the query which are checked, per result
+FUZZY_CANDIDATES_PER_RESULT = 10
+
+# the most entries of the trigram posting lists read for the typo tolerant search of one query
+MAX_FUZZY_POSTINGS = 20000
+
+
+def _trigrams(text):
+    """
+    Gets the distinct three character pieces of a text. The text is padded so its start and end make pieces too,
+    which lets short names and typos at either end be matched
+    :param text: str. A casefolded name or query
+    :return: set of str
+    """
+    padded = f'${text}$'
+    return {padded[position:position + 3] for position in range(len(padded) - 2)}
+
+
+def _prefix_edit_distance(query, key, limit):
+    """
+    Gets the smallest Levenshtein distance between the query and the key or any start of it, so a query with typos
+    still matches a name it is only the start of. It uses Myers' bit-parallel algorithm: a column of the distance
+    table is kept as the bits of its vertical increases and decreases, and is moved one character of the key forward
+    with a few integer operations
+    :param query: str. Not empty
+    :param key: str
+    :param limit: int. The largest distance of interest
+    :return: distance: int, or limit + 1 if it is over the limit
+    """
+    size = len(query)
+    matches = {}
+    for position, character in enumerate(query):
+        matches[character] = matches.get(character, 0) | (1 << position)
+    mask = (1 << size) - 1
+    last = 1 << (size - 1)
+    positive, negative = mask, 0
+    score = best = size
+    # starts of the key longer than this are too long to be within the limit
+    for character in key[:size + limit]:
+        equal = matches.get(character, 0)
+        vertical = equal | negative
+        horizontal = (((equal & positive) + positive) ^ positive) | equal
+        horizontal_positive = negative | ~(horizontal | positive)
+        horizontal_negative = positive & horizontal
+        if horizontal_positive & last:
+            score += 1
+        elif horizontal_negative & last:
+            score -= 1
+        # the first row of the table grows by one with every character of the key
+        horizontal_positive = ((horizontal_positive << 1) | 1) & mask
+        horizontal_negative = (horizontal_negative << 1) & mask
+        positive = (horizontal_negative | ~(vertical | horizontal_positive)) & mask
+        negative = horizontal_positive & vertical
+        if score < best:
+            best = score
+    return min(best, limit + 1)
+
+
+def max_typos(query):
+    """
+    Gets the number of typos tolerated in a query, which grows with its length
+    :param query: str
+    :return: int
+    """
+    return 1 if len(query) <= 4 else 2
+
+
+class NameSearchIndex:
+    """
+    An in-memory index of the employee names for prefix and typo tolerant search. Prefixes are found by binary
+    search in the casefolded names kept in sorted order. Typos are matched through the trigrams (three character
+    pieces) each name is made of: the names sharing the most trigrams with the query are checked with the edit
+    distance. Employees are indexed in the order of their lft values, so the subtree of an employee is the range of
+    indexes up to subtree_ends[index], and a search is limited to it without another lookup
+    """
+    __slots__ = ('names', 'sorted_keys', 'sorted_indexes', 'trigrams', 'subtree_ends')
+
+    def __init__(self, names, parents):
+        """
+        Builds the index
+        :param names: list of employee names, each supervisor before their subordinates
+        :param parents: array of the index of the supervisor of each employee, -1 for the top most supervisor
+        """
+        self.names = names
+        keys = [name.casefold() for name in names]
+        order = sorted(range(len(names)), key=keys.__getitem__)
+        self.sorted_keys = [keys[index] for index in order]
+        self.sorted_indexes = array(INDEX_TYPE, order)
+
+        postings = {}
+        for index, key in enumerate(keys):
+            for trigram in _trigrams(key):
+                posting = postings.get(trigram)
+                if posting is None:
+                    posting = postings[trigram] = array(INDEX_TYPE)
+                posting.append(index)
+        self.trigrams = postings
+
+        subtree_ends = array(INDEX_TYPE, range(len(names)))
+        for index in range(len(names) - 1, 0, -1):
+            parent = parents[index]
+            if parent >= 0 and subtree_ends[index] > subtree_ends[parent]:
+                subtree_ends[parent] = subtree_ends[index]
+        self.subtree_ends = subtree_ends
+
+    def search(self, query, limit, under=None):
+        """
+        Finds the employees whose names best match a query, case insensitively. Exact matches come first, then
+        names starting with the query in alphabetical order, then names within a few typos of the query or of its
+        start, the closest first. Under an employee, either the names starting with the query or the names of the
+        subtree are checked, whichever are fewer
+        :param query: str. What was typed
+        :param limit: int. The maximum number of results
+        :param under: int. The index of an employee to only search among those they supervise, directly or not
+        :return: list of tuples of the index of each employee found and how it matched (exact, prefix or fuzzy)
+        """
+        query = query.casefold()
+        if under is None:
+            first, last = 0, len(self.names) - 1
+        else:
+            first, last = under + 1, self.subtree_ends[under]
+
+        results = []
+        start, end = self._prefix_range(query)
+        if under is not None and last - first < end - start:
+            # the subtree has fewer names than start with the query, so its names are checked instead
+            keys = ((self.names[index].casefold(), index) for index in range(first, last + 1))
+            matching = heapq.nsmallest(limit, ((key, index) for key, index in keys if key.startswith(query)))
+            results = [(index, EXACT if key == query else PREFIX) for key, index in matching]
+        else:
+            for position in range(start, end):
+                if len(results) >= limit:
+                    break
+                index = self.sorted_indexes[position]
+                if first <= index <= last:
+                    results.append((index, EXACT if self.sorted_keys[position] == query else PREFIX))
+        # an exact match sorts before the longer names starting with it, so it's already first
+        found = {index for index, _ in results}
+
+        if len(results) < limit and len(query) >= 2:
+            results.extend(self._fuzzy(query, limit - len(results), first, last, found))
+        return results
+
+    def _prefix_range(self, query):
+        """
+        Finds the names starting with a query, which are next to each other in the sorted names
+        :param query: str. The casefolded query
+        :return: tuple of the positions of the first of them and after the last of them in the sorted names
+        """
+        start = bisect_left(self.sorted_keys, query)
+        if not query or query[-1] == chr(0x10ffff):
+            return start, len(self.sorted_keys)
+        # the smallest text which is larger than every text starting with the query
+        after = query[:-1] + chr(ord(query[-1]) + 1)
+        return start, bisect_left(self.sorted_keys, after, start)
+
+    def _fuzzy(self, query, limit, first, last, found):
+        """
+        Finds the names within a few typos of the query, or whose start is. Each typo changes at most three
+        trigrams, so only names sharing enough trigrams with the query are checked, the ones sharing the most first.
+        A name sharing that many trigrams is in one of the rarest posting lists of the query's trigrams, so those are
+        read first, and the more common ones only while at most MAX_FUZZY_POSTINGS entries are read in all
+        :param query: str. The casefolded query
+        :param limit: int. The maximum number of results
+        :param first: int. The first index searched
+        :param last: int. The last index searched
+        :param found: set of the indexes already found, which are left out
+        :return: list of tuples of the index of each employee found and FUZZY
+        """
+        trigrams = _trigrams(query)
+        typos = max_typos(query)
+        # the trigram with the end of the query is left out, since a name the query is the start of doesn't have it
+        threshold = len(trigrams - {f'{query[-2:]}$'}) - 3 * typos
+        subtree = first != 0 or last != len(self.names) - 1
+        postings = []
+        for trigram in trigrams:
+            posting = self.trigrams.get(trigram)
+            if posting is not None:
+                if subtree:
+                    # the posting lists are in the order of the lft values, so a subtree is a slice of each
+                    posting = posting[bisect_left(posting, first):bisect_right(posting, last)]
+                postings.append(posting)
+        postings.sort(key=len)
+
+        # a name missing from the rarest len(postings) - threshold + 1 lists shares fewer trigrams than the threshold
+        needed = len(postings) - max(threshold, 1) + 1
+        shared = Counter()
+        room = MAX_FUZZY_POSTINGS
+        for position, posting in enumerate(postings):
+            if len(posting) > room:
+                if position < needed:
+                    # the names of the list which come first in the hierarchy are kept
+                    shared.update(posting[:room])
+                # the names may share the trigrams of the lists which weren't read as well
+                threshold -= len(postings) - position
+                break
+            shared.update(posting)
+            room -= len(posting)
+
+        # raise the cut to the fewest shared trigrams among the best candidates, so the counts are only filtered once
+        cut = threshold
+        budget = limit * FUZZY_CANDIDATES_PER_RESULT
+        kept = 0
+        histogram = Counter(shared.values())
+        for count in sorted(histogram, reverse=True):
+            if count < threshold:
+                break
+            cut = count
+            kept += histogram[count]
+            if kept >= budget:
+                break
+        candidates = sorted(((count, index) for index, count in shared.items() if count >= cut), reverse=True)
+        candidates = [(count, index) for count, index in candidates if index not in found][:budget]
+        matches = []
+        for count, index in candidates:
+            key = self.names[index].casefold()
+            distance = _prefix_edit_distance(query, key, typos)
+            if distance <= typos:
+                matches.append((distance, -count, key, index))
+        return [(index, FUZZY) for _, _, _, index in sorted(matches)[:limit]]
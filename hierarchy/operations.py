@@ -0,0 +1,461 @@
+import logging
+import threading
+from array import array
+from flask import current_app
+from sqlalchemy import func
+from hierarchy.compact_tree import CompactTree, INDEX_TYPE
+from hierarchy.parse_hierarchy import compile_hierarchy, new_employee_id, sequential_id_factory
+from hierarchy.read_cache import read_cache
+from hierarchy.restructure import fit_into_stored_intervals, needs_rebuild, plan_restructure, reuse_stored_ids
+from hierarchy.storage import get_storage
+from hierarchy.versions import record_version
+from models.employee import Employee, INTEGER_IDS
+from models.model_mixin import db, run_maintenance
+
+# the free numbers an interval should keep for later operations. When an operation leaves less room than this, the
+# lft and rgt gaps around it are rebalanced in the background
+MIN_ROOM = 2
+
+# hierarchy writes read the lft and rgt values they change, so they are serialized within the process
+hierarchy_write_lock = threading.RLock()
+
+
+class HierarchyOperationError(Exception):
+    """
+    Raised when an operation on a single employee can't be applied to the stored hierarchy
+    """
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _find(name):
+    """
+    Gets the stored values of an employee. Only the columns are queried, so the values are always fresh, even after
+    bulk updates in the same transaction
+    :param name: str. The name of the employee
+    :return: row with the employee_id, supervisor_id, lft, rgt and depth or None
+    """
+    return db.session.query(Employee.employee_id, Employee.supervisor_id, Employee.lft, Employee.rgt,
+                            Employee.depth).filter(Employee.name == name).first()
+
+
+def _find_existing(name, role='employee'):
+    """
+    Gets the stored values of an employee who should exist
+    :param name: str. The name of the employee
+    :param role: str. How the employee is referred to in the error message
+    :return: row with the employee_id, supervisor_id, lft, rgt and depth
+    :raises: HierarchyOperationError when the employee doesn't exist
+    """
+    if not isinstance(name, str) or not name:
+        raise HierarchyOperationError(f'The {role} name should be a non empty string')
+    employee = _find(name)
+    if employee is None:
+        raise HierarchyOperationError(f"The {role}: '{name}' doesn't exist", 404)
+    return employee
+
+
+def _free_start(supervisor):
+    """
+    Gets the number after which the free room inside the supervisor's interval starts, which is the rgt of their
+    last subordinate, or their own lft if they have none
+    :param supervisor: row with the employee_id, lft and rgt of the supervisor
+    :return: int
+    """
+    last_rgt = db.session.query(func.max(Employee.rgt)).filter(
+        Employee.supervisor_id == supervisor.employee_id).scalar()
+    return supervisor.lft if last_rgt is None else last_rgt
+
+
+def _subtree(employee):
+    """
+    Gets the stored values of an employee and everyone they supervise
+    :param employee: row with the lft and rgt of the employee
+    :return: list of rows with the employee_id, lft, rgt and depth, ordered by lft
+    """
+    return db.session.query(Employee.employee_id, Employee.lft, Employee.rgt, Employee.depth).filter(
+        Employee.lft >= employee.lft, Employee.rgt <= employee.rgt).order_by(Employee.lft).all()
+
+
+def _change_headcounts(lft, rgt, change):
+    """
+    Adds to the headcount of everyone above the employee with the given interval
+    :param lft: int. The lft value of the employee
+    :param rgt: int. The rgt value of the employee
+    :param change: int. The number of employees who joined, or left if negative, the teams above the employee
+    """
+    Employee.query.filter(Employee.lft < lft, Employee.rgt > rgt).update(
+        {Employee.headcount: Employee.headcount + change}, synchronize_session=False)
+
+
+def _change_direct_reports(employee_id, change):
+    """
+    Adds to the number of direct reports of an employee
+    :param employee_id: the id of the employee
+    :param change: int. The number of employees who started, or stopped if negative, reporting to them
+    """
+    Employee.query.filter(Employee.employee_id == employee_id).update(
+        {Employee.direct_reports: Employee.direct_reports + change}, synchronize_session=False)
+
+
+def _new_id():
+    """
+    Gets an id for a new employee
+    :return: id: str or int
+    """
+    return Employee.next_integer_id() if INTEGER_IDS else new_employee_id(None)
+
+
+def restructure_hierarchy(hierarchy_dict):
+    """
+    Replaces the stored hierarchy with a validated {employee: supervisor} hierarchy. Only the employees who were
+    added, removed or whose position changed are written, and everyone else keeps their id, lft and rgt. When most of
+    them changed, the whole hierarchy is written to a shadow table which then replaces the employee table. The new
+    version and the structures of the selected storage strategy are written in the same transaction as the employees,
+    and the read cache is refreshed afterwards
+    :param hierarchy_dict: dict. The flat dictionary mapping each employee to their supervisor
+    :return: tuple of the compiled hierarchy and the id of the new version, None if it wasn't saved: (CompactTree, int)
+    """
+    with hierarchy_write_lock:
+        # new integer ids are allocated as one block after the largest id already in the table
+        stored_employees = Employee.stored_hierarchy()
+        id_factory = sequential_id_factory(Employee.next_integer_id()) if INTEGER_IDS else new_employee_id
+        gap = current_app.config['HIERARCHY_GAP']
+        tree, ids = compile_hierarchy(hierarchy_dict, reuse_stored_ids(stored_employees, id_factory), gap)
+        # the employees who keep their supervisor keep their lft and rgt, so unchanged teams are not rewritten
+        fit_into_stored_intervals(stored_employees, tree, ids, gap)
+
+        plan = plan_restructure(stored_employees, tree, Employee.hierarchy_rows(tree, ids))
+        changed_ids = [row['employee_id'] for row in plan['inserts'] + plan['updates']] + plan['deletes']
+        versions = []
+
+        def record():
+            versions.append(record_change(changed_ids, 'upload'))
+
+        if needs_rebuild(plan, len(stored_employees), len(tree), current_app.config['HIERARCHY_REBUILD_RATIO']):
+            result = Employee.rebuild_hierarchy(tree, ids, before_commit=record)
+        else:
+            result = Employee.apply_restructure(plan, before_commit=record)
+        version_id = versions[0] if result else None
+        if version_id:
+            refresh_read_cache()
+    if version_id:
+        logging.info(f"Restructured the hierarchy: {len(plan['inserts'])} inserted, {len(plan['updates'])} "
+                     f"updated and {len(plan['deletes'])} deleted employees")
+    return tree, version_id
+
+
+def record_change(employee_ids, description):
+    """
+    Records a new hierarchy version for the changed employees and brings the structures of the selected storage
+    strategy up to date with the employee table. It writes in the current transaction, which the caller commits
+    together with the change of the employees
+    :param employee_ids: iterable of the ids of the employees which were added, changed or removed
+    :param description: str. What changed
+    :return: the id of the new version: int
+    """
+    version_id = record_version(employee_ids, description)
+    get_storage().sync(employee_ids)
+    return version_id
+
+
+def refresh_read_cache():
+    """
+    Swaps the stored hierarchy into the read cache after a successful write. The index is rebuilt as background
+    maintenance, so the write doesn't wait for it, and the cache is marked pending, so readers don't get the previous
+    hierarchy until then
+    """
+    read_cache.refresh_in_background()
+
+
+def rebalance(gap=None, reserve=None, top=None):
+    """
+    Renumbers the lft and rgt values of the employees so they are `gap` apart again, keeping the order of the
+    subordinates. Only the employees whose values change are updated. This runs in the current transaction, the
+    caller should commit
+    :param gap: int. The difference between consecutive lft and rgt values. Defaults to the HIERARCHY_GAP config
+    :param reserve: tuple of an employee_id and a number of values. Leaves that much extra room at the end of the
+    employee's interval
+    :param top: row with the employee_id, lft and rgt of an employee, to only renumber the employees under them. They
+    keep their own values and the employees under them are spread inside their interval, at most `gap` apart
+    :return: the number of updated employees: int
+    """
+    gap = gap or current_app.config['HIERARCHY_GAP']
+    query = db.session.query(Employee.employee_id, Employee.supervisor_id, Employee.lft, Employee.rgt)
+    if top is not None:
+        query = query.filter(Employee.lft >= top.lft, Employee.rgt <= top.rgt)
+    rows = query.order_by(Employee.lft).all()
+    indexes = {row.employee_id: index for index, row in enumerate(rows)}
+    parents = array(INDEX_TYPE, (indexes.get(row.supervisor_id, -1) for row in rows))
+    tree = CompactTree([row.employee_id for row in rows], parents, indexes=indexes)
+
+    # the values from the end of the reserving employee's interval onwards are shifted to make the extra room
+    reserve_from, reserve_room = len(rows) * 2 + 1, 0
+    if reserve and reserve[0] in indexes:
+        reserve_from, reserve_room = tree.rgt[indexes[reserve[0]]], reserve[1]
+
+    # the first value of the numbering is one step after start
+    start, step = 0, gap
+    if top is not None:
+        step = min(gap, (top.rgt - top.lft - reserve_room) // (2 * len(rows) - 1))
+        start = top.lft - step
+
+    updates = []
+    for index, row in enumerate(rows):
+        if top is not None and row.employee_id == top.employee_id:
+            continue
+        lft, rgt = tree.lft[index], tree.rgt[index]
+        lft = start + lft * step + (reserve_room if lft >= reserve_from else 0)
+        rgt = start + rgt * step + (reserve_room if rgt >= reserve_from else 0)
+        if (lft, rgt) != (row.lft, row.rgt):
+            updates.append({'employee_id': row.employee_id, 'lft': lft, 'rgt': rgt})
+    return Employee.bulk_update(updates)
+
+
+def _ancestors(employee):
+    """
+    Gets the stored values of an employee and every supervisor above them, the lowest first
+    :param employee: row with the lft and rgt of the employee
+    :return: query of rows with the employee_id, lft, rgt and headcount
+    """
+    return db.session.query(Employee.employee_id, Employee.lft, Employee.rgt, Employee.headcount).filter(
+        Employee.lft <= employee.lft, Employee.rgt >= employee.rgt).order_by(Employee.lft.desc())
+
+
+def _make_room(supervisor, needed_room):
+    """
+    Makes extra room at the end of a supervisor's interval, renumbering as few employees as it can. The employees
+    under the lowest of the supervisor and the supervisors above them whose interval can hold their team and the
+    extra room are renumbered inside that interval, so nobody outside it changes. Only when even the top most
+    interval is too small is the whole hierarchy renumbered
+    :param supervisor: row with the employee_id, lft and rgt of the supervisor
+    :param needed_room: int. The number of values needed
+    :return: the number of updated employees: int
+    """
+    reserve = (supervisor.employee_id, needed_room)
+    for ancestor in _ancestors(supervisor):
+        # the team takes 2 * headcount values strictly inside the interval, at least one apart
+        if ancestor.rgt - ancestor.lft - needed_room >= 2 * ancestor.headcount + 1:
+            return rebalance(reserve=reserve, top=ancestor)
+    return rebalance(reserve=reserve)
+
+
+def _spread_room(employee_id, gap):
+    """
+    Brings back the room around an employee whose interval is running low on it. The team of the lowest of the
+    employee and the supervisors above them whose interval can hold it `gap` apart is renumbered inside that interval,
+    or the whole hierarchy if none can
+    :param employee_id: the id of the employee
+    :param gap: int. The difference between consecutive lft and rgt values
+    :return: the number of updated employees: int
+    """
+    employee = db.session.query(Employee.lft, Employee.rgt).filter(Employee.employee_id == employee_id).first()
+    if employee is None:
+        return 0
+    for ancestor in _ancestors(employee):
+        if ancestor.rgt - ancestor.lft >= (2 * ancestor.headcount + 1) * gap:
+            return rebalance(gap, top=ancestor)
+    return rebalance(gap)
+
+
+def rebalance_in_background(employee_ids):
+    """
+    Brings back the lft and rgt gaps around the employees running low on room as background maintenance
+    :param employee_ids: iterable of the ids of the employees whose intervals are running low on room
+    """
+    def task():
+        with hierarchy_write_lock:
+            gap = current_app.config['HIERARCHY_GAP']
+            updated = sum(_spread_room(employee_id, gap) for employee_id in employee_ids)
+            db.session.commit()
+        logging.info(f"Rebalanced the hierarchy gaps: {updated} employees renumbered")
+    run_maintenance(task, 'rebalance-hierarchy')
+
+
+def add_employee(name, supervisor_name, changed_ids):
+    """
+    Adds a new employee under a supervisor. The employee gets an interval in the free room after the supervisor's
+    last subordinate, so no other employee is renumbered unless the room has run out, in which case only the team of
+    the lowest supervisor above with enough room is. An employee without a supervisor can only be added when no
+    employees are stored
+    :param name: str. The name of the new employee
+    :param supervisor_name: str. The name of the supervisor, or None
+    :param changed_ids: set the id of the new employee is added to
+    :return: the id of the supervisor whose interval is running low on room and should be rebalanced, or None
+    :raises: HierarchyOperationError
+    """
+    if not isinstance(name, str) or not name.strip():
+        raise HierarchyOperationError('The employee name should be a non empty string')
+    if _find(name) is not None:
+        raise HierarchyOperationError(f"The employee: '{name}' already exists", 409)
+
+    gap = current_app.config['HIERARCHY_GAP']
+    if supervisor_name is None:
+        if db.session.query(Employee.employee_id).first() is not None:
+            raise HierarchyOperationError('A supervisor is required, since there is already a top most supervisor')
+        employee_id = _new_id()
+        Employee.bulk_insert([{'employee_id': employee_id, 'name': name, 'supervisor_id': None, 'lft': gap,
+                               'rgt': 2 * gap, 'depth': 0, 'headcount': 0, 'direct_reports': 0}])
+        changed_ids.add(employee_id)
+        return None
+
+    supervisor = _find_existing(supervisor_name, 'supervisor')
+    free_start = _free_start(supervisor)
+    if supervisor.rgt - free_start - 1 < 2:
+        # there is no room left in the supervisor's interval
+        _make_room(supervisor, 3)
+        supervisor = _find(supervisor_name)
+        free_start = _free_start(supervisor)
+        if supervisor.rgt - free_start - 1 < 2:
+            raise HierarchyOperationError(
+                f"There is no room to add '{name}' under '{supervisor_name}'. Increase HIERARCHY_GAP", 500)
+
+    # split the free room in three, leaving room inside the new employee and after them
+    step = (supervisor.rgt - free_start) // 3
+    lft = free_start + step
+    rgt = lft + step
+    employee_id = _new_id()
+    Employee.bulk_insert([{'employee_id': employee_id, 'name': name, 'supervisor_id': supervisor.employee_id,
+                           'lft': lft, 'rgt': rgt, 'depth': supervisor.depth + 1, 'headcount': 0,
+                           'direct_reports': 0}])
+    _change_headcounts(lft, rgt, 1)
+    _change_direct_reports(supervisor.employee_id, 1)
+    changed_ids.add(employee_id)
+    if step - 1 < MIN_ROOM or supervisor.rgt - rgt - 1 < MIN_ROOM:
+        return supervisor.employee_id
+    return None
+
+
+def move_employee(name, supervisor_name, changed_ids):
+    """
+    Moves an employee, together with everyone they supervise, under a new supervisor. Only the moved employees are
+    renumbered, into the free room after the new supervisor's last subordinate. If there is not enough room, it is
+    made by renumbering the team of the lowest supervisor above whose interval can hold it
+    :param name: str. The name of the employee to move
+    :param supervisor_name: str. The name of the new supervisor
+    :param changed_ids: set the id of the moved employee is added to
+    :return: the id of the supervisor whose interval is running low on room and should be rebalanced, or None
+    :raises: HierarchyOperationError
+    """
+    employee = _find_existing(name)
+    supervisor = _find_existing(supervisor_name, 'supervisor')
+    if employee.lft <= supervisor.lft <= employee.rgt:
+        raise HierarchyOperationError(
+            f"The employee: '{name}' can't be supervised by '{supervisor_name}', who they supervise")
+    if employee.supervisor_id == supervisor.employee_id:
+        return None
+
+    # the moved employees are renumbered into the free room after the new supervisor's last subordinate, each of
+    # their lft and rgt values taking one step of the room
+    subtree = _subtree(employee)
+    needed_room = 2 * len(subtree) + 1
+    free_start = _free_start(supervisor)
+    if supervisor.rgt - free_start < needed_room:
+        # there is not enough room left in the new supervisor's interval
+        _make_room(supervisor, needed_room)
+        employee = _find(name)
+        supervisor = _find(supervisor_name)
+        subtree = _subtree(employee)
+        free_start = _free_start(supervisor)
+
+    step = min(current_app.config['HIERARCHY_GAP'], (supervisor.rgt - free_start) // needed_room)
+    values = sorted(value for row in subtree for value in (row.lft, row.rgt))
+    new_values = {value: free_start + (position + 1) * step for position, value in enumerate(values)}
+    # the moved employees all go up or down by the same number of levels
+    depth_change = supervisor.depth + 1 - employee.depth
+    # the moved employees leave the teams above the employee and join the teams above their new position
+    _change_headcounts(employee.lft, employee.rgt, -len(subtree))
+    Employee.bulk_update(
+        {'employee_id': row.employee_id, 'lft': new_values[row.lft], 'rgt': new_values[row.rgt],
+         'depth': row.depth + depth_change} for row in subtree)
+    Employee.query.filter(Employee.employee_id == employee.employee_id).update(
+        {Employee.supervisor_id: supervisor.employee_id}, synchronize_session=False)
+    _change_headcounts(new_values[employee.lft], new_values[employee.rgt], len(subtree))
+    _change_direct_reports(employee.supervisor_id, -1)
+    _change_direct_reports(supervisor.employee_id, 1)
+    changed_ids.add(employee.employee_id)
+    if step - 1 < MIN_ROOM or supervisor.rgt - new_values[employee.rgt] - 1 < MIN_ROOM:
+        return supervisor.employee_id
+    return None
+
+
+def remove_employee(name, changed_ids):
+    """
+    Removes an employee. Their subordinates are then supervised by the removed employee's supervisor, and since
+    their intervals already lie within that supervisor's interval, nobody is renumbered. Everyone under the removed
+    employee moves one level up, and the teams above them are one employee smaller
+    :param name: str. The name of the employee to remove
+    :param changed_ids: set the ids of the removed employee and their subordinates are added to
+    :return: None, since removing an employee only frees room
+    :raises: HierarchyOperationError
+    """
+    employee = _find_existing(name)
+    subordinate_ids = [employee_id for employee_id, in db.session.query(Employee.employee_id).filter(
+        Employee.supervisor_id == employee.employee_id)]
+    has_subordinates = bool(subordinate_ids)
+    if employee.supervisor_id is None and has_subordinates:
+        raise HierarchyOperationError(
+            f"The employee: '{name}' is the top most supervisor and can't be removed while supervising employees")
+    if has_subordinates:
+        Employee.query.filter(Employee.supervisor_id == employee.employee_id).update(
+            {Employee.supervisor_id: employee.supervisor_id}, synchronize_session=False)
+        Employee.query.filter(Employee.lft > employee.lft, Employee.lft < employee.rgt).update(
+            {Employee.depth: Employee.depth - 1}, synchronize_session=False)
+    Employee.query.filter(Employee.employee_id == employee.employee_id).delete(synchronize_session=False)
+    _change_headcounts(employee.lft, employee.rgt, -1)
+    if employee.supervisor_id is not None:
+        _change_direct_reports(employee.supervisor_id, len(subordinate_ids) - 1)
+    changed_ids.update(subordinate_ids)
+    changed_ids.add(employee.employee_id)
+    return None
+
+
+# the operations which can be applied in a batch, with the function applying them and the fields they need
+OPERATIONS = {
+    'add': (add_employee, ('name', 'supervisor')),
+    'move': (move_employee, ('name', 'supervisor')),
+    'remove': (remove_employee, ('name',))
+}
+
+
+def apply_operations(operations):
+    """
+    Applies a list of operations in a single transaction. Either all of them are applied or, if one fails, none.
+    Each operation is a dict with an 'action' (add, move or remove), a 'name' and, for add and move, a 'supervisor'
+    :param operations: list of dicts
+    :return: the id of the new version: int
+    :raises: HierarchyOperationError with the position of the failed operation in its message
+    """
+    with hierarchy_write_lock:
+        crowded_ids = set()
+        changed_ids = set()
+        try:
+            for position, operation in enumerate(operations):
+                if not isinstance(operation, dict) or operation.get('action') not in OPERATIONS:
+                    raise HierarchyOperationError(
+                        f"Operation {position}: the action should be one of {list(OPERATIONS)}")
+                function, fields = OPERATIONS[operation['action']]
+                try:
+                    crowded_id = function(*(operation.get(field) for field in fields), changed_ids)
+                except HierarchyOperationError as error:
+                    if len(operations) > 1:
+                        raise HierarchyOperationError(
+                            f'Operation {position}: {error.message}', error.status_code) from error
+                    raise
+                if crowded_id is not None:
+                    crowded_ids.add(crowded_id)
+            if len(operations) == 1:
+                description = f"{operations[0]['action']} '{operations[0].get('name')}'"
+            else:
+                description = f'{len(operations)} operations'
+            version_id = record_change(changed_ids, description)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        refresh_read_cache()
+    if crowded_ids:
+        rebalance_in_background(crowded_ids)
+    return version_id
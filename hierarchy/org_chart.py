@@ -0,0 +1,25 @@
+from helpers.json_stream import StreamedObject
+
+
+def org_chart(rows, top_depth=0):
+    """
+    Rebuilds the nested {employee: {subordinate: {...}}} hierarchy from employees in the order of their lft values,
+    as it is encoded. Every employee comes right after their supervisor or a fellow subordinate's team, so the
+    subordinates of each employee are the rows after them until one which is not deeper than them. Each level is a
+    generator over the same rows, and the encoder keeps a stack of them, so only one row and one generator per level
+    are held in memory
+    :param rows: iterable of (name, depth) rows of each employee, in the order of their lft values
+    :param top_depth: int. The depth of the top most employees of the rows
+    :return: the hierarchy: StreamedObject
+    """
+    rows = iter(rows)
+    # the next row, which none of the levels has taken yet
+    pending = [next(rows, None)]
+
+    def subordinates(depth):
+        while pending[0] is not None and pending[0][1] >= depth:
+            name, employee_depth = pending[0]
+            pending[0] = next(rows, None)
+            yield name, StreamedObject(subordinates(employee_depth + 1))
+
+    return StreamedObject(subordinates(top_depth))
@@ -1,8 +1,33 @@
+import itertools
 import uuid
-from collections import defaultdict
+from collections import defaultdict, deque
+from hierarchy.compact_tree import CompactTree
 from hierarchy.employee import Employee
 
 
+def new_employee_id(employee_name):
+    """
+    Generates a new unique id for an employee. This is the default id factory used when compiling the hierarchy
+    :param employee_name: str. The name of the employee the id is generated for
+    :return: id: str. A UUID hex string
+    """
+    return uuid.uuid4().hex
+
+
+def sequential_id_factory(first_id):
+    """
+    Creates an id factory which allocates consecutive integer ids, starting at first_id. It is used when the
+    employee table has integer ids
+    :param first_id: int. The first id to allocate
+    :return: id factory: callable
+    """
+    counter = itertools.count(first_id)
+
+    def next_employee_id(employee_name):
+        return next(counter)
+    return next_employee_id
+
+
 def organize_hierarchy(hierarchy_dict):
     """
     Creates a dictionary with the hierarchy from the top boss (CEO) to the subordinates who don't have
@@ -31,102 +56,41 @@ def construct_hierarchy_tree(top_down_hierarchy_dict):
     if not top_down_hierarchy_dict:
         return None
 
-    all_employees = {}
-
     # do a breadth first search (BFS) on the hierarchy using a queue
-    # the queue contains the employees' names initialized to the top most employee
-    queue = [next(iter(top_down_hierarchy_dict))]
-
-    # the top most supervisor
-    root_employee = None
+    # the queue contains the employees together with the dictionary of their subordinates, initialized to the top
+    # most employee
+    root_name = next(iter(top_down_hierarchy_dict))
+    root_employee = Employee(name=root_name)
+    queue = deque([(root_employee, top_down_hierarchy_dict[root_name])])
 
     while queue:
-        employee_name = queue.pop(0)
-        if employee_name not in all_employees:
-            # this is for the root supervisor (E.g. CEO)
-            supervisor_employee = Employee(name=employee_name)
-            root_employee = supervisor_employee
-            all_employees[employee_name] = supervisor_employee
-        else:
-            supervisor_employee = all_employees[employee_name]
-
-        if employee_name not in top_down_hierarchy_dict:
-            # we have reached the end of this branch
-            continue
-        else:
-            # get the new top_down_hierarchy_dict with the current employee as the top most
-            top_down_hierarchy_dict = top_down_hierarchy_dict[employee_name]
-
-            for subordinate_name in top_down_hierarchy_dict:
-                subordinate_employee = Employee(name=subordinate_name, supervisor=supervisor_employee)
-                supervisor_employee.add_subordinate(subordinate_employee)
-                all_employees[subordinate_name] = subordinate_employee
-                queue.append(subordinate_name)
+        supervisor_employee, subordinates_dict = queue.popleft()
+        for subordinate_name, subordinate_subordinates_dict in subordinates_dict.items():
+            subordinate_employee = Employee(name=subordinate_name, supervisor=supervisor_employee)
+            supervisor_employee.add_subordinate(subordinate_employee)
+            queue.append((subordinate_employee, subordinate_subordinates_dict))
     return root_employee
 
 
-def do_mptt_traversal(organized_hierarchy_dict):
+def compile_hierarchy(hierarchy_dict, id_factory=new_employee_id, gap=1):
     """
-    Create a dictionary to store the modified preorder tree traversal (mptt) tree employee values for insertion in the
-    database. This calculates the lft and rgt values for each node, for use in the nested sets model, and sets a
-    supervisor_id for each employee. This makes a hybrid of adjacency model and nested sets model
-
-    Sample item in the mptt dict:
-    {
-        "Sophie": {
-            "name": "Sophie",
-            "lft": 2,
-            "rgt": 9,
-            "id": "ef68absfg3342",
-            "supervisor_id": "257cde2534325"
-        }
-    }
-    :param organized_hierarchy_dict: organized dictionary to parse into a tree
-    :return: dictionary with employees and their respective values for the Employee database model: dict
+    Compiles the flat {employee: supervisor} dictionary into a CompactTree holding the modified preorder tree
+    traversal (mptt) values of every employee, and gives every employee exactly one id. The tree keeps the names,
+    supervisors, lft, rgt, depth and headcount of all the employees in integer arrays, so no dict is made per
+    employee and the compilation is linear in the number of employees. The rows of the employee table are then made
+    from the arrays one at a time, see models.employee.Employee.hierarchy_rows
+
+    With a gap larger than 1, consecutive lft and rgt values are that far apart. The free numbers between them
+    let single employees be added or moved later without renumbering the rest of the tree.
+    :param hierarchy_dict: dict. The flat dictionary mapping each employee to their supervisor
+    :param id_factory: callable. Called once with each employee name, in the order of their lft values, and returns
+    the id to assign to the employee
+    :param gap: int. The difference between consecutive lft and rgt values
+    :return: tuple of the tree and the list of the id of each employee by their index in the tree: (CompactTree, list)
     """
-
-    mptt_dict = {}
-    root = construct_hierarchy_tree(organized_hierarchy_dict)
-    stack = []
-    if not root:
-        return mptt_dict
-
-    stack.append(root)
-
-    counter = 0
-
-    while stack:
-        employee = stack[-1]
-        supervisor = employee.supervisor
-        if not supervisor:
-            # this is a root
-            supervisor_id = None
-        else:
-            supervisor_id = mptt_dict[supervisor.name]['id']
-
-        employee_id = uuid.uuid4().hex
-        if employee.name not in mptt_dict:
-            # we are seeing this employee for the first time, so we set their "lft" value. The "rgt" will just be the
-            # initial '0'.
-            counter += 1
-            employee.lft = counter
-            mptt_dict[employee.name] = {
-                'name': employee.name,
-                "id": employee_id,
-                "supervisor_id": supervisor_id,
-                "lft": employee.lft,
-                "rgt": employee.rgt
-            }
-
-            # reverse the children so that when added to the stack, the starting child is picked first
-            subordinates = reversed(employee.subordinates)
-            for subordinate in subordinates:
-                stack.append(subordinate)
-        else:
-            # we are now seeing this employee for the second time, so we set the "rgt" value.
-            counter += 1
-            mptt_dict[employee.name]['rgt'] = counter
-            # we are done with it, remove it from the stack
-            stack.pop()
-
-    return mptt_dict
+    tree = CompactTree.from_hierarchy_dict(hierarchy_dict, gap)
+    ids = [None] * len(tree)
+    names = tree.names
+    for index in tree.preorder():
+        ids[index] = id_factory(names[index])
+    return tree, ids
@@ -0,0 +1,243 @@
+import logging
+import threading
+import time
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+from hierarchy.ancestors import AncestorIndex
+from hierarchy.storage import NestedSetStorage, register_storage
+from hierarchy.versions import latest_version
+from models.model_mixin import run_maintenance
+
+
+class HierarchyReadCache:
+    """
+    An in-process, read-only cache of the current hierarchy, holding its parent pointers and binary lifting table.
+    It is replaced as a whole after every successful write of this process, so lookups don't touch the database.
+    The replacement is rebuilt as background maintenance, so the write doesn't wait for it. Until it is swapped in,
+    the version is read from the database, the supervisor lookups fall back to the nested sets values and the
+    lookups which need the index wait for the swap, so a client never reads the hierarchy its own write replaced.
+    Other processes' writes are noticed by checking the latest version once the HIERARCHY_CACHE_TTL has passed.
+
+    The counters are plain integers updated without a lock, so under many threads they are approximate.
+    """
+
+    def __init__(self):
+        # the loaded version, its index and when the version was last checked are replaced together, so readers
+        # never see a mix of two versions
+        self._entry = None
+        self._load_lock = threading.Lock()
+        # whether a background refresh is running, and whether another write happened since it started loading
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+        self._stale = False
+        # set whenever every write of this process is swapped in
+        self._swapped = threading.Event()
+        self._swapped.set()
+        self.hits = 0
+        self.misses = 0
+        self.swaps = 0
+
+    def ancestor_index(self):
+        """
+        Gets the index of the current hierarchy. It is served from memory (a hit) unless nothing is loaded yet or
+        the loaded version should be checked again (a miss)
+        the loaded version should be checked again (a miss). It waits for the index of a write which isn't swapped
+        in yet
+        :return: index: AncestorIndex
+        """
+        self._swapped.wait()
+        return self._current_entry()[1]
+
+    def version(self):
+        """
+        Gets the current hierarchy version, the same way as its index. It isn't counted as a lookup, since it comes
+        before the lookups of a request. While a write isn't swapped in, it is read from the database
+        :return: tuple of the version_id and created_at, empty if the hierarchy was never stored
+        """
+        if self.pending():
+            return tuple(latest_version() or ())
+        return self._current_entry(counted=False)[0]
+
+    def pending(self):
+        """
+        Checks whether a write of this process isn't swapped in yet, so the loaded index is older than the stored
+        hierarchy
+        :return: bool
+        """
+        return not self._swapped.is_set()
+
+    def _current_entry(self, counted=True):
+        """
+        Gets the loaded entry, after checking the latest version again if it is missing or was checked longer than
+        the HIERARCHY_CACHE_TTL ago
+        :param counted: bool. Whether the hit or miss is counted
+        :return: tuple of the version, the index and when the version was checked
+        """
+        entry = self._entry
+        if entry is not None:
+            ttl = current_app.config['HIERARCHY_CACHE_TTL']
+            if not ttl or time.monotonic() - entry[2] < ttl:
+                self.hits += counted
+                return entry
+        self.misses += counted
+        return self._revalidate(entry)
+
+    def _revalidate(self, entry):
+        """
+        Checks the latest version and loads it if it isn't the loaded one. Only one thread loads at a time, and the
+        others then use what it loaded
+        :param entry: the entry which was found stale or missing
+        :return: the current entry
+        """
+        with self._load_lock:
+            if self._entry is not entry:
+                return self._entry
+            version = tuple(latest_version() or ())
+            if entry is not None and entry[0] == version:
+                self._entry = (version, entry[1], time.monotonic())
+                return self._entry
+            # a lookup is waiting for the hierarchy, so the name search index is built after it is swapped in
+            self.refresh(version, build_search=False)
+            return self._entry
+
+    def refresh(self, version=None, build_search=True):
+        """
+        Loads the stored hierarchy and swaps it in. This is called after every successful write, in the writer's
+        transaction order
+        :param version: tuple of the version_id and created_at of the stored version, if already known
+        :param build_search: bool. Whether the name search index is built before the swap, so no search waits for
+        it. Otherwise it is built as background maintenance after the swap
+        :return: index: AncestorIndex
+        """
+        if version is None:
+            version = tuple(latest_version() or ())
+        ancestor_index = AncestorIndex.from_stored()
+        if build_search:
+            ancestor_index.name_search()
+        self._entry = (version, ancestor_index, time.monotonic())
+        self.swaps += 1
+        if not build_search:
+            run_maintenance(ancestor_index.name_search, 'build-name-search')
+        return ancestor_index
+
+    def refresh_in_background(self):
+        """
+        Loads the stored hierarchy and swaps it in as background maintenance, so the write which changed it doesn't
+        wait for the index to be rebuilt. The writes made while a refresh runs are picked up by one more refresh
+        after it, instead of one each. If the hierarchy can't be loaded, the cache is dropped, so the next lookup
+        loads it instead of reading the replaced hierarchy
+        """
+        with self._refresh_lock:
+            self._stale = True
+            self._swapped.clear()
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def task():
+            try:
+                while self._take_stale():
+                    try:
+                        with self._load_lock:
+                            self.refresh()
+                    except SQLAlchemyError as e:
+                        logging.error(f"An error has occurred while refreshing the hierarchy read cache - {e}")
+                        self.clear()
+            except Exception:
+                # a later write starts a new refresh, and the next lookup loads the hierarchy until then
+                self.clear()
+                with self._refresh_lock:
+                    self._refreshing = False
+                    self._swapped.set()
+                raise
+        run_maintenance(task, 'refresh-read-cache')
+
+    def _take_stale(self):
+        """
+        Checks whether the cache should be refreshed again, and marks the background refresh as finished if not
+        :return: bool
+        """
+        with self._refresh_lock:
+            stale = self._stale
+            self._stale = False
+            self._refreshing = stale
+            if not stale:
+                self._swapped.set()
+            return stale
+
+    def clear(self):
+        """
+        Drops the loaded hierarchy, so the next lookup loads it again
+        """
+        self._entry = None
+
+    def stats(self):
+        """
+        Gets the counters of the cache and what is loaded
+        :return: dict
+        """
+        entry = self._entry
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'swaps': self.swaps,
+            'version': entry[0][0] if entry and entry[0] else None,
+            'employees': len(entry[1]) if entry else 0
+        }
+
+
+read_cache = HierarchyReadCache()
+
+
+@register_storage
+class AncestorIndexStorage(NestedSetStorage):
+    """
+    Answers the supervisor lookups from the binary lifting table of the read cache, so the supervisor any number of
+    levels above an employee is found in O(log depth) steps without a query. Nothing else is stored, and the table
+    is swapped in after every write, and until then the lookups are answered from the nested sets values. Everyone
+    under an employee is read from the nested sets values, like NestedSetStorage does
+    """
+    name = 'ancestor_index'
+
+    def ancestors(self, employee_name, limit=None):
+        if read_cache.pending():
+            return super().ancestors(employee_name, limit)
+        ancestor_index = read_cache.ancestor_index()
+        index = ancestor_index.index(employee_name)
+        if index is None:
+            return None
+        return ancestor_index.chain(index, limit)
+
+    def ancestor_at(self, employee_name, levels):
+        if read_cache.pending():
+            return super().ancestor_at(employee_name, levels)
+        ancestor_index = read_cache.ancestor_index()
+        index = ancestor_index.index(employee_name)
+        if index is None:
+            return False, None
+        position = ancestor_index.ancestor(index, levels)
+        return True, ancestor_index.names[position] if position >= 0 else None
+
+    def two_supervisors(self, employee_names):
+        if read_cache.pending():
+            return super().two_supervisors(employee_names)
+        # the index is taken once, so all the names are answered from the same version
+        ancestor_index = read_cache.ancestor_index()
+        found = {}
+        for name in set(employee_names):
+            index = ancestor_index.index(name)
+            if index is not None:
+                chain = ancestor_index.chain(index, 2)
+                found[name] = tuple(chain) + (None,) * (2 - len(chain))
+        return found
+
+
+def warm_read_cache():
+    """
+    Loads the stored hierarchy into the read cache, so the first lookups don't wait for it. The tables may not exist
+    yet, in which case it is loaded by the first lookup instead
+    """
+    try:
+        read_cache.refresh()
+    except SQLAlchemyError as e:
+        logging.warning(f"The hierarchy read cache could not be warmed - {e}")
@@ -0,0 +1,229 @@
+import heapq
+
+# the columns whose change means a stored employee is updated
+CHANGED_COLUMNS = ('supervisor_id', 'lft', 'rgt', 'depth', 'headcount', 'direct_reports')
+
+
+def reuse_stored_ids(stored_employees, id_factory):
+    """
+    Creates an id factory which gives employees already stored their existing id, so their ids stay stable across
+    uploads, and gives new employees an id from the given factory
+    :param stored_employees: dict mapping the name of each stored employee to their stored values, see
+    models.employee.Employee.stored_hierarchy
+    :param id_factory: callable used for the new employees
+    :return: id factory: callable
+    """
+    def employee_id(employee_name):
+        stored_employee = stored_employees.get(employee_name)
+        if stored_employee is None:
+            return id_factory(employee_name)
+        return stored_employee['employee_id']
+    return employee_id
+
+
+def _anchored(stored_employees, tree, ids):
+    """
+    Finds the employees of a new hierarchy who keep their stored position: they are stored, have the same supervisor
+    as before, and so does everyone above them
+    :param stored_employees: dict mapping the name of each stored employee to their stored values
+    :param tree: CompactTree of the new hierarchy
+    :param ids: list of the id of each employee by their index in the tree
+    :return: bytearray with a 1 for each anchored employee by their index in the tree
+    """
+    names, parents = tree.names, tree.parents
+    anchored = bytearray(len(tree))
+    for index in tree.preorder():
+        stored_employee = stored_employees.get(names[index])
+        if stored_employee is None:
+            continue
+        parent = parents[index]
+        if parent < 0:
+            anchored[index] = stored_employee['supervisor_id'] is None
+        else:
+            anchored[index] = anchored[parent] and stored_employee['supervisor_id'] == ids[parent]
+    return anchored
+
+
+def _place_subordinates(stored_supervisor, anchored_subordinates, floating_subordinates, tree, gap):
+    """
+    Places the teams joining a supervisor into the free room of the supervisor's stored interval, which is the room
+    not taken by the intervals of the subordinates who stay. The teams share the room: their values are all the same
+    step apart, as large as the room allows up to the gap, and the largest teams are placed first, each into the
+    largest free range left
+    :param stored_supervisor: dict of the stored values of the supervisor
+    :param anchored_subordinates: list of the stored values of the subordinates who stay
+    :param floating_subordinates: list of the indexes of the subordinates who join, in the tree
+    :param tree: CompactTree of the new hierarchy
+    :param gap: int. The largest difference between consecutive lft and rgt values
+    :return: dict mapping the index of each joining subordinate to the number before their lft and the step between
+    their values, or None if they don't all fit
+    """
+    free_ranges = []
+    start = stored_supervisor['lft']
+    for subordinate in sorted(anchored_subordinates, key=lambda values: values['lft']):
+        free_ranges.append((start, subordinate['lft']))
+        start = subordinate['rgt']
+    free_ranges.append((start, stored_supervisor['rgt']))
+
+    # a team of n employees takes 2n values, with a step of room before, between and after them
+    teams = sorted(floating_subordinates, key=lambda index: -tree.headcounts[index])
+    needed_room = sum(2 * tree.headcounts[index] + 3 for index in teams)
+    free_room = sum(end - start for start, end in free_ranges)
+    shared_step = min(gap, max(1, free_room // needed_room))
+    for step in sorted({shared_step, 1}, reverse=True):
+        # the free ranges, as a heap of their negated size, start and end
+        heap = [(start - end, start, end) for start, end in free_ranges]
+        heapq.heapify(heap)
+        placements = {}
+        for index in teams:
+            team_room = (2 * tree.headcounts[index] + 3) * step
+            negated_room, start, end = heapq.heappop(heap)
+            if -negated_room < team_room:
+                break
+            placements[index] = (start, step)
+            start += team_room - step
+            heapq.heappush(heap, (start - end, start, end))
+        else:
+            return placements
+    return None
+
+
+def fit_into_stored_intervals(stored_employees, tree, ids, gap):
+    """
+    Renumbers a newly compiled hierarchy so it changes as few stored lft and rgt values as it can. Employees who keep
+    their supervisor, all the way up, keep their stored lft and rgt. New and moved employees, with their teams, are
+    placed into the free room their new supervisor's stored interval has between the subordinates who stay, the way
+    single employees are added and moved by hierarchy.operations. When a supervisor has not enough room, the lowest
+    supervisor above them whose interval can hold their whole new team is renumbered inside their stored interval,
+    and the interval of the top most supervisor grows if it is too small. A one employee change so only writes the
+    employee and the supervisors above them, who have a new headcount. If the top most supervisor changed, nobody
+    keeps their position and the fresh numbering of the compilation is kept. The new hierarchy should have been
+    compiled with the gap and the ids from reuse_stored_ids.
+    :param stored_employees: dict mapping the name of each stored employee to their stored values, see
+    models.employee.Employee.stored_hierarchy
+    :param tree: CompactTree of the new hierarchy. Its lft and rgt values are changed in place
+    :param ids: list of the id of each employee by their index in the tree
+    :param gap: int. The difference between consecutive lft and rgt values of the compilation
+    :return: whether the stored intervals were kept: bool
+    """
+    names, parents, lft, rgt, headcounts = tree.names, tree.parents, tree.lft, tree.rgt, tree.headcounts
+    anchored = _anchored(stored_employees, tree, ids)
+    if not any(anchored[root] for root in tree.roots):
+        return False
+
+    # work out where the employees joining each supervisor who stays go. The supervisors without enough room are
+    # renumbered inside their own interval, or the one of the lowest supervisor above them with enough room. Nothing
+    # is outside the interval of the top most supervisor, so theirs grows instead when it is too small
+    placements = {}
+    renumbered = {}
+    grown_rgts = {}
+    for index in tree.preorder():
+        if not anchored[index]:
+            continue
+        subordinates = tree.subordinates(index)
+        floating_subordinates = [subordinate for subordinate in subordinates if not anchored[subordinate]]
+        if not floating_subordinates:
+            continue
+        stored_supervisor = stored_employees[names[index]]
+        anchored_subordinates = [
+            stored_employees[names[subordinate]] for subordinate in subordinates if anchored[subordinate]]
+        supervisor_placements = _place_subordinates(
+            stored_supervisor, anchored_subordinates, floating_subordinates, tree, gap)
+        if supervisor_placements is None and parents[index] < 0:
+            grown_rgts[index] = stored_supervisor['rgt'] + gap * sum(
+                2 * headcounts[subordinate] + 3 for subordinate in floating_subordinates)
+            supervisor_placements = _place_subordinates(
+                dict(stored_supervisor, rgt=grown_rgts[index]), anchored_subordinates, floating_subordinates, tree,
+                gap)
+        if supervisor_placements is not None:
+            placements.update(supervisor_placements)
+            continue
+        supervisor = index
+        while True:
+            stored_supervisor = stored_employees[names[supervisor]]
+            # the team takes the 2 * headcount values strictly inside the interval, a step apart
+            step = min(gap, (stored_supervisor['rgt'] - stored_supervisor['lft']) // (2 * headcounts[supervisor] + 1))
+            if step >= 1:
+                renumbered[supervisor] = step
+                break
+            if parents[supervisor] < 0:
+                renumbered[supervisor] = gap
+                grown_rgts[supervisor] = stored_supervisor['lft'] + (2 * headcounts[supervisor] + 1) * gap
+                break
+            supervisor = parents[supervisor]
+
+    # each employee who doesn't keep their stored values is renumbered from their compiled values with the
+    # transform of the team they are placed with: the number before the team, the step between the team's values
+    # and the compiled lft of the team's top employee
+    transforms = [None] * len(tree)
+    for index in tree.preorder():
+        parent = parents[index]
+        compiled_lft, compiled_rgt = lft[index], rgt[index]
+        if parent >= 0 and transforms[parent] is not None:
+            transform = transforms[parent]
+        elif index in renumbered:
+            stored_employee = stored_employees[names[index]]
+            # the top employee keeps their values and their team is spread inside their interval
+            transform = (stored_employee['lft'], renumbered[index], compiled_lft)
+            transforms[index] = transform
+            lft[index], rgt[index] = stored_employee['lft'], grown_rgts.get(index, stored_employee['rgt'])
+            continue
+        elif anchored[index]:
+            stored_employee = stored_employees[names[index]]
+            lft[index], rgt[index] = stored_employee['lft'], grown_rgts.get(index, stored_employee['rgt'])
+            continue
+        else:
+            start, step = placements[index]
+            transform = (start + step, step, compiled_lft)
+        transforms[index] = transform
+        base, step, origin = transform
+        lft[index] = base + (compiled_lft - origin) // gap * step
+        rgt[index] = base + (compiled_rgt - origin) // gap * step
+    return True
+
+
+def plan_restructure(stored_employees, tree, rows):
+    """
+    Compares the stored hierarchy with a newly compiled one by employee name, and works out the changes needed to
+    turn the stored hierarchy into the new one. Employees who are in both keep their stored id, and are only
+    updated if their supervisor, lft, rgt, depth, headcount or number of direct reports changed.
+    The new hierarchy should have been compiled with the ids from reuse_stored_ids.
+    :param stored_employees: dict mapping the name of each stored employee to their stored values, see
+    models.employee.Employee.stored_hierarchy
+    :param tree: CompactTree of the new hierarchy
+    :param rows: iterable of the rows of the new hierarchy, see models.employee.Employee.hierarchy_rows
+    :return: dict with the rows to insert, the rows to update and the ids of the employees to delete
+    """
+    inserts = []
+    updates = []
+    for row in rows:
+        stored_employee = stored_employees.get(row['name'])
+        if stored_employee is None:
+            inserts.append(row)
+        elif any(stored_employee[column] != row[column] for column in CHANGED_COLUMNS):
+            del row['name']
+            updates.append(row)
+
+    deletes = [
+        stored_employee['employee_id'] for name, stored_employee in stored_employees.items()
+        if tree.index(name) is None
+    ]
+    return {
+        'inserts': inserts,
+        'updates': updates,
+        'deletes': deletes
+    }
+
+
+def needs_rebuild(plan, stored_count, new_count, rebuild_ratio):
+    """
+    Checks whether a planned restructure changes so much of the hierarchy that writing the whole hierarchy to a new
+    table is better than changing the stored one row by row
+    :param plan: dict. The plan from plan_restructure
+    :param stored_count: int. The number of stored employees
+    :param new_count: int. The number of employees in the new hierarchy
+    :param rebuild_ratio: float. The share of changed employees from which the hierarchy is rebuilt
+    :return: bool
+    """
+    changed_count = len(plan['inserts']) + len(plan['updates']) + len(plan['deletes'])
+    return changed_count >= rebuild_ratio * max(stored_count, new_count, 1)
@@ -0,0 +1,510 @@
+import uuid
+import zlib
+from array import array
+from flask import current_app
+from sqlalchemy.orm import aliased
+from helpers import json_provider
+from hierarchy.compact_tree import CompactTree, INDEX_TYPE
+from models.employee import Employee, INTEGER_IDS
+from models.hierarchy_storage import EmployeeClosure, EmployeePath, HierarchySnapshot
+from models.model_mixin import chunked, db, IN_CHUNK_SIZE
+
+# separates the employee ids in a materialized path. Neither UUID hex strings nor integers contain it
+PATH_SEPARATOR = '.'
+
+# the recorded supervisor of an employee a strategy has no structures for
+_NOT_RECORDED = object()
+
+
+def _employee_id(employee_name):
+    """
+    Gets the id of an employee
+    :param employee_name: str. The name of the employee
+    :return: id or None if there is no such employee
+    """
+    return db.session.query(Employee.employee_id).filter(Employee.name == employee_name).scalar()
+
+
+def _supervisor_chains(top=None):
+    """
+    Walks the stored employees in the order of their lft values, keeping the chain of supervisors of the current
+    employee on a stack. Only the columns are queried
+    :param top: row with the lft and rgt of an employee, to only walk them and everyone under them
+    :return: generator of tuples of an employee row and the list of rows of their supervisors, top most first. The
+    list is reused between employees, so it should not be kept
+    """
+    columns = (Employee.employee_id, Employee.name, Employee.lft, Employee.rgt)
+    rows = db.session.query(*columns).order_by(Employee.lft)
+    chain = []
+    if top is not None:
+        rows = rows.filter(Employee.lft >= top.lft, Employee.lft < top.rgt)
+        # the supervisors above the top employee stay on the stack, since their intervals hold the whole walk
+        chain = db.session.query(*columns).filter(Employee.lft < top.lft, Employee.rgt > top.rgt).order_by(
+            Employee.lft).all()
+    for row in rows:
+        while chain and chain[-1].rgt < row.lft:
+            chain.pop()
+        yield row, chain
+        chain.append(row)
+
+
+def _moved_teams(employee_ids, recorded_supervisor_ids):
+    """
+    Finds the changed employees whose structures have to be synced, together with everyone under them. They are
+    the employees whose supervisor is not the one the strategy recorded for them, which includes the new ones, since
+    the chain of supervisors of everyone under them changed too
+    :param employee_ids: list of the ids of the employees which were added, changed or removed
+    :param recorded_supervisor_ids: dict mapping the id of each recorded employee to their recorded supervisor id
+    :return: tuple of the list of the ids of the removed employees and the list of rows with the employee_id, lft and
+    rgt of the top most moved employees, none of whom is under another
+    """
+    stored = {}
+    for chunk in chunked(employee_ids, IN_CHUNK_SIZE):
+        stored.update((row.employee_id, row) for row in db.session.query(
+            Employee.employee_id, Employee.supervisor_id, Employee.lft, Employee.rgt).filter(
+            Employee.employee_id.in_(chunk)))
+    removed_ids = [employee_id for employee_id in employee_ids if employee_id not in stored]
+    moved = sorted((row for employee_id, row in stored.items()
+                    if recorded_supervisor_ids.get(employee_id, _NOT_RECORDED) != row.supervisor_id),
+                   key=lambda row: row.lft)
+    tops = []
+    for row in moved:
+        if not tops or row.lft > tops[-1].rgt:
+            tops.append(row)
+    return removed_ids, tops
+
+
+def _team_ids(top):
+    """
+    Gets the ids of an employee and everyone under them
+    :param top: row with the lft and rgt of the employee
+    :return: list of ids
+    """
+    return [employee_id for employee_id, in db.session.query(Employee.employee_id).filter(
+        Employee.lft >= top.lft, Employee.lft < top.rgt)]
+
+
+STORAGE_STRATEGIES = {}
+
+
+def register_storage(strategy):
+    """
+    Adds a storage strategy to the ones the HIERARCHY_STORAGE config can select. It is used as a class decorator
+    :param strategy: the HierarchyStorage subclass
+    :return: the strategy
+    """
+    STORAGE_STRATEGIES[strategy.name] = strategy
+    return strategy
+
+
+class HierarchyStorage:
+    """
+    The interface the hierarchy views read the stored hierarchy through. The employee table, with its adjacency
+    list and nested sets values, is always the system of record and is written by hierarchy.operations. A storage
+    strategy answers the reads, and may keep its own structures which it brings up to date in sync
+    """
+    name = None
+
+    def sync(self, employee_ids=None):
+        """
+        Brings the strategy's own structures up to date with the employee table, within the current transaction.
+        The caller should commit
+        :param employee_ids: iterable of the ids of the employees which were added, changed or removed, or None to
+        rewrite the structures for everyone
+        """
+
+    def ancestors(self, employee_name, limit=None):
+        """
+        Gets the supervisors of an employee up the hierarchy
+        :param employee_name: str. The name of the employee
+        :param limit: int. The maximum number of supervisors to get, or None for all of them
+        :return: list of names, the immediate supervisor first, or None if there is no such employee
+        """
+        raise NotImplementedError
+
+    def descendants(self, employee_name):
+        """
+        Gets everyone an employee supervises, directly or not
+        :param employee_name: str. The name of the employee
+        :return: list of names in the order of the hierarchy, or None if there is no such employee
+        """
+        raise NotImplementedError
+
+    def ancestor_at(self, employee_name, levels):
+        """
+        Gets the supervisor a number of levels above an employee
+        :param employee_name: str. The name of the employee
+        :param levels: int. How many levels up to go, at least 1
+        :return: tuple of whether the employee exists and the name of the supervisor, None if the hierarchy is not
+        that deep above the employee
+        """
+        ancestors = self.ancestors(employee_name, levels)
+        if ancestors is None:
+            return False, None
+        return True, ancestors[-1] if len(ancestors) == levels else None
+
+    def two_supervisors(self, employee_names):
+        """
+        Gets the supervisor and the supervisor's supervisor of many employees
+        :param employee_names: iterable of names
+        :return: dict mapping the name of each employee who exists to a tuple of the names of their supervisor and
+        their supervisor's supervisor, each None if there is none
+        """
+        found = {}
+        for name in set(employee_names):
+            ancestors = self.ancestors(name, 2)
+            if ancestors is not None:
+                found[name] = tuple(ancestors) + (None,) * (2 - len(ancestors))
+        return found
+
+    # the reads below only need the current hierarchy. The employee table always has its nested sets values, so they
+    # are read from it unless a strategy's own structures answer them
+
+    def employee(self, employee_name):
+        """
+        Gets where an employee is in the hierarchy, which the other reads below take to find their team
+        :param employee_name: str. The name of the employee
+        :return: row with the employee_id, name, lft, rgt and depth of the employee, or None if there is no such
+        employee
+        """
+        return db.session.query(Employee.employee_id, Employee.name, Employee.lft, Employee.rgt, Employee.depth).filter(
+            Employee.name == employee_name).first()
+
+    def descendants_page(self, supervisor, after, limit):
+        """
+        Gets a keyset page of the employees under a supervisor, in the order of their lft values
+        :param supervisor: the row of the supervisor, see employee
+        :param after: int. The lft value of the last employee of the previous page, or the supervisor's own lft
+        :param limit: int. The maximum number of employees in the page
+        :return: list of rows with the lft and name of each employee and the name of their supervisor
+        """
+        return Employee.descendants_page(supervisor.rgt, after, limit)
+
+    def subtree_scan(self, supervisor=None, max_depth=None, page_size=1000):
+        """
+        Scans the employees of the hierarchy, or of the part of it under a supervisor, in the order of their lft
+        values, without holding them all in memory
+        :param supervisor: the row of a supervisor, see employee, to only scan them and the employees under them
+        :param max_depth: int. To leave out the employees deeper than this
+        :param page_size: int. The number of rows fetched at a time
+        :return: iterable of (name, depth) rows
+        """
+        return Employee.subtree_scan(supervisor, max_depth, page_size)
+
+    def level_below(self, supervisor, levels):
+        """
+        Gets the employees exactly a number of levels below a supervisor, in the order of their lft values
+        :param supervisor: the row of the supervisor, see employee
+        :param levels: int. How many levels down to go, at least 1
+        :return: list of names
+        """
+        return Employee.level_below(supervisor, levels)
+
+    def top_managers(self, by, limit, minimum=1, supervisor=None, depth=None):
+        """
+        Gets the managers with the most employees under them, largest first
+        :param by: str. 'total' to rank by the headcount or 'direct' to rank by the number of direct reports
+        :param limit: int. The maximum number of managers
+        :param minimum: int. The smallest ranked count of the managers returned, at least 1
+        :param supervisor: the row of a supervisor, see employee, to only rank the managers under them
+        :param depth: int. To only rank the managers this many levels below the top most supervisor
+        :return: list of rows with the name, headcount, direct_reports and depth of each manager and the name of
+        their supervisor
+        """
+        return Employee.top_managers(by, limit, minimum, supervisor, depth)
+
+
+@register_storage
+class NestedSetStorage(HierarchyStorage):
+    """
+    Reads the lft and rgt values of the employee table. Nothing else is stored, so writes are the cheapest, and
+    ancestors and descendants are each one range query
+    """
+    name = 'nested_set'
+
+    def ancestors(self, employee_name, limit=None):
+        employee = db.session.query(Employee.lft, Employee.rgt).filter(Employee.name == employee_name).first()
+        if employee is None:
+            return None
+        query = db.session.query(Employee.name).filter(Employee.lft < employee.lft, Employee.rgt > employee.rgt)
+        query = query.order_by(Employee.lft.desc())
+        if limit is not None:
+            query = query.limit(limit)
+        return [name for name, in query]
+
+    def descendants(self, employee_name):
+        employee = db.session.query(Employee.lft, Employee.rgt).filter(Employee.name == employee_name).first()
+        if employee is None:
+            return None
+        query = db.session.query(Employee.name).filter(Employee.lft > employee.lft, Employee.rgt < employee.rgt)
+        return [name for name, in query.order_by(Employee.lft)]
+
+
+@register_storage
+class ClosureTableStorage(HierarchyStorage):
+    """
+    Keeps a row for every employee and each of their supervisors, so the supervisors k levels up are found with one
+    primary key lookup, however deep the hierarchy is. Syncing only rewrites the rows of the moved teams, which have a
+    row per employee per level above them
+    """
+    name = 'closure_table'
+
+    @staticmethod
+    def _insert(top=None):
+        EmployeeClosure.bulk_insert(
+            {'descendant_id': row.employee_id, 'depth': len(chain) - position, 'ancestor_id': supervisor.employee_id}
+            for row, chain in _supervisor_chains(top)
+            for position, supervisor in enumerate(chain)
+        )
+
+    @staticmethod
+    def _delete(employee_ids):
+        for chunk in chunked(employee_ids, IN_CHUNK_SIZE):
+            EmployeeClosure.query.filter(EmployeeClosure.descendant_id.in_(chunk)).delete(synchronize_session=False)
+
+    def sync(self, employee_ids=None):
+        if employee_ids is None or db.session.query(EmployeeClosure.descendant_id).first() is None:
+            EmployeeClosure.query.delete(synchronize_session=False)
+            self._insert()
+            return
+        employee_ids = list(set(employee_ids))
+        # the top most supervisors have no rows, so everyone without a row for their supervisor is recorded as one
+        recorded_supervisor_ids = dict.fromkeys(employee_ids)
+        for chunk in chunked(employee_ids, IN_CHUNK_SIZE):
+            recorded_supervisor_ids.update(db.session.query(
+                EmployeeClosure.descendant_id, EmployeeClosure.ancestor_id).filter(
+                EmployeeClosure.descendant_id.in_(chunk), EmployeeClosure.depth == 1))
+        removed_ids, tops = _moved_teams(employee_ids, recorded_supervisor_ids)
+        self._delete(removed_ids)
+        for top in tops:
+            self._delete(_team_ids(top))
+            self._insert(top)
+
+    def ancestors(self, employee_name, limit=None):
+        employee_id = _employee_id(employee_name)
+        if employee_id is None:
+            return None
+        query = db.session.query(Employee.name).join(
+            EmployeeClosure, EmployeeClosure.ancestor_id == Employee.employee_id).filter(
+            EmployeeClosure.descendant_id == employee_id)
+        if limit is not None:
+            query = query.filter(EmployeeClosure.depth <= limit)
+        return [name for name, in query.order_by(EmployeeClosure.depth)]
+
+    def descendants(self, employee_name):
+        employee_id = _employee_id(employee_name)
+        if employee_id is None:
+            return None
+        query = db.session.query(Employee.name).join(
+            EmployeeClosure, EmployeeClosure.descendant_id == Employee.employee_id).filter(
+            EmployeeClosure.ancestor_id == employee_id)
+        return [name for name, in query.order_by(Employee.lft)]
+
+    def descendants_page(self, supervisor, after, limit):
+        employee_supervisor = aliased(Employee)
+        return db.session.query(Employee.lft, Employee.name, employee_supervisor.name).join(
+            EmployeeClosure, EmployeeClosure.descendant_id == Employee.employee_id).outerjoin(
+            employee_supervisor, employee_supervisor.employee_id == Employee.supervisor_id).filter(
+            EmployeeClosure.ancestor_id == supervisor.employee_id, Employee.lft > after).order_by(
+            Employee.lft).limit(limit).all()
+
+    def level_below(self, supervisor, levels):
+        # the rows of the supervisor's team that many levels down are one range of the ancestor_id and depth index
+        query = db.session.query(Employee.name).join(
+            EmployeeClosure, EmployeeClosure.descendant_id == Employee.employee_id).filter(
+            EmployeeClosure.ancestor_id == supervisor.employee_id, EmployeeClosure.depth == levels)
+        return [name for name, in query.order_by(Employee.lft)]
+
+
+@register_storage
+class MaterializedPathStorage(HierarchyStorage):
+    """
+    Keeps the path of supervisor ids from the top most supervisor down to each employee. The ancestors are read from
+    a single path, and the descendants are the paths starting with the employee's, found with a range scan of the
+    path index. Syncing only rewrites the paths of the moved teams
+    """
+    name = 'materialized_path'
+
+    @staticmethod
+    def _insert(top=None):
+        EmployeePath.bulk_insert(
+            {'employee_id': row.employee_id,
+             'path': PATH_SEPARATOR.join(str(supervisor.employee_id) for supervisor in chain + [row])}
+            for row, chain in _supervisor_chains(top)
+        )
+
+    @staticmethod
+    def _delete(employee_ids):
+        for chunk in chunked(employee_ids, IN_CHUNK_SIZE):
+            EmployeePath.query.filter(EmployeePath.employee_id.in_(chunk)).delete(synchronize_session=False)
+
+    def sync(self, employee_ids=None):
+        if employee_ids is None or db.session.query(EmployeePath.employee_id).first() is None:
+            EmployeePath.query.delete(synchronize_session=False)
+            self._insert()
+            return
+        employee_ids = list(set(employee_ids))
+        recorded_supervisor_ids = {}
+        for chunk in chunked(employee_ids, IN_CHUNK_SIZE):
+            for employee_id, path in db.session.query(EmployeePath.employee_id, EmployeePath.path).filter(
+                    EmployeePath.employee_id.in_(chunk)):
+                path_ids = path.split(PATH_SEPARATOR)
+                supervisor_id = path_ids[-2] if len(path_ids) > 1 else None
+                if INTEGER_IDS and supervisor_id is not None:
+                    supervisor_id = int(supervisor_id)
+                recorded_supervisor_ids[employee_id] = supervisor_id
+        removed_ids, tops = _moved_teams(employee_ids, recorded_supervisor_ids)
+        self._delete(removed_ids)
+        for top in tops:
+            self._delete(_team_ids(top))
+            self._insert(top)
+
+    @staticmethod
+    def _path(employee_name):
+        return db.session.query(EmployeePath.path).join(
+            Employee, Employee.employee_id == EmployeePath.employee_id).filter(Employee.name == employee_name).scalar()
+
+    def ancestors(self, employee_name, limit=None):
+        path = self._path(employee_name)
+        if path is None:
+            return None
+        ancestor_ids = path.split(PATH_SEPARATOR)[-2::-1]
+        if limit is not None:
+            ancestor_ids = ancestor_ids[:limit]
+        if INTEGER_IDS:
+            ancestor_ids = [int(ancestor_id) for ancestor_id in ancestor_ids]
+        names = {}
+        for chunk in chunked(ancestor_ids, IN_CHUNK_SIZE):
+            names.update(db.session.query(Employee.employee_id, Employee.name).filter(
+                Employee.employee_id.in_(chunk)))
+        return [names[ancestor_id] for ancestor_id in ancestor_ids]
+
+    def descendants(self, employee_name):
+        path = self._path(employee_name)
+        if path is None:
+            return None
+        # every path starting with the employee's path and a separator sorts between these two bounds
+        query = db.session.query(Employee.name).join(
+            EmployeePath, EmployeePath.employee_id == Employee.employee_id).filter(
+            EmployeePath.path > path + PATH_SEPARATOR, EmployeePath.path < path + chr(ord(PATH_SEPARATOR) + 1))
+        return [name for name, in query.order_by(Employee.lft)]
+
+    def descendants_page(self, supervisor, after, limit):
+        path = db.session.query(EmployeePath.path).filter(EmployeePath.employee_id == supervisor.employee_id).scalar()
+        employee_supervisor = aliased(Employee)
+        return db.session.query(Employee.lft, Employee.name, employee_supervisor.name).join(
+            EmployeePath, EmployeePath.employee_id == Employee.employee_id).outerjoin(
+            employee_supervisor, employee_supervisor.employee_id == Employee.supervisor_id).filter(
+            EmployeePath.path > path + PATH_SEPARATOR, EmployeePath.path < path + chr(ord(PATH_SEPARATOR) + 1),
+            Employee.lft > after).order_by(Employee.lft).limit(limit).all()
+
+
+@register_storage
+class SnapshotStorage(HierarchyStorage):
+    """
+    Keeps the whole hierarchy serialized in a single row. Each process loads it once into a compact tree and answers
+    reads from memory, only checking the id of the stored snapshot, which is new for every sync. Syncing rewrites the
+    snapshot, whatever changed
+    """
+    name = 'snapshot'
+
+    def __init__(self):
+        # the loaded snapshot id and tree are replaced together, so readers never see a mix of two snapshots
+        self._loaded = (None, None)
+
+    def sync(self, employee_ids=None):
+        names = []
+        parents = []
+        indexes = {}
+        for row, chain in _supervisor_chains():
+            indexes[row.employee_id] = len(names)
+            names.append(row.name)
+            parents.append(indexes[chain[-1].employee_id] if chain else -1)
+        data = zlib.compress(json_provider.dumps({'names': names, 'parents': parents}).encode())
+        HierarchySnapshot.query.delete(synchronize_session=False)
+        HierarchySnapshot.bulk_insert([{'snapshot_id': uuid.uuid4().hex, 'data': data}])
+
+    def tree(self):
+        """
+        Gets the tree of the stored snapshot, loading it only if it changed since it was last loaded. The employees
+        are indexed in the order of their lft values
+        :return: tree: CompactTree
+        """
+        snapshot_id = db.session.query(HierarchySnapshot.snapshot_id).scalar()
+        loaded_id, tree = self._loaded
+        if snapshot_id != loaded_id:
+            if snapshot_id is None:
+                tree = CompactTree([], array(INDEX_TYPE))
+            else:
+                data = db.session.query(HierarchySnapshot.data).filter(
+                    HierarchySnapshot.snapshot_id == snapshot_id).scalar()
+                snapshot = json_provider.loads(zlib.decompress(data))
+                tree = CompactTree(snapshot['names'], array(INDEX_TYPE, snapshot['parents']))
+            self._loaded = (snapshot_id, tree)
+        return tree
+
+    def ancestors(self, employee_name, limit=None):
+        tree = self.tree()
+        index = tree.index(employee_name)
+        if index is None:
+            return None
+        names = []
+        parent = tree.parents[index]
+        while parent >= 0 and (limit is None or len(names) < limit):
+            names.append(tree.names[parent])
+            parent = tree.parents[parent]
+        return names
+
+    def descendants(self, employee_name):
+        tree = self.tree()
+        index = tree.index(employee_name)
+        if index is None:
+            return None
+        return tree.names[index + 1:self._subtree_end(tree, index)]
+
+    @staticmethod
+    def _subtree_end(tree, index):
+        """
+        Gets the index after the last employee under an employee of the snapshot
+        :param tree: CompactTree
+        :param index: int. The index of the employee
+        :return: int
+        """
+        # the employees are stored in preorder, so everyone under an employee directly follows them
+        return index + 1 + (tree.rgt[index] - tree.lft[index] - 1) // 2
+
+    def subtree_scan(self, supervisor=None, max_depth=None, page_size=1000):
+        tree = self.tree()
+        if supervisor is None:
+            start, end = 0, len(tree)
+        else:
+            start = tree.index(supervisor.name)
+            end = self._subtree_end(tree, start)
+        names, depths = tree.names, tree.depths
+        return ((names[index], depths[index]) for index in range(start, end)
+                if max_depth is None or depths[index] <= max_depth)
+
+    def level_below(self, supervisor, levels):
+        tree = self.tree()
+        index = tree.index(supervisor.name)
+        depth = tree.depths[index] + levels
+        return [tree.names[position] for position in range(index + 1, self._subtree_end(tree, index))
+                if tree.depths[position] == depth]
+
+
+_storages = {}
+
+
+def get_storage():
+    """
+    Gets the storage strategy selected by the HIERARCHY_STORAGE config. There is one instance of each strategy per
+    process
+    :return: storage: HierarchyStorage
+    """
+    name = current_app.config['HIERARCHY_STORAGE']
+    storage = _storages.get(name)
+    if storage is None:
+        if name not in STORAGE_STRATEGIES:
+            raise ValueError(f'Unknown HIERARCHY_STORAGE: {name!r}. It should be one of {list(STORAGE_STRATEGIES)}')
+        storage = _storages.setdefault(name, STORAGE_STRATEGIES[name]())
+    return storage
@@ -0,0 +1,201 @@
+from datetime import datetime, timezone
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import aliased
+from hierarchy.storage import HierarchyStorage
+from models.employee import Employee
+from models.hierarchy_version import EmployeeVersion, HierarchyVersion
+from models.model_mixin import chunked, db, IN_CHUNK_SIZE
+
+
+def _current_rows(model, employee_ids, *criteria):
+    """
+    Gets the name and supervisor id of the given employees
+    :param model: Employee or EmployeeVersion
+    :param employee_ids: list of ids
+    :param criteria: extra filters of the query
+    :return: dict mapping each found employee_id to a tuple of their name and supervisor_id
+    """
+    rows = {}
+    for chunk in chunked(employee_ids, IN_CHUNK_SIZE):
+        query = db.session.query(model.employee_id, model.name, model.supervisor_id).filter(
+            model.employee_id.in_(chunk), *criteria)
+        rows.update((employee_id, (name, supervisor_id)) for employee_id, name, supervisor_id in query)
+    return rows
+
+
+def record_version(employee_ids, description):
+    """
+    Creates a new hierarchy version after the employee table has been changed, within the current transaction. Only
+    the given employees are compared with their recorded history, and a history row is only written for those whose
+    name or supervisor changed, so the history grows with the size of the change. The caller should commit
+    :param employee_ids: iterable of the ids of the employees which were added, changed or removed
+    :param description: str. What changed
+    :return: the id of the new version: int
+    """
+    version = HierarchyVersion(description=description[:120])
+    db.session.add(version)
+    db.session.flush()
+    version_id = version.version_id
+
+    if db.session.query(EmployeeVersion.employee_id).first() is None:
+        # nothing is recorded yet, so everyone stored is part of the first version
+        employee_ids = [employee_id for employee_id, in db.session.query(Employee.employee_id)]
+    employee_ids = list(set(employee_ids))
+    stored = _current_rows(Employee, employee_ids)
+    recorded = _current_rows(EmployeeVersion, employee_ids, EmployeeVersion.valid_to.is_(None))
+    changed_ids = [employee_id for employee_id in employee_ids if stored.get(employee_id) != recorded.get(employee_id)]
+
+    for chunk in chunked((employee_id for employee_id in changed_ids if employee_id in recorded), IN_CHUNK_SIZE):
+        EmployeeVersion.query.filter(EmployeeVersion.employee_id.in_(chunk), EmployeeVersion.valid_to.is_(None)).update(
+            {EmployeeVersion.valid_to: version_id}, synchronize_session=False)
+    EmployeeVersion.bulk_insert(
+        {'employee_id': employee_id, 'valid_from': version_id, 'valid_to': None, 'name': stored[employee_id][0],
+         'supervisor_id': stored[employee_id][1]}
+        for employee_id in changed_ids if employee_id in stored
+    )
+    return version_id
+
+
+def current_version():
+    """
+    Gets the id of the latest hierarchy version
+    :return: version_id: int or None if the hierarchy was never stored
+    """
+    return db.session.query(db.func.max(HierarchyVersion.version_id)).scalar()
+
+
+def latest_version():
+    """
+    Gets the latest hierarchy version. Its id and creation time together identify it, even across databases whose
+    version ids start over
+    :return: row with the version_id and created_at or None if the hierarchy was never stored
+    """
+    return db.session.query(HierarchyVersion.version_id, HierarchyVersion.created_at).order_by(
+        HierarchyVersion.version_id.desc()).first()
+
+
+def count_versions_created(start, end):
+    """
+    Counts the hierarchy versions created in a time range
+    :param start: datetime. The start of the range in UTC, which is included
+    :param end: datetime. The end of the range in UTC, which is left out
+    :return: int
+    """
+    return db.session.query(db.func.count(HierarchyVersion.version_id)).filter(
+        HierarchyVersion.created_at >= start, HierarchyVersion.created_at < end).scalar()
+
+
+def resolve_version(as_of):
+    """
+    Finds the hierarchy version which was current at a point in time
+    :param as_of: str. A version id, or an ISO 8601 timestamp. A timestamp without a timezone is taken as UTC
+    :return: version_id: int or None if there is no such version
+    :raises: ValueError when as_of is neither a version id nor a timestamp
+    """
+    if as_of.isdigit():
+        return db.session.query(HierarchyVersion.version_id).filter(
+            HierarchyVersion.version_id == int(as_of)).scalar()
+
+    timestamp = datetime.fromisoformat(as_of)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return db.session.query(HierarchyVersion.version_id).filter(HierarchyVersion.created_at <= timestamp).order_by(
+        HierarchyVersion.created_at.desc(), HierarchyVersion.version_id.desc()).limit(1).scalar()
+
+
+class VersionStorage(HierarchyStorage):
+    """
+    Reads the hierarchy as it was in a past version from the employee history. Every lookup goes through the
+    primary key or an index of the history table, whose rows were valid from a version until another one
+    """
+    name = 'version'
+
+    def __init__(self, version_id):
+        self.version_id = version_id
+
+    def _valid(self, model):
+        """
+        Gets the condition for the history rows which were valid as of the version
+        :param model: EmployeeVersion or an alias of it
+        """
+        return and_(model.valid_from <= self.version_id,
+                    or_(model.valid_to.is_(None), model.valid_to > self.version_id))
+
+    def _latest(self, query):
+        """
+        Gets the row of an employee as of the version, which is the latest one set by then if it wasn't replaced
+        by then
+        :param query: query of a single employee's history rows
+        :return: row or None if the employee didn't exist as of the version
+        """
+        row = query.filter(EmployeeVersion.valid_from <= self.version_id).order_by(
+            EmployeeVersion.valid_from.desc()).first()
+        if row is None or (row.valid_to is not None and row.valid_to <= self.version_id):
+            return None
+        return row
+
+    def _employee(self, *criteria):
+        return self._latest(db.session.query(
+            EmployeeVersion.employee_id, EmployeeVersion.name, EmployeeVersion.supervisor_id,
+            EmployeeVersion.valid_to).filter(*criteria))
+
+    def ancestors(self, employee_name, limit=None):
+        employee = self._employee(EmployeeVersion.name == employee_name)
+        if employee is None:
+            return None
+        names = []
+        supervisor_id = employee.supervisor_id
+        while supervisor_id is not None and (limit is None or len(names) < limit):
+            supervisor = self._employee(EmployeeVersion.employee_id == supervisor_id)
+            names.append(supervisor.name)
+            supervisor_id = supervisor.supervisor_id
+        return names
+
+    def descendants(self, employee_name):
+        employee = self._employee(EmployeeVersion.name == employee_name)
+        if employee is None:
+            return None
+
+        # collect the subordinates level by level, then list them depth first with subordinates ordered by name
+        subordinates = {}
+        level = [employee.employee_id]
+        while level:
+            next_level = []
+            for chunk in chunked(level, IN_CHUNK_SIZE):
+                rows = db.session.query(
+                    EmployeeVersion.employee_id, EmployeeVersion.name, EmployeeVersion.supervisor_id).filter(
+                    EmployeeVersion.supervisor_id.in_(chunk), self._valid(EmployeeVersion))
+                for row in rows:
+                    subordinates.setdefault(row.supervisor_id, []).append((row.name, row.employee_id))
+                    next_level.append(row.employee_id)
+            level = next_level
+
+        names = []
+        stack = sorted(subordinates.get(employee.employee_id, ()), reverse=True)
+        while stack:
+            name, employee_id = stack.pop()
+            names.append(name)
+            stack.extend(sorted(subordinates.get(employee_id, ()), reverse=True))
+        return names
+
+    def two_supervisors(self, employee_names):
+        """
+        Gets the supervisor and the supervisor's supervisor of many employees. Each chunk of names is resolved in one
+        query, which joins the history table to itself for the two levels above the employees
+        :param employee_names: iterable of names
+        :return: dict mapping the name of each employee who existed as of the version to a tuple of the names of
+        their supervisor and their supervisor's supervisor, each None if there is none
+        """
+        supervisor = aliased(EmployeeVersion)
+        supervisor_of_supervisor = aliased(EmployeeVersion)
+        found = {}
+        for chunk in chunked(set(employee_names), IN_CHUNK_SIZE):
+            query = db.session.query(EmployeeVersion.name, supervisor.name, supervisor_of_supervisor.name).outerjoin(
+                supervisor, and_(supervisor.employee_id == EmployeeVersion.supervisor_id, self._valid(supervisor))
+            ).outerjoin(
+                supervisor_of_supervisor, and_(supervisor_of_supervisor.employee_id == supervisor.supervisor_id,
+                                               self._valid(supervisor_of_supervisor))
+            ).filter(EmployeeVersion.name.in_(chunk), self._valid(EmployeeVersion))
+            found.update((name, (supervisor_name, supervisor_of_supervisor_name))
+                         for name, supervisor_name, supervisor_of_supervisor_name in query)
+        return found
@@ -1,15 +1,55 @@
 import logging
-from flask import Blueprint, request, make_response, jsonify
+from flask import Blueprint, current_app, request, make_response, jsonify
 from flask.views import MethodView
-from hierarchy.parse_hierarchy import do_mptt_traversal, organize_hierarchy
-from helpers.validate import check_json_contains_loop, validate_json
+from hierarchy.conditional import conditional_get
+from hierarchy.operations import HierarchyOperationError, apply_operations, restructure_hierarchy
+from hierarchy.org_chart import org_chart
+from hierarchy.read_cache import read_cache
+from hierarchy.storage import get_storage
+from hierarchy.versions import current_version, resolve_version, VersionStorage
+from helpers.json_stream import stream_json_response, stream_ndjson_response
+from helpers.validate import check_hierarchy_structure, decode_hierarchy, strip_names
 from auth.decorator import authorization
-from models.employee import Employee
-from models.model_mixin import db
 
 
 hierarchy_blueprint = Blueprint('hierarchy', __name__, url_prefix='/api/v1')
 
+# the most results a search returns, whatever limit is asked for
+MAX_SEARCH_RESULTS = 100
+
+# the most managers the manager stats return, whatever limit is asked for
+MAX_MANAGER_STATS = 100
+
+# how managers can be ranked: by everyone under them or by their direct reports
+MANAGER_RANKINGS = ('total', 'direct')
+
+
+def get_read_storage():
+    """
+    Gets the storage to read the hierarchy from. This is the selected storage strategy, or the hierarchy as it was in
+    a past version if an as_of query parameter is sent
+    :return: tuple of the storage and the error response, one of which is None
+    """
+    as_of = request.args.get('as_of')
+    if as_of is None:
+        return get_storage(), None
+
+    try:
+        version_id = resolve_version(as_of)
+    except ValueError:
+        response = {
+            'status': 'fail',
+            'message': 'The as_of parameter should be a version number or an ISO 8601 timestamp'
+        }
+        return None, (make_response(jsonify(response)), 400)
+    if version_id is None:
+        response = {
+            'status': 'fail',
+            'message': f"There is no hierarchy version as of '{as_of}'"
+        }
+        return None, (make_response(jsonify(response)), 404)
+    return VersionStorage(version_id), None
+
 
 class StructureHierarchyView(MethodView):
     """
@@ -20,8 +60,8 @@ class StructureHierarchyView(MethodView):
         # get the logged in user_id from the authorization kwargs for use when needed
         user_id = kwargs['user_id']
 
-        # get the raw post data
-        raw_data = request.get_data(as_text=True, parse_form_data=True)
+        # get the raw post data. It is decoded straight from the bytes and not kept on the request afterwards
+        raw_data = request.get_data(cache=False, parse_form_data=True)
         if not raw_data:
             response = {
                 'status': 'fail',
@@ -29,7 +69,7 @@ class StructureHierarchyView(MethodView):
             }
             return make_response(jsonify(response)), 400
 
-        hierarchy_dict = validate_json(raw_data)
+        hierarchy_dict, duplicate_keys = decode_hierarchy(raw_data)
         if not hierarchy_dict:
             response = {
                 'status': 'fail',
@@ -37,7 +77,10 @@ class StructureHierarchyView(MethodView):
             }
             return make_response(jsonify(response)), 400
 
-        duplicate_keys = check_json_contains_loop(raw_data)
+        # the names are stored without the whitespace around them
+        hierarchy_dict, stripped_duplicates = strip_names(hierarchy_dict)
+        duplicate_keys += stripped_duplicates
+
         if duplicate_keys:
             response = {
                 'status': 'fail',
@@ -46,53 +89,176 @@ class StructureHierarchyView(MethodView):
             }
             return make_response(jsonify(response)), 400
 
-        organized_hierarchy = organize_hierarchy(hierarchy_dict)
-        if len(organized_hierarchy) > 1:
-            # this means that there multiple roots in the hierarchy
-            roots = list(organized_hierarchy.keys())
+        # validate the structure of the hierarchy before doing any database work
+        structure = check_hierarchy_structure(hierarchy_dict)
+        if structure['invalid']:
             response = {
                 'status': 'fail',
-                'message': f'There are multiple roots in the hierarchy: {roots}'
+                'message': f"These employees don't have a valid supervisor name: {structure['invalid']}"
             }
             return make_response(jsonify(response)), 400
 
-        # first empty the Employee table since we are doing a replace
-        result = Employee.delete_all_records()
-        if not result:
-            logging.error(f"An error has occurred while deleting employee records")
+        if structure['empty']:
             response = {
                 'status': 'fail',
-                'message': 'Failed to delete employees already in the database'
+                'message': 'The employee and supervisor names should not be empty'
             }
-            return make_response(jsonify(response)), 500
+            return make_response(jsonify(response)), 400
+
+        if structure['self_supervised']:
+            response = {
+                'status': 'fail',
+                'message': f'The posted JSON contains loops. '
+                f"These employees supervise themselves: {structure['self_supervised']}"
+            }
+            return make_response(jsonify(response)), 400
+
+        if structure['cycles']:
+            response = {
+                'status': 'fail',
+                'message': f'The posted JSON contains loops. '
+                f"These employees supervise each other in a cycle: {structure['cycles']}"
+            }
+            return make_response(jsonify(response)), 400
+
+        if len(structure['roots']) > 1:
+            # this means that there multiple roots in the hierarchy
+            response = {
+                'status': 'fail',
+                'message': f"There are multiple roots in the hierarchy: {structure['roots']}"
+            }
+            return make_response(jsonify(response)), 400
 
-        # insert the employees into the employee table in the database
-        mptt_employees_dict = do_mptt_traversal(organized_hierarchy)
-        try:
-            for employee_dict in mptt_employees_dict.values():
-                employee = Employee(
-                    employee_id=employee_dict['id'],
-                    name=employee_dict['name'],
-                    supervisor_id=employee_dict['supervisor_id'],
-                    lft=employee_dict['lft'],
-                    rgt=employee_dict['rgt']
-                )
-                # save the employee in the database
-                db.session.add(employee)
-            # commit the changes
-            db.session.commit()
-        except Exception as e:
-            logging.error(f"An error has occurred while inserting an employee - {e}")
+        tree, version_id = restructure_hierarchy(hierarchy_dict)
+        if not version_id:
             response = {
                 'status': 'fail',
                 'message': 'Saving the employees hierarchy failed.'
             }
             return make_response(jsonify(response)), 500
+
         response = {
             "status": "success",
-            "employee_hierarchy": organized_hierarchy
+            "version": version_id,
+            "employee_hierarchy": org_chart(tree.depth_rows())
+        }
+        # the hierarchy is as deep as the organization, so it is nested from the compiled tree as it is encoded
+        # and streamed
+        return stream_json_response(response, 201)
+
+
+def reject_as_of():
+    """
+    Creates the error response for an as_of query parameter sent to an endpoint which only reads the current
+    hierarchy
+    :return: the error response, or None if no as_of parameter is sent
+    """
+    if 'as_of' not in request.args:
+        return None
+    response = {
+        'status': 'fail',
+        'message': 'The as_of parameter is not supported by this endpoint, which only reads the current hierarchy'
+    }
+    return make_response(jsonify(response)), 400
+
+
+def parse_levels(name, default=None, allow_all=True):
+    """
+    Parses a positive number of levels sent as a query parameter
+    :param name: str. The name of the query parameter
+    :param default: str. The value to use when the parameter is not sent
+    :param allow_all: bool. Whether 'all' can be sent for no limit
+    :return: tuple of the number of levels, None for all of them, and the error response, which is None if it is valid
+    """
+    value = request.args.get(name, default)
+    if allow_all and value == 'all':
+        return None, None
+    if value is None or not value.isdigit() or int(value) < 1:
+        response = {
+            'status': 'fail',
+            'message': f"The {name} parameter should be a positive number" + (" or 'all'" if allow_all else '')
+        }
+        return None, (make_response(jsonify(response)), 400)
+    return int(value), None
+
+
+def parse_integer(name, minimum=None):
+    """
+    Parses an optional integer sent as a query parameter
+    :param name: str. The name of the query parameter
+    :param minimum: int. The smallest valid value
+    :return: tuple of the integer, None if it is not sent, and the error response, which is None if it is valid
+    """
+    value = request.args.get(name)
+    if value is None:
+        return None, None
+    try:
+        number = int(value)
+    except ValueError:
+        number = None
+    if number is None or (minimum is not None and number < minimum):
+        response = {
+            'status': 'fail',
+            'message': f'The {name} parameter should be a whole number' + (
+                f' of at least {minimum}' if minimum is not None else '')
+        }
+        return None, (make_response(jsonify(response)), 400)
+    return number, None
+
+
+def employee_not_found(employee_name):
+    """
+    Creates the response for an employee who doesn't exist
+    :param employee_name: str. The name of the employee
+    :return: response and status code
+    """
+    response = {
+        'status': 'fail',
+        'message': f"The requested employee: '{employee_name}' doesn't exist"
+    }
+    return make_response(jsonify(response)), 404
+
+
+class AncestorsView(MethodView):
+    """
+    View to retrieve the chain of command above a given employee, up to a number of levels (depth) or all the way to
+    the top most supervisor. The single supervisor a number of levels above the employee is retrieved with the level
+    parameter instead
+    """
+    @authorization
+    @conditional_get
+    def get(self, employee_name, *args, **kwargs):
+        storage, error_response = get_read_storage()
+        if error_response:
+            return error_response
+
+        if 'level' in request.args:
+            levels, error_response = parse_levels('level', allow_all=False)
+            if error_response:
+                return error_response
+            exists, ancestor = storage.ancestor_at(employee_name, levels)
+            if not exists:
+                return employee_not_found(employee_name)
+            response = {
+                'status': 'success',
+                'employee': employee_name,
+                'level': levels,
+                'ancestor': ancestor
+            }
+            return make_response(jsonify(response)), 200
+
+        depth, error_response = parse_levels('depth', default='all')
+        if error_response:
+            return error_response
+        ancestors = storage.ancestors(employee_name, depth)
+        if ancestors is None:
+            return employee_not_found(employee_name)
+        response = {
+            'status': 'success',
+            'employee': employee_name,
+            'ancestors': ancestors
         }
-        return make_response(jsonify(response)), 201
+        return make_response(jsonify(response)), 200
 
 
 class TwoImmediateSupervisorsView(MethodView):
@@ -101,44 +267,469 @@ class TwoImmediateSupervisorsView(MethodView):
     supervisor's supervisor of a given employee
     """
     @authorization
+    @conditional_get
     def get(self, employee_name, *args, **kwargs):
         # get the logged in user_id from the authorization kwargs for use when needed
         user_id = kwargs['user_id']
 
-        employee = Employee.find_first(name=employee_name)
-        if not employee:
+        storage, error_response = get_read_storage()
+        if error_response:
+            return error_response
+
+        two_supervisors = storage.ancestors(employee_name, 2)
+        if two_supervisors is None:
+            return employee_not_found(employee_name)
+
+        supervisors = {
+            'supervisor': None,
+            'supervisor_of_supervisor': None
+        }
+        if len(two_supervisors) == 1:
+            supervisors["supervisor"] = two_supervisors[0]
+            message = "Only the immediate supervisor is available"
+        elif len(two_supervisors) == 2:
+            supervisors["supervisor"] = two_supervisors[0]
+            supervisors["supervisor_of_supervisor"] = two_supervisors[1]
+            message = "Both supervisors are available"
+        else:
+            message = "This employee has no supervisor"
+        response = {
+            'status': 'success',
+            'supervisors': supervisors,
+            'message': message
+        }
+        return make_response(jsonify(response)), 200
+
+
+class BatchTwoImmediateSupervisorsView(MethodView):
+    """
+    View to retrieve the two immediate supervisors of many employees in one request. The supervisors are looked up
+    through the selected storage strategy, or in a past version with one query for each chunk of names. The response
+    is streamed
+    """
+    @authorization
+    def post(self, *args, **kwargs):
+        post_data, error_response = get_post_data()
+        if error_response:
+            return error_response
+
+        names = post_data.get('names')
+        if not isinstance(names, list) or not names or not all(isinstance(name, str) for name in names):
             response = {
                 'status': 'fail',
-                'message': f"The requested employee: '{employee_name}' doesn't exist"
+                'message': 'A non empty list of employee names should be provided.'
             }
-            return make_response(jsonify(response)), 404
-        else:
-            two_supervisors = Employee.query.filter(Employee.lft < employee.lft, Employee.rgt > employee.rgt).order_by(
-                Employee.lft.desc()).limit(2).all()
-            supervisors = {
-                'supervisor': None,
-                'supervisor_of_supervisor': None
+            return make_response(jsonify(response)), 400
+
+        storage, error_response = get_read_storage()
+        if error_response:
+            return error_response
+
+        # the supervisors are looked up before the response is streamed, since the database session is gone by then
+        lookup = storage.two_supervisors(names).get
+
+        def supervisors():
+            for name in names:
+                two_supervisors = lookup(name)
+                yield {
+                    'employee': name,
+                    'found': two_supervisors is not None,
+                    'supervisor': two_supervisors[0] if two_supervisors else None,
+                    'supervisor_of_supervisor': two_supervisors[1] if two_supervisors else None
+                }
+
+        response = {
+            'status': 'success',
+            'supervisors': supervisors()
+        }
+        return stream_json_response(response, 200)
+
+
+class DescendantsView(MethodView):
+    """
+    View to stream everyone a given employee supervises, directly or not, as newline delimited JSON in the order of
+    the hierarchy. Each line has a cursor, and the stream can be resumed after any line by sending its cursor as the
+    after parameter. The limit parameter caps the number of lines. The pages are read through the selected storage
+    strategy
+    """
+    @authorization
+    @conditional_get
+    def get(self, employee_name, *args, **kwargs):
+        error_response = reject_as_of()
+        if error_response:
+            return error_response
+        after, error_response = parse_integer('after')
+        if error_response:
+            return error_response
+        limit, error_response = parse_integer('limit', minimum=1)
+        if error_response:
+            return error_response
+
+        storage = get_storage()
+        employee = storage.employee(employee_name)
+        if employee is None:
+            return employee_not_found(employee_name)
+
+        page_size = current_app.config['DESCENDANTS_PAGE_SIZE']
+        after = employee.lft if after is None else max(after, employee.lft)
+
+        def descendants(after, remaining):
+            # keyset pagination: each page continues after the lft of the last employee of the previous page, so
+            # only one page is held in memory at a time
+            while remaining is None or remaining > 0:
+                page = storage.descendants_page(
+                    employee, after, page_size if remaining is None else min(page_size, remaining))
+                for lft, name, supervisor in page:
+                    yield {'name': name, 'supervisor': supervisor, 'cursor': lft}
+                if len(page) < page_size:
+                    return
+                after = page[-1].lft
+                if remaining is not None:
+                    remaining -= len(page)
+
+        return stream_ndjson_response(descendants(after, limit))
+
+
+class OrgChartView(MethodView):
+    """
+    View to retrieve the nested hierarchy, of the whole organization or of a given employee and everyone under them.
+    The depth parameter cuts it that many levels below the top. It is rebuilt from one scan of the selected storage
+    strategy, in the order of the lft values, and streamed as it is read
+    """
+    @authorization
+    @conditional_get
+    def get(self, employee_name=None, *args, **kwargs):
+        error_response = reject_as_of()
+        if error_response:
+            return error_response
+        depth, error_response = parse_integer('depth', minimum=0)
+        if error_response:
+            return error_response
+
+        storage = get_storage()
+        supervisor = None
+        top_depth = 0
+        if employee_name is not None:
+            supervisor = storage.employee(employee_name)
+            if supervisor is None:
+                return employee_not_found(employee_name)
+            top_depth = supervisor.depth
+
+        rows = storage.subtree_scan(supervisor, None if depth is None else top_depth + depth,
+                                     current_app.config['DESCENDANTS_PAGE_SIZE'])
+        response = {
+            'status': 'success',
+            'version': current_version(),
+            'employee_hierarchy': org_chart(rows, top_depth)
+        }
+        # the rows are read while the response is sent, so the request context is kept until then
+        return stream_json_response(response, 200, with_context=True)
+
+
+class DepthView(MethodView):
+    """
+    View to retrieve how many levels below the top most supervisor an employee is, or with the levels parameter,
+    the employees exactly that many levels below them, as the selected storage strategy finds them
+    """
+    @authorization
+    @conditional_get
+    def get(self, employee_name, *args, **kwargs):
+        error_response = reject_as_of()
+        if error_response:
+            return error_response
+        levels = None
+        if 'levels' in request.args:
+            levels, error_response = parse_levels('levels', allow_all=False)
+            if error_response:
+                return error_response
+
+        storage = get_storage()
+        employee = storage.employee(employee_name)
+        if employee is None:
+            return employee_not_found(employee_name)
+
+        response = {
+            'status': 'success',
+            'employee': employee_name,
+            'depth': employee.depth
+        }
+        if levels is not None:
+            response['levels'] = levels
+            response['employees'] = storage.level_below(employee, levels)
+        return make_response(jsonify(response)), 200
+
+
+class SearchView(MethodView):
+    """
+    View to search the employees by name, for autocomplete. Exact and prefix matches come first, then names with a
+    few typos. The under parameter limits the search to the employees someone supervises, directly or not
+    """
+    @authorization
+    @conditional_get
+    def get(self, *args, **kwargs):
+        error_response = reject_as_of()
+        if error_response:
+            return error_response
+        query = request.args.get('q', '').strip()
+        if not query:
+            response = {
+                'status': 'fail',
+                'message': 'The q parameter should be a non empty search text'
             }
-            if len(two_supervisors) == 1:
-                supervisors["supervisor"] = two_supervisors[0].name
-                message = "Only the immediate supervisor is available"
-            elif len(two_supervisors) == 2:
-                supervisors["supervisor"] = two_supervisors[0].name
-                supervisors["supervisor_of_supervisor"] = two_supervisors[1].name
-                message = "Both supervisors are available"
-            else:
-                message = "This employee has no supervisor"
+            return make_response(jsonify(response)), 400
+        limit, error_response = parse_integer('limit', minimum=1)
+        if error_response:
+            return error_response
+        limit = min(limit or current_app.config['SEARCH_RESULTS_LIMIT'], MAX_SEARCH_RESULTS)
+
+        ancestor_index = read_cache.ancestor_index()
+        under_name = request.args.get('under')
+        under = None
+        if under_name is not None:
+            under = ancestor_index.index(under_name)
+            if under is None:
+                return employee_not_found(under_name)
+
+        results = []
+        for index, match in ancestor_index.name_search().search(query, limit, under):
+            parent = ancestor_index.parents[index]
+            results.append({
+                'name': ancestor_index.names[index],
+                'supervisor': ancestor_index.names[parent] if parent >= 0 else None,
+                'match': match
+            })
+        response = {
+            'status': 'success',
+            'query': query,
+            'results': results
+        }
+        return make_response(jsonify(response)), 200
+
+
+class CommonManagerView(MethodView):
+    """
+    View to retrieve the lowest common manager of two employees and how many reporting lines apart they are. It is
+    answered in O(1) from the Euler tour index of the read cache
+    """
+    @authorization
+    @conditional_get
+    def get(self, first_name, second_name, *args, **kwargs):
+        error_response = reject_as_of()
+        if error_response:
+            return error_response
+        ancestor_index = read_cache.ancestor_index()
+        indexes = []
+        for employee_name in (first_name, second_name):
+            index = ancestor_index.index(employee_name)
+            if index is None:
+                return employee_not_found(employee_name)
+            indexes.append(index)
+
+        manager, distance = ancestor_index.euler_tour().distance(*indexes)
+        response = {
+            'status': 'success',
+            'employees': [first_name, second_name],
+            'common_manager': ancestor_index.names[manager],
+            'distance': distance
+        }
+        return make_response(jsonify(response)), 200
+
+
+class ManagerStatsView(MethodView):
+    """
+    View to retrieve the managers with the largest teams, ranked by their total headcount or, with by=direct, by
+    their number of direct reports. The min, under and depth parameters filter the ranked managers. The counts are
+    computed when the hierarchy is written, so the selected storage strategy reads them with a single query on
+    their indexes
+    """
+    @authorization
+    @conditional_get
+    def get(self, *args, **kwargs):
+        error_response = reject_as_of()
+        if error_response:
+            return error_response
+        by = request.args.get('by', 'total')
+        if by not in MANAGER_RANKINGS:
             response = {
-                'status': 'success',
-                'supervisors': supervisors,
-                'message': message
+                'status': 'fail',
+                'message': f'The by parameter should be one of {list(MANAGER_RANKINGS)}'
             }
-            return make_response(jsonify(response)), 200
+            return make_response(jsonify(response)), 400
+        limit, error_response = parse_integer('limit', minimum=1)
+        if error_response:
+            return error_response
+        limit = min(limit or current_app.config['MANAGER_STATS_LIMIT'], MAX_MANAGER_STATS)
+        minimum, error_response = parse_integer('min', minimum=1)
+        if error_response:
+            return error_response
+        depth, error_response = parse_integer('depth', minimum=0)
+        if error_response:
+            return error_response
+
+        storage = get_storage()
+        supervisor = None
+        under_name = request.args.get('under')
+        if under_name is not None:
+            supervisor = storage.employee(under_name)
+            if supervisor is None:
+                return employee_not_found(under_name)
+
+        managers = storage.top_managers(by, limit, minimum or 1, supervisor, depth)
+        response = {
+            'status': 'success',
+            'by': by,
+            'managers': [
+                {
+                    'name': manager.name,
+                    'supervisor': manager.supervisor,
+                    'headcount': manager.headcount,
+                    'direct_reports': manager.direct_reports,
+                    'depth': manager.depth
+                }
+                for manager in managers
+            ]
+        }
+        return make_response(jsonify(response)), 200
+
+
+class ReadCacheView(MethodView):
+    """
+    View to retrieve the counters of the in-process hierarchy read cache
+    """
+    @authorization
+    def get(self, *args, **kwargs):
+        response = {
+            'status': 'success',
+            'cache': read_cache.stats()
+        }
+        return make_response(jsonify(response)), 200
+
+
+def apply_employee_operations(operations, message, status_code):
+    """
+    Applies operations on single employees and creates the response for them
+    :param operations: list of operations, see hierarchy.operations.apply_operations
+    :param message: str. The message of a successful response
+    :param status_code: int. The status code of a successful response
+    :return: response and status code
+    """
+    try:
+        version_id = apply_operations(operations)
+    except HierarchyOperationError as error:
+        response = {
+            'status': 'fail',
+            'message': error.message
+        }
+        return make_response(jsonify(response)), error.status_code
+    except Exception as e:
+        logging.error(f"An error has occurred while changing the employees - {e}")
+        response = {
+            'status': 'fail',
+            'message': 'Changing the employees failed.'
+        }
+        return make_response(jsonify(response)), 500
+    response = {
+        'status': 'success',
+        'version': version_id,
+        'message': message
+    }
+    return make_response(jsonify(response)), status_code
+
+
+def get_post_data():
+    """
+    Gets the JSON body of the request
+    :return: tuple of the post data and the error response, one of which is None
+    """
+    if not request.is_json:
+        response = {
+            'status': 'fail',
+            'message': 'The Content-Type of the post data is not JSON. Ensure you use application/json'
+        }
+        return None, (make_response(jsonify(response)), 415)
+
+    post_data = request.get_json(silent=True)
+    if not isinstance(post_data, dict) or not post_data:
+        response = {
+            'status': 'fail',
+            'message': 'No valid post body provided.'
+        }
+        return None, (make_response(jsonify(response)), 400)
+    return post_data, None
+
+
+class EmployeesView(MethodView):
+    """
+    View to add a single employee to the hierarchy
+    """
+    @authorization
+    def post(self, *args, **kwargs):
+        post_data, error_response = get_post_data()
+        if error_response:
+            return error_response
+
+        name = post_data.get('name')
+        operation = {'action': 'add', 'name': name, 'supervisor': post_data.get('supervisor')}
+        return apply_employee_operations([operation], f"The employee: '{name}' has been added", 201)
+
+
+class EmployeeView(MethodView):
+    """
+    View to move a single employee, with everyone they supervise, under another supervisor, or to remove them from
+    the hierarchy
+    """
+    @authorization
+    def put(self, employee_name, *args, **kwargs):
+        post_data, error_response = get_post_data()
+        if error_response:
+            return error_response
+
+        supervisor = post_data.get('supervisor')
+        operation = {'action': 'move', 'name': employee_name, 'supervisor': supervisor}
+        return apply_employee_operations(
+            [operation], f"The employee: '{employee_name}' is now supervised by '{supervisor}'", 200)
+
+    @authorization
+    def delete(self, employee_name, *args, **kwargs):
+        operation = {'action': 'remove', 'name': employee_name}
+        return apply_employee_operations([operation], f"The employee: '{employee_name}' has been removed", 200)
+
+
+class EmployeesBatchView(MethodView):
+    """
+    View to add, move and remove several employees at once. Either all the operations are applied or none
+    """
+    @authorization
+    def post(self, *args, **kwargs):
+        post_data, error_response = get_post_data()
+        if error_response:
+            return error_response
+
+        operations = post_data.get('operations')
+        if not isinstance(operations, list) or not operations:
+            response = {
+                'status': 'fail',
+                'message': 'A non empty list of operations should be provided.'
+            }
+            return make_response(jsonify(response)), 400
+        return apply_employee_operations(operations, f'{len(operations)} operations have been applied', 200)
 
 
 # define the API resources
 structure_view = StructureHierarchyView.as_view('structure_api')
 supervisors_view = TwoImmediateSupervisorsView.as_view('two_supervisors_api')
+ancestors_view = AncestorsView.as_view('ancestors_api')
+batch_supervisors_view = BatchTwoImmediateSupervisorsView.as_view('batch_two_supervisors_api')
+common_manager_view = CommonManagerView.as_view('common_manager_api')
+search_view = SearchView.as_view('search_api')
+read_cache_view = ReadCacheView.as_view('read_cache_api')
+descendants_view = DescendantsView.as_view('descendants_api')
+depth_view = DepthView.as_view('depth_api')
+org_chart_view = OrgChartView.as_view('org_chart_api')
+manager_stats_view = ManagerStatsView.as_view('manager_stats_api')
+employees_view = EmployeesView.as_view('employees_api')
+employee_view = EmployeeView.as_view('employee_api')
+employees_batch_view = EmployeesBatchView.as_view('employees_batch_api')
 
 # add Rules for API Endpoints
 hierarchy_blueprint.add_url_rule(
@@ -151,3 +742,69 @@ hierarchy_blueprint.add_url_rule(
     view_func=supervisors_view,
     methods=['GET']
 )
+hierarchy_blueprint.add_url_rule(
+    '/hierarchy/two_supervisors',
+    view_func=batch_supervisors_view,
+    methods=['POST']
+)
+hierarchy_blueprint.add_url_rule(
+    '/hierarchy/ancestors/<string:employee_name>',
+    view_func=ancestors_view,
+    methods=['GET']
+)
+hierarchy_blueprint.add_url_rule(
+    '/hierarchy/descendants/<string:employee_name>',
+    view_func=descendants_view,
+    methods=['GET']
+)
+hierarchy_blueprint.add_url_rule(
+    '/hierarchy/depth/<string:employee_name>',
+    view_func=depth_view,
+    methods=['GET']
+)
+hierarchy_blueprint.add_url_rule(
+    '/hierarchy/common_manager/<string:first_name>/<string:second_name>',
+    view_func=common_manager_view,
+    methods=['GET']
+)
+hierarchy_blueprint.add_url_rule(
+    '/hierarchy/search',
+    view_func=search_view,
+    methods=['GET']
+)
+hierarchy_blueprint.add_url_rule(
+    '/hierarchy/stats/managers',
+    view_func=manager_stats_view,
+    methods=['GET']
+)
+hierarchy_blueprint.add_url_rule(
+    '/hierarchy/cache',
+    view_func=read_cache_view,
+    methods=['GET']
+)
+hierarchy_blueprint.add_url_rule(
+    '/hierarchy/employees',
+    view_func=employees_view,
+    methods=['POST']
+)
+hierarchy_blueprint.add_url_rule(
+    '/hierarchy/employees/batch',
+    view_func=employees_batch_view,
+    methods=['POST']
+)
+hierarchy_blueprint.add_url_rule(
+    '/hierarchy/employees/<string:employee_name>',
+    view_func=employee_view,
+    methods=['PUT', 'DELETE']
+)
+hierarchy_blueprint.add_url_rule(
+    '/hierarchy/org_chart',
+    defaults={'employee_name': None},
+    view_func=org_chart_view,
+    methods=['GET']
+)
+hierarchy_blueprint.add_url_rule(
+    '/hierarchy/org_chart/<string:employee_name>',
+    view_func=org_chart_view,
+    methods=['GET']
+)
@@ -1,10 +1,15 @@
 import os
+import json
 import coverage
 import unittest
 from flask_script import Manager
 from flask_migrate import Migrate, MigrateCommand
 
 from app import app, db
+from benchmarks.ingestion import run_benchmarks
+from benchmarks.org_generator import SHAPES
+from benchmarks.serialization import run_serialization_benchmarks
+from helpers.json_provider import JSON_PROVIDERS
 
 migrate = Migrate(app, db)
 manager = Manager(app)
@@ -60,5 +65,60 @@ def cov():
     cov.erase()
 
 
+@manager.option('-s', '--shapes', dest='shapes', default=','.join(SHAPES),
+                help=f'Comma separated shapes of the generated organizations: {", ".join(SHAPES)}')
+@manager.option('-n', '--sizes', dest='sizes', default='1000,10000,100000,1000000',
+                help='Comma separated numbers of employees of the generated organizations')
+@manager.option('--seed', dest='seed', default=0, type=int, help='Seed of the organization generator')
+@manager.option('--database', dest='database', default='sqlite://',
+                help='Database URI the insert stage writes to. Its employee table is emptied')
+@manager.option('--no-memory', dest='trace_memory', action='store_false', default=True,
+                help="Don't measure the peak memory of each stage")
+@manager.option('-o', '--output', dest='output', default=None, help='File to write the JSON results to')
+def bench(shapes, sizes, seed, database, trace_memory, output):
+    """Runs the ingestion benchmarks and reports the results as JSON."""
+    results = run_benchmarks(
+        app,
+        shapes=shapes.split(','),
+        sizes=[int(size) for size in sizes.split(',')],
+        seed=seed,
+        database_uri=database,
+        trace_memory=trace_memory
+    )
+    report = json.dumps(results, indent=2)
+    if output:
+        with open(output, 'w') as output_file:
+            output_file.write(report)
+    else:
+        print(report)
+
+
+@manager.option('-s', '--shapes', dest='shapes', default=','.join(SHAPES),
+                help=f'Comma separated shapes of the generated organizations: {", ".join(SHAPES)}')
+@manager.option('-n', '--sizes', dest='sizes', default='1000,10000,100000',
+                help='Comma separated numbers of employees of the generated organizations')
+@manager.option('--seed', dest='seed', default=0, type=int, help='Seed of the organization generator')
+@manager.option('-p', '--providers', dest='providers', default=','.join(JSON_PROVIDERS),
+                help=f'Comma separated JSON providers to compare: {", ".join(JSON_PROVIDERS)}')
+@manager.option('-r', '--repeat', dest='repeat', default=3, type=int,
+                help='Runs of each measurement, of which the fastest is reported')
+@manager.option('-o', '--output', dest='output', default=None, help='File to write the JSON results to')
+def bench_json(shapes, sizes, seed, providers, repeat, output):
+    """Compares the JSON providers on the API's response bodies and reports the results as JSON."""
+    results = run_serialization_benchmarks(
+        shapes=shapes.split(','),
+        sizes=[int(size) for size in sizes.split(',')],
+        seed=seed,
+        providers=providers.split(','),
+        repeat=repeat
+    )
+    report = json.dumps(results, indent=2)
+    if output:
+        with open(output, 'w') as output_file:
+            output_file.write(report)
+    else:
+        print(report)
+
+
 if __name__ == '__main__':
     manager.run()
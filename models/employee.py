@@ -1,4 +1,11 @@
-from .model_mixin import app, db, ModelMixin
+import logging
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import aliased
+from .model_mixin import app, chunked, db, ModelMixin
+
+# integer ids make the primary key, the supervisor_id foreign key and their indexes much smaller than UUID strings
+INTEGER_IDS = app.config.get('EMPLOYEE_ID_TYPE') == 'integer'
+EmployeeId = db.Integer if INTEGER_IDS else db.String(64)
 
 
 class Employee(ModelMixin):
@@ -8,13 +15,20 @@ class Employee(ModelMixin):
     """
     __tablename__ = 'employee'
 
-    employee_id = db.Column(db.String(64), primary_key=True)
+    employee_id = db.Column(EmployeeId, primary_key=True, autoincrement=False)
     name = db.Column(db.String(120), unique=True, nullable=False)
-    supervisor_id = db.Column(db.String(64), db.ForeignKey('employee.employee_id'), nullable=True)
-    lft = db.Column(db.Integer, default=0)
+    supervisor_id = db.Column(EmployeeId, db.ForeignKey('employee.employee_id'), nullable=True, index=True)
+    # the index keeps subtree range scans and keyset pages on lft cheap
+    lft = db.Column(db.Integer, default=0, index=True)
     rgt = db.Column(db.Integer, default=0)
+    # the number of supervisors above the employee, so whole levels of the hierarchy are found with the index
+    depth = db.Column(db.Integer, default=0, index=True)
+    # the number of employees under the employee, directly or not, and of those reporting directly to them. They are
+    # kept up to date on every write, so the largest teams are found with the indexes
+    headcount = db.Column(db.Integer, default=0, index=True)
+    direct_reports = db.Column(db.Integer, default=0, index=True)
 
-    def __init__(self, employee_id, name, supervisor_id, lft, rgt):
+    def __init__(self, employee_id, name, supervisor_id, lft, rgt, depth=0, headcount=0, direct_reports=0):
         """
         Initialize the employee instance
         """
@@ -23,6 +37,187 @@ class Employee(ModelMixin):
         self.supervisor_id = supervisor_id
         self.lft = lft
         self.rgt = rgt
+        self.depth = depth
+        self.headcount = headcount
+        self.direct_reports = direct_reports
 
     def __repr__(self):
         return f'Employee: {self.name}'
+
+    @classmethod
+    def next_integer_id(cls):
+        """
+        Gets the first free integer id, which is the one after the largest id in the table. The ids of a whole
+        hierarchy are allocated as a block starting at this id, so only one query is needed
+        :return: id: int
+        """
+        largest_id = db.session.query(db.func.max(cls.employee_id)).scalar()
+        return (largest_id or 0) + 1
+
+    @staticmethod
+    def hierarchy_rows(tree, ids):
+        """
+        Gets the rows of the employee table for a compiled hierarchy. They are made from the arrays of the tree one
+        at a time, in the order of their lft values
+        :param tree: CompactTree with the mptt values of each employee, see hierarchy.parse_hierarchy
+        :param ids: list of the id of each employee by their index in the tree
+        :return: generator of dicts mapping column names to values
+        """
+        names, parents, lft, rgt = tree.names, tree.parents, tree.lft, tree.rgt
+        depths, headcounts, child_offsets = tree.depths, tree.headcounts, tree.child_offsets
+        return (
+            {
+                'employee_id': ids[index],
+                'name': names[index],
+                'supervisor_id': ids[parents[index]] if parents[index] >= 0 else None,
+                'lft': lft[index],
+                'rgt': rgt[index],
+                'depth': depths[index],
+                'headcount': headcounts[index],
+                'direct_reports': child_offsets[index + 1] - child_offsets[index]
+            }
+            for index in tree.preorder()
+        )
+
+    @classmethod
+    def rebuild_hierarchy(cls, tree, ids, chunk_size=None, before_commit=None):
+        """
+        Replaces all the stored employees with the employees of a compiled hierarchy. The employees are written to a
+        shadow table while readers keep using the employee table, and the shadow table then takes the place of the
+        employee table in one short transaction. The replaced table is dropped as background maintenance
+        :param tree: CompactTree with the mptt values of each employee, see hierarchy.parse_hierarchy
+        :param ids: list of the id of each employee by their index in the tree
+        :param chunk_size: int. The number of rows in each insert statement. Defaults to the BULK_INSERT_CHUNK_SIZE
+        config
+        :param before_commit: callable. Called in the transaction which replaces the employee table, before it commits
+        :return: success: bool
+        """
+        shadow_table = None
+        try:
+            shadow_table = cls.create_shadow_table()
+            insert_statement = shadow_table.insert()
+            for chunk in chunked(cls.hierarchy_rows(tree, ids),
+                                 chunk_size or app.config['BULK_INSERT_CHUNK_SIZE']):
+                db.session.execute(insert_statement, chunk)
+            db.session.commit()
+            retired_name = cls.publish_shadow_table(shadow_table, before_commit)
+        except SQLAlchemyError as e:
+            logging.error(f"An error has occurred while rebuilding the employees - {e}")
+            db.session.rollback()
+            if shadow_table is not None:
+                cls.drop_table(shadow_table.name)
+            return False
+        cls.drop_table_in_background(retired_name)
+        return True
+
+    @classmethod
+    def stored_hierarchy(cls):
+        """
+        Gets the stored hierarchy in one query, without loading Employee instances
+        :return: dict mapping the name of each employee to a dict of their employee_id, supervisor_id, lft, rgt,
+        depth, headcount and direct_reports
+        """
+        rows = db.session.query(cls.name, cls.employee_id, cls.supervisor_id, cls.lft, cls.rgt, cls.depth,
+                                cls.headcount, cls.direct_reports)
+        return {
+            name: {'employee_id': employee_id, 'supervisor_id': supervisor_id, 'lft': lft, 'rgt': rgt, 'depth': depth,
+                   'headcount': headcount, 'direct_reports': direct_reports}
+            for name, employee_id, supervisor_id, lft, rgt, depth, headcount, direct_reports in rows
+        }
+
+    @classmethod
+    def apply_restructure(cls, plan, chunk_size=None, before_commit=None):
+        """
+        Applies the changes planned by hierarchy.restructure.plan_restructure in a single transaction. New employees
+        are inserted first and removed ones deleted last, so supervisor ids always point to stored employees
+        :param plan: dict with the rows to insert, the rows to update and the ids of the employees to delete
+        :param chunk_size: int. The number of rows in each statement. Defaults to the BULK_INSERT_CHUNK_SIZE config
+        :param before_commit: callable. Called after the changes are written and before they are committed, so the
+        writes it makes are part of the same transaction
+        :return: success: bool
+        """
+        try:
+            cls.bulk_insert(plan['inserts'], chunk_size)
+            cls.bulk_update(plan['updates'], chunk_size)
+            cls.bulk_delete(plan['deletes'])
+            if before_commit:
+                before_commit()
+            db.session.commit()
+            return True
+        except SQLAlchemyError as e:
+            logging.error(f"An error has occurred while restructuring the employees - {e}")
+            db.session.rollback()
+            return False
+
+    @classmethod
+    def descendants_page(cls, rgt, after, limit):
+        """
+        Gets a keyset page of the employees under a supervisor, in the order of their lft values. Each page is a
+        range scan of the lft index starting after the previous page, so every page costs the same however deep
+        into the subtree it is
+        :param rgt: int. The rgt value of the supervisor
+        :param after: int. The lft value of the last employee of the previous page, or the supervisor's own lft
+        :param limit: int. The maximum number of employees in the page
+        :return: list of rows with the lft and name of each employee and the name of their supervisor
+        """
+        supervisor = aliased(cls)
+        return db.session.query(cls.lft, cls.name, supervisor.name).outerjoin(
+            supervisor, supervisor.employee_id == cls.supervisor_id).filter(
+            cls.lft > after, cls.lft < rgt).order_by(cls.lft).limit(limit).all()
+
+    @classmethod
+    def level_below(cls, supervisor, levels):
+        """
+        Gets the employees exactly a number of levels below a supervisor, in the order of their lft values. It is a
+        single query, answered with the depth or the lft index
+        :param supervisor: row with the lft, rgt and depth of the supervisor
+        :param levels: int. How many levels down to go, at least 1
+        :return: list of names
+        """
+        rows = db.session.query(cls.name).filter(
+            cls.depth == supervisor.depth + levels, cls.lft > supervisor.lft, cls.lft < supervisor.rgt
+        ).order_by(cls.lft)
+        return [name for name, in rows]
+
+    @classmethod
+    def subtree_scan(cls, supervisor=None, max_depth=None, page_size=1000):
+        """
+        Scans the employees of the hierarchy, or of the part of it under a supervisor, in the order of their lft
+        values. It is one query reading the lft index in order, and its rows are fetched page by page as they are
+        iterated, so the whole hierarchy is never held in memory
+        :param supervisor: row with the lft and rgt of a supervisor, to only scan them and the employees under them
+        :param max_depth: int. To leave out the employees deeper than this
+        :param page_size: int. The number of rows fetched at a time
+        :return: query of rows with the name and depth of each employee
+        """
+        query = db.session.query(cls.name, cls.depth)
+        if supervisor is not None:
+            query = query.filter(cls.lft >= supervisor.lft, cls.lft < supervisor.rgt)
+        if max_depth is not None:
+            query = query.filter(cls.depth <= max_depth)
+        return query.order_by(cls.lft).yield_per(page_size)
+
+    @classmethod
+    def top_managers(cls, by, limit, minimum=1, supervisor=None, depth=None):
+        """
+        Gets the managers with the most employees under them, largest first. The query reads the headcount or the
+        direct_reports index in descending order and stops after the limit, so it doesn't sort the whole table
+        :param by: str. 'total' to rank by the headcount or 'direct' to rank by the number of direct reports
+        :param limit: int. The maximum number of managers
+        :param minimum: int. The smallest ranked count of the managers returned, at least 1
+        :param supervisor: row with the lft and rgt of a supervisor, to only rank the managers under them
+        :param depth: int. To only rank the managers this many levels below the top most supervisor
+        :return: list of rows with the name, headcount, direct_reports and depth of each manager and the name of
+        their supervisor
+        """
+        ranked_by = cls.headcount if by == 'total' else cls.direct_reports
+        manager_supervisor = aliased(cls)
+        query = db.session.query(
+            cls.name, cls.headcount, cls.direct_reports, cls.depth, manager_supervisor.name.label('supervisor')
+        ).outerjoin(manager_supervisor, manager_supervisor.employee_id == cls.supervisor_id).filter(
+            ranked_by >= minimum)
+        if supervisor is not None:
+            query = query.filter(cls.lft > supervisor.lft, cls.lft < supervisor.rgt)
+        if depth is not None:
+            query = query.filter(cls.depth == depth)
+        return query.order_by(ranked_by.desc(), cls.lft).limit(limit).all()
@@ -0,0 +1,50 @@
+from .model_mixin import db, ModelMixin
+from .employee import EmployeeId
+
+
+class EmployeeClosure(ModelMixin):
+    """
+    The closure table model. It stores one row for every employee and each of their supervisors up the hierarchy,
+    with the number of levels between them. It is kept in sync with the employee table by the closure table storage
+    strategy. There are no foreign keys to the employee table, so it can be replaced by a shadow table
+    """
+    __tablename__ = 'employee_closure'
+
+    # the primary key doubles as the index for the ancestors of an employee, nearest first
+    descendant_id = db.Column(EmployeeId, primary_key=True, autoincrement=False)
+    depth = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    ancestor_id = db.Column(EmployeeId, nullable=False)
+
+    __table_args__ = (db.Index('ix_employee_closure_ancestor_id_depth', 'ancestor_id', 'depth'),)
+
+    def __repr__(self):
+        return f'EmployeeClosure: {self.ancestor_id} -> {self.descendant_id} ({self.depth})'
+
+
+class EmployeePath(ModelMixin):
+    """
+    The materialized path model. It stores the ids of an employee's supervisors from the top most one down to the
+    employee, joined by dots. It is kept in sync with the employee table by the materialized path storage strategy
+    """
+    __tablename__ = 'employee_path'
+
+    employee_id = db.Column(EmployeeId, primary_key=True, autoincrement=False)
+    # the index makes finding everyone under an employee a range scan over the paths starting with theirs
+    path = db.Column(db.Text, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'EmployeePath: {self.path}'
+
+
+class HierarchySnapshot(ModelMixin):
+    """
+    The snapshot model. It stores the whole hierarchy serialized in a single row, which the snapshot storage
+    strategy loads once and answers reads from in memory
+    """
+    __tablename__ = 'hierarchy_snapshot'
+
+    snapshot_id = db.Column(db.String(32), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f'HierarchySnapshot: {self.snapshot_id}'
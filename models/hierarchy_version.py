@@ -0,0 +1,43 @@
+from datetime import datetime
+from .model_mixin import db, ModelMixin
+from .employee import EmployeeId
+
+
+class HierarchyVersion(ModelMixin):
+    """
+    The hierarchy version model. A version is created for every change of the stored hierarchy, and is never changed
+    afterwards
+    """
+    __tablename__ = 'hierarchy_version'
+
+    version_id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    description = db.Column(db.String(120), nullable=False)
+
+    def __repr__(self):
+        return f'HierarchyVersion: {self.version_id}'
+
+
+class EmployeeVersion(ModelMixin):
+    """
+    The employee history model. Each row is the name and supervisor of an employee from the version in which they
+    were set (valid_from) until the version in which they changed (valid_to, None while they are current). Versions
+    share all the rows of the employees who didn't change in between, so the history grows with the size of each
+    change. The lft and rgt values are left out, since renumbering them doesn't change the hierarchy
+    """
+    __tablename__ = 'employee_version'
+
+    # the primary key doubles as the index for finding an employee as of a version
+    employee_id = db.Column(EmployeeId, primary_key=True, autoincrement=False)
+    valid_from = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    valid_to = db.Column(db.Integer, nullable=True)
+    name = db.Column(db.String(120), nullable=False)
+    supervisor_id = db.Column(EmployeeId, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_employee_version_name_valid_from', 'name', 'valid_from'),
+        db.Index('ix_employee_version_supervisor_id_valid_from', 'supervisor_id', 'valid_from'),
+    )
+
+    def __repr__(self):
+        return f'EmployeeVersion: {self.name} ({self.valid_from} - {self.valid_to})'
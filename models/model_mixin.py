@@ -1,9 +1,53 @@
+import logging
+import threading
+import uuid
+from itertools import islice
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import MetaData, bindparam
 from sqlalchemy.exc import SQLAlchemyError
 from app import app
 
 db = SQLAlchemy(app)
 
+# the number of ids in each IN (...) list. Databases limit the number of parameters in a statement, e.g. older SQLite
+# versions allow at most 999
+IN_CHUNK_SIZE = 500
+
+
+def chunked(items, chunk_size):
+    """
+    Splits the items into lists of at most chunk_size items
+    :param items: iterable to split
+    :param chunk_size: int. The maximum number of items in each chunk
+    :return: generator of lists
+    """
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_maintenance(task, name):
+    """
+    Runs a maintenance task in a background thread with its own app context and database session, so the caller
+    doesn't wait for it. When the RUN_MAINTENANCE_IN_BACKGROUND config is off, the task runs right away instead
+    :param task: callable to run
+    :param name: str. The name of the thread
+    """
+    if not app.config['RUN_MAINTENANCE_IN_BACKGROUND']:
+        task()
+        return
+
+    def run():
+        with app.app_context():
+            try:
+                task()
+            finally:
+                db.session.remove()
+    threading.Thread(target=run, name=name, daemon=True).start()
+
 
 class ModelMixin(db.Model):
     """
@@ -78,3 +122,139 @@ class ModelMixin(db.Model):
         except SQLAlchemyError:
             db.session.rollback()
             return False
+
+    @classmethod
+    def bulk_insert(cls, rows, chunk_size=None):
+        """
+        Insert many rows without creating model instances. The rows are sent in chunks, each as a single
+        executemany-style insert statement, within the current transaction. The caller should commit.
+        :param rows: iterable of dicts mapping column names to values
+        :param chunk_size: int. The number of rows in each chunk. Defaults to the BULK_INSERT_CHUNK_SIZE config
+        :return: the number of inserted rows: int
+        """
+        chunk_size = chunk_size or app.config['BULK_INSERT_CHUNK_SIZE']
+        insert_statement = cls.__table__.insert()
+        inserted = 0
+        for chunk in chunked(rows, chunk_size):
+            db.session.execute(insert_statement, chunk)
+            inserted += len(chunk)
+        return inserted
+
+    @classmethod
+    def bulk_update(cls, rows, chunk_size=None):
+        """
+        Update many rows by primary key without loading model instances. Each row is a dict with the primary key
+        and the columns to set, and all the rows should set the same columns. The rows are sent in chunks, each as a
+        single executemany-style update statement, within the current transaction. The caller should commit.
+        :param rows: iterable of dicts mapping column names to values
+        :param chunk_size: int. The number of rows in each chunk. Defaults to the BULK_INSERT_CHUNK_SIZE config
+        :return: the number of updated rows: int
+        """
+        chunk_size = chunk_size or app.config['BULK_INSERT_CHUNK_SIZE']
+        primary_key = cls.__table__.primary_key.columns.values()[0]
+        # the primary key is bound under another name, since a bind parameter can't share the name of a column
+        # which is being set
+        key_parameter = f'_{primary_key.name}'
+        update_statement = cls.__table__.update().where(primary_key == bindparam(key_parameter))
+        updated = 0
+        for chunk in chunked(rows, chunk_size):
+            parameters = []
+            for row in chunk:
+                row = dict(row)
+                row[key_parameter] = row.pop(primary_key.name)
+                parameters.append(row)
+            db.session.execute(update_statement, parameters)
+            updated += len(chunk)
+        return updated
+
+    @classmethod
+    def bulk_delete(cls, ids):
+        """
+        Delete many rows by primary key, within the current transaction. The caller should commit.
+        :param ids: iterable of primary key values
+        :return: the number of deleted rows: int
+        """
+        primary_key = cls.__table__.primary_key.columns.values()[0]
+        deleted = 0
+        for chunk in chunked(ids, IN_CHUNK_SIZE):
+            deleted += db.session.execute(cls.__table__.delete().where(primary_key.in_(chunk))).rowcount
+        return deleted
+
+    @classmethod
+    def create_shadow_table(cls):
+        """
+        Create an empty copy of the table, with the same columns, constraints and indexes, under a unique name. Rows
+        can be written to it without affecting readers of the table, and it is then published with
+        publish_shadow_table.
+        :return: the shadow table: Table
+        """
+        shadow_name = f'{cls.__tablename__}_shadow_{uuid.uuid4().hex[:12]}'
+        shadow_table = cls.__table__.tometadata(MetaData(), name=shadow_name)
+        shadow_table.create(bind=db.session.connection())
+        db.session.commit()
+        return shadow_table
+
+    @classmethod
+    def publish_shadow_table(cls, shadow_table, before_commit=None):
+        """
+        Replace the table with the shadow table in a single short transaction, by renaming the table out of the way
+        and the shadow table into its place. Readers see either the old rows or the new ones, never an empty table.
+        This relies on the database renaming tables atomically, which SQLite, PostgreSQL and MySQL do.
+        :param shadow_table: Table. The shadow table from create_shadow_table
+        :param before_commit: callable. Called after the renames and before the commit, so the writes it makes are
+        committed together with them. On MySQL, which commits the rename on its own, they follow it in the next commit
+        :return: the name the replaced table was renamed to: str
+        """
+        quote = db.engine.dialect.identifier_preparer.quote
+        dialect_name = db.engine.dialect.name
+        table_name = quote(cls.__tablename__)
+        shadow_name = quote(shadow_table.name)
+        retired_name = shadow_table.name.replace('_shadow_', '_retired_')
+
+        if dialect_name == 'mysql':
+            # MySQL commits every DDL statement on its own, but renames several tables atomically in one statement
+            statements = [f'RENAME TABLE {table_name} TO {quote(retired_name)}, {shadow_name} TO {table_name}']
+        else:
+            statements = [
+                f'ALTER TABLE {table_name} RENAME TO {quote(retired_name)}',
+                f'ALTER TABLE {shadow_name} RENAME TO {table_name}'
+            ]
+            if dialect_name == 'sqlite':
+                # pysqlite doesn't open a transaction for DDL statements, so one is opened explicitly
+                statements.insert(0, 'BEGIN')
+
+        db.session.commit()
+        try:
+            for statement in statements:
+                db.session.execute(statement)
+            if before_commit:
+                before_commit()
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            raise
+        return retired_name
+
+    @staticmethod
+    def drop_table(table_name):
+        """
+        Drop the table with the given name if it exists
+        :param table_name: str. The name of the table
+        :return: success: bool
+        """
+        try:
+            db.session.execute(f'DROP TABLE IF EXISTS {db.engine.dialect.identifier_preparer.quote(table_name)}')
+            db.session.commit()
+            return True
+        except SQLAlchemyError as e:
+            logging.error(f"An error has occurred while dropping the table {table_name} - {e}")
+            db.session.rollback()
+            return False
+
+    @classmethod
+    def drop_table_in_background(cls, table_name):
+        """
+        Drop the table with the given name as background maintenance, so the caller doesn't wait for it
+        :param table_name: str. The name of the table
+        """
+        run_maintenance(lambda: cls.drop_table(table_name), f'drop-{table_name}')
@@ -1,5 +1,45 @@
+import json
 from flask_testing import TestCase
 from app import app, db, config_dict
+from hierarchy.read_cache import read_cache
+
+
+def register_user(self, username="user@test", password="test1234", name="tester"):
+    """
+    Helper method to help register a test user
+    """
+    user_data = json.dumps({
+        'username': username,
+        'password': password,
+        'name': name
+    })
+    return self.client.post(
+        '/api/v1/auth/register', data=user_data,
+        content_type='application/json')
+
+
+def login_user(self, username="user@test", password="test1234"):
+    """
+    Helper method to help login a test user
+    """
+    user_data = json.dumps({
+        'username': username,
+        'password': password
+    })
+    return self.client.post(
+        'api/v1/auth/login', data=user_data, content_type='application/json')
+
+
+def post_hierarchy(self, data=None, access_token=""):
+    """
+    Helper method to help post hierarchy data to the endpoint
+    """
+    return self.client.post(
+        '/api/v1/hierarchy/structure',
+        headers=dict(Authorization="Bearer " + access_token),
+        data=data,
+        content_type='application/json'
+    )
 
 
 class BaseTestCase(TestCase):
@@ -14,7 +54,21 @@ class BaseTestCase(TestCase):
     def setUp(self):
         db.create_all()
         db.session.commit()
+        # the read cache lives as long as the process, so the hierarchy of an earlier test is dropped
+        read_cache.clear()
 
     def tearDown(self):
         db.session.remove()
         db.drop_all()
+
+    def login_and_post_hierarchy(self, hierarchy_dict):
+        """
+        Helper method to register and log in a test user and post a hierarchy
+        :param hierarchy_dict: dict. The flat {employee: supervisor} hierarchy to post
+        :return: the headers authorizing the requests of the test user: dict
+        """
+        register_user(self)
+        result = login_user(self)
+        access_token = json.loads(result.data.decode())['auth_token']
+        post_hierarchy(self, json.dumps(hierarchy_dict), access_token)
+        return dict(Authorization="Bearer " + access_token)
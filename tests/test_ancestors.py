@@ -0,0 +1,41 @@
+import unittest
+from array import array
+from hierarchy.ancestors import AncestorIndex
+from hierarchy.compact_tree import INDEX_TYPE
+
+
+class TestAncestorIndex(unittest.TestCase):
+
+    def setUp(self):
+        # Jonas > Sophie > Nick > (Pete, Barbara), in the order of their lft values
+        self.index = AncestorIndex(["Jonas", "Sophie", "Nick", "Pete", "Barbara"], array(INDEX_TYPE, [-1, 0, 1, 2, 2]))
+
+    def test_depths(self):
+        self.assertListEqual(list(self.index.depths), [0, 1, 2, 3, 3])
+        self.assertEqual(len(self.index.jumps), 2)
+
+    def test_ancestor(self):
+        pete = self.index.index("Pete")
+        self.assertEqual(self.index.names[self.index.ancestor(pete, 1)], "Nick")
+        self.assertEqual(self.index.names[self.index.ancestor(pete, 3)], "Jonas")
+        self.assertEqual(self.index.ancestor(pete, 4), -1)
+        self.assertIsNone(self.index.index("Reenah"))
+
+    def test_chain(self):
+        barbara = self.index.index("Barbara")
+        self.assertListEqual(self.index.chain(barbara), ["Nick", "Sophie", "Jonas"])
+        self.assertListEqual(self.index.chain(barbara, 2), ["Nick", "Sophie"])
+        self.assertListEqual(self.index.chain(self.index.index("Jonas")), [])
+
+    def test_ancestor_in_a_deep_chain(self):
+        size = 5000
+        index = AncestorIndex([str(position) for position in range(size)],
+                              array(INDEX_TYPE, range(-1, size - 1)))
+        self.assertEqual(len(index.jumps), 13)
+        for levels in (1, 2, 1000, 2047, 4096, size - 1):
+            self.assertEqual(index.ancestor(size - 1, levels), size - 1 - levels)
+        self.assertEqual(index.ancestor(size - 1, size), -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
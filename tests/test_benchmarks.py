@@ -0,0 +1,106 @@
+import json
+import unittest
+from app import app
+from benchmarks.ingestion import move_employees, run_benchmarks
+from benchmarks.org_generator import SHAPES, employee_name, generate_org
+from benchmarks.serialization import run_serialization_benchmarks
+from helpers.json_provider import JSON_PROVIDERS
+from helpers.validate import check_hierarchy_structure
+
+
+class TestGenerateOrg(unittest.TestCase):
+
+    def test_generate_org_shapes(self):
+        for shape in SHAPES:
+            org = generate_org(shape, 100)
+            self.assertEqual(len(org), 99)
+            structure = check_hierarchy_structure(org)
+            self.assertListEqual(structure['roots'], [employee_name(0)])
+            self.assertListEqual(structure['cycles'], [])
+
+    def test_generate_org_flat_and_deep(self):
+        self.assertSetEqual(set(generate_org('flat', 10).values()), {employee_name(0)})
+        deep = generate_org('deep', 10)
+        self.assertEqual(deep[employee_name(9)], employee_name(8))
+
+    def test_generate_org_balanced(self):
+        balanced = generate_org('balanced', 10, branching=3)
+        self.assertEqual(balanced[employee_name(3)], employee_name(0))
+        self.assertEqual(balanced[employee_name(4)], employee_name(1))
+
+    def test_generate_org_random_is_seeded(self):
+        self.assertEqual(list(generate_org('random', 500, seed=3).items()),
+                         list(generate_org('random', 500, seed=3).items()))
+        self.assertNotEqual(generate_org('random', 500, seed=3), generate_org('random', 500, seed=4))
+
+    def test_generate_org_invalid_arguments(self):
+        with self.assertRaisesRegex(ValueError, 'shape should be one of'):
+            generate_org('round', 10)
+        with self.assertRaisesRegex(ValueError, 'size should be at least 1'):
+            generate_org('flat', 0)
+
+
+class TestRunBenchmarks(unittest.TestCase):
+
+    def test_run_benchmarks_reports_every_stage(self):
+        database_uri = app.config['SQLALCHEMY_DATABASE_URI']
+        in_background = app.config['RUN_MAINTENANCE_IN_BACKGROUND']
+        report = run_benchmarks(app, ['flat', 'random'], [50, 200], seed=1)
+        self.assertEqual(app.config['SQLALCHEMY_DATABASE_URI'], database_uri)
+        self.assertEqual(app.config['RUN_MAINTENANCE_IN_BACKGROUND'], in_background)
+        self.assertEqual(len(report['results']), 4)
+        result = report['results'][-1]
+        self.assertEqual(result['shape'], 'random')
+        self.assertEqual(result['employees'], 200)
+        self.assertListEqual(list(result['stages']), ['decode', 'validate_structure', 'compile', 'restructure_empty',
+                                                      'restructure_populated', 'refresh_read_cache'])
+        for stage in result['stages'].values():
+            self.assertGreater(stage['seconds'], 0)
+            self.assertGreater(stage['peak_memory_bytes'], 0)
+            self.assertGreater(stage['rows_per_second'], 0)
+        # the report is machine readable
+        self.assertEqual(json.loads(json.dumps(report)), report)
+
+    def test_move_employees(self):
+        org = generate_org('deep', 10)
+        moved = move_employees(org, every=4)
+        # the first employee reports to the top most supervisor, who has no supervisor to move them to
+        self.assertEqual(moved[employee_name(1)], employee_name(0))
+        self.assertEqual(moved[employee_name(5)], employee_name(3))
+        self.assertEqual(moved[employee_name(9)], employee_name(7))
+        self.assertEqual(sum(moved[name] != org[name] for name in org), 2)
+        self.assertListEqual(check_hierarchy_structure(moved)['cycles'], [])
+
+
+class TestRunSerializationBenchmarks(unittest.TestCase):
+
+    def test_run_serialization_benchmarks_reports_every_payload(self):
+        report = run_serialization_benchmarks(['balanced'], [300], seed=1, repeat=1)
+        self.assertListEqual(report['providers'], list(JSON_PROVIDERS))
+        self.assertEqual(len(report['results']), 1)
+        balanced = report['results'][0]
+        self.assertEqual(balanced['employees'], 300)
+        self.assertListEqual(list(balanced['payloads']),
+                             ['structure', 'supervisors', 'descendants', 'snapshot', 'structure_request'])
+        for payload in balanced['payloads'].values():
+            self.assertGreater(payload['bytes'], 0)
+            self.assertListEqual(list(payload['providers']), list(JSON_PROVIDERS))
+            for measured in payload['providers'].values():
+                self.assertGreater(measured['seconds'], 0)
+                self.assertGreater(measured['megabytes_per_second'], 0)
+            self.assertEqual(payload['providers']['stdlib']['speedup'], 1)
+        # the report is machine readable
+        self.assertEqual(json.loads(json.dumps(report)), report)
+
+    def test_run_serialization_benchmarks_skips_what_cannot_be_encoded(self):
+        report = run_serialization_benchmarks(['deep'], [3000], repeat=1)
+        # the structure of a deep organization nests deeper than the recursion limit
+        structure = report['results'][0]['payloads']['structure']
+        self.assertIsNone(structure['bytes'])
+        for measured in structure['providers'].values():
+            self.assertIsNone(measured['seconds'])
+        self.assertGreater(report['results'][0]['payloads']['supervisors']['bytes'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
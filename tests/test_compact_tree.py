@@ -0,0 +1,62 @@
+import unittest
+from array import array
+from hierarchy.compact_tree import CompactTree
+
+
+class TestCompactTree(unittest.TestCase):
+
+    def setUp(self):
+        self.entry = {
+            "Pete": "Nick",
+            "Barbara": "Nick",
+            "Nick": "Sophie",
+            "Sophie": "Jonas",
+        }
+        self.tree = CompactTree.from_hierarchy_dict(self.entry)
+
+    def test_compact_tree_from_hierarchy_dict(self):
+        tree = self.tree
+        self.assertEqual(len(tree), 5)
+        self.assertListEqual([tree.names[root] for root in tree.roots], ["Jonas"])
+        self.assertEqual(tree.parents[tree.index("Pete")], tree.index("Nick"))
+        self.assertEqual(tree.parents[tree.index("Jonas")], -1)
+        self.assertIsNone(tree.index("Reenah"))
+        self.assertIsInstance(tree.parents, array)
+
+    def test_compact_tree_subordinates_keep_input_order(self):
+        tree = self.tree
+        subordinates = [tree.names[index] for index in tree.subordinates(tree.index("Nick"))]
+        self.assertListEqual(subordinates, ["Pete", "Barbara"])
+        self.assertEqual(len(tree.subordinates(tree.index("Pete"))), 0)
+
+    def test_compact_tree_mptt_values(self):
+        tree = self.tree
+        self.assertListEqual([tree.names[index] for index in tree.preorder()],
+                             ["Jonas", "Sophie", "Nick", "Pete", "Barbara"])
+        self.assertListEqual([(tree.lft[index], tree.rgt[index]) for index in tree.preorder()],
+                             [(1, 10), (2, 9), (3, 8), (4, 5), (6, 7)])
+        self.assertListEqual([tree.depths[index] for index in tree.preorder()], [0, 1, 2, 3, 3])
+        self.assertListEqual([tree.headcounts[index] for index in tree.preorder()], [4, 3, 2, 0, 0])
+        self.assertListEqual([tree.direct_reports(index) for index in tree.preorder()], [1, 1, 2, 0, 0])
+
+    def test_compact_tree_from_names_and_parents(self):
+        tree = CompactTree(["Peter", "Ham", "Jam"], array('i', [-1, 0, 0]))
+        self.assertEqual(tree.index("Jam"), 2)
+        self.assertListEqual(list(tree.subordinates(0)), [1, 2])
+        self.assertListEqual(list(tree.lft), [1, 2, 4])
+        self.assertListEqual(list(tree.rgt), [6, 3, 5])
+
+    def test_compact_tree_deep_chain(self):
+        depth = 100000
+        tree = CompactTree.from_hierarchy_dict({f"E{i}": f"E{i - 1}" for i in range(1, depth)})
+        self.assertEqual(tree.rgt[tree.index("E0")], depth * 2)
+        self.assertEqual(tree.lft[tree.index(f"E{depth - 1}")], depth)
+
+    def test_compact_tree_empty(self):
+        tree = CompactTree.from_hierarchy_dict({})
+        self.assertEqual(len(tree), 0)
+        self.assertEqual(len(tree.roots), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import gzip
+import io
+import json
+import unittest
+import zlib
+from tests.base_test import BaseTestCase, login_user, register_user
+from benchmarks.org_generator import generate_org
+from helpers.compression import DecompressedBodyTooLarge, GzipDecodingStream
+
+single_root_json = {
+    "Pete": "Nick",
+    "Barbara": "Nick",
+    "Nick": "Sophie",
+    "Sophie": "Jonas"
+}
+
+
+class TestGzipDecodingStream(unittest.TestCase):
+
+    def test_read_in_small_pieces(self):
+        body = json.dumps(generate_org('balanced', 2000)).encode()
+        stream = io.BufferedReader(GzipDecodingStream(io.BytesIO(gzip.compress(body))), buffer_size=100)
+        pieces = []
+        while True:
+            piece = stream.read(37)
+            if not piece:
+                break
+            self.assertLessEqual(len(piece), 37)
+            pieces.append(piece)
+        self.assertEqual(b''.join(pieces), body)
+
+    def test_read_up_to_the_limit(self):
+        body = b'x' * 1000
+        self.assertEqual(GzipDecodingStream(io.BytesIO(gzip.compress(body)), limit=1000).readall(), body)
+
+    def test_read_over_the_limit_stops(self):
+        raw = io.BytesIO(gzip.compress(b'x' * 100000000))
+        with self.assertRaises(DecompressedBodyTooLarge):
+            GzipDecodingStream(raw, limit=1000).readall()
+        # the read stops right after the limit, without reading the rest of the body
+        self.assertLess(raw.tell(), len(raw.getvalue()))
+
+    def test_read_several_members(self):
+        stream = GzipDecodingStream(io.BytesIO(gzip.compress(b'{"Pete": ') + gzip.compress(b'"Nick"}')))
+        self.assertEqual(io.BufferedReader(stream).read(), b'{"Pete": "Nick"}')
+
+
+class TestCompression(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        register_user(self)
+        result = login_user(self)
+        self.headers = dict(Authorization="Bearer " + json.loads(result.data.decode())['auth_token'])
+
+    def post_hierarchy(self, data, **headers):
+        return self.client.post('/api/v1/hierarchy/structure', headers=dict(self.headers, **headers), data=data,
+                                content_type='application/json')
+
+    def test_post_gzip_compressed_hierarchy(self):
+        """
+        Test that a hierarchy posted with gzip Content-Encoding is decompressed
+        """
+        response = self.post_hierarchy(gzip.compress(json.dumps(single_root_json).encode()),
+                                       **{'Content-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 201)
+        res = json.loads(response.data.decode())
+        self.assertListEqual(list(res['employee_hierarchy']), ['Jonas'])
+
+    def test_large_response_is_compressed(self):
+        """
+        Test that a large response is gzip compressed for a client which accepts it, and that repetitive hierarchy
+        JSON gets much smaller
+        """
+        hierarchy = json.dumps(generate_org('balanced', 5000)).encode()
+        response = self.post_hierarchy(gzip.compress(hierarchy), **{
+            'Content-Encoding': 'gzip', 'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        body = gzip.decompress(response.data)
+        self.assertEqual(len(json.loads(body.decode())['employee_hierarchy']), 1)
+        self.assertGreater(len(body) / len(response.data), 8)
+        self.assertGreater(len(hierarchy) / len(gzip.compress(hierarchy)), 8)
+
+    def test_small_response_is_not_compressed(self):
+        """
+        Test that a response smaller than the COMPRESSION_MIN_SIZE is sent as it is
+        """
+        self.post_hierarchy(json.dumps(single_root_json))
+        response = self.client.get('/api/v1/hierarchy/two_supervisors/Pete',
+                                   headers=dict(self.headers, **{'Accept-Encoding': 'gzip'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertTrue(json.loads(response.data.decode())['status'] == 'success')
+
+    def test_compressed_response_has_weak_etag(self):
+        """
+        Test that the ETag of a compressed response is weak, and still answers conditional requests
+        """
+        self.app.config['COMPRESSION_MIN_SIZE'] = 10
+        try:
+            self.post_hierarchy(json.dumps(single_root_json))
+            headers = dict(self.headers, **{'Accept-Encoding': 'gzip'})
+            response = self.client.get('/api/v1/hierarchy/ancestors/Pete', headers=headers)
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertTrue(response.headers['ETag'].startswith('W/'))
+            self.assertListEqual(json.loads(zlib.decompress(response.data, 16 + zlib.MAX_WBITS))['ancestors'],
+                                 ['Nick', 'Sophie', 'Jonas'])
+            response = self.client.get('/api/v1/hierarchy/ancestors/Pete', headers=dict(
+                headers, **{'If-None-Match': response.headers['ETag']}))
+            self.assertEqual(response.status_code, 304)
+        finally:
+            self.app.config['COMPRESSION_MIN_SIZE'] = 1024
+
+    def test_invalid_compressed_body_fails(self):
+        """
+        Test that a body which isn't valid for its Content-Encoding is rejected
+        """
+        response = self.post_hierarchy(b'not gzip at all', **{'Content-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 400)
+        res = json.loads(response.data.decode())
+        self.assertTrue(res['status'] == 'fail')
+        self.assertTrue(res['message'] == 'The request body could not be decompressed with its Content-Encoding.')
+
+    def test_body_decompressing_over_the_limit_fails(self):
+        """
+        Test that a small body which decompresses to more than MAX_DECOMPRESSED_SIZE is rejected
+        """
+        self.app.config['MAX_DECOMPRESSED_SIZE'] = 1024
+        try:
+            response = self.post_hierarchy(gzip.compress(b' ' * 1000000 + json.dumps(single_root_json).encode()),
+                                           **{'Content-Encoding': 'gzip'})
+        finally:
+            self.app.config['MAX_DECOMPRESSED_SIZE'] = 256 * 1024 * 1024
+        self.assertEqual(response.status_code, 413)
+        res = json.loads(response.data.decode())
+        self.assertTrue(res['status'] == 'fail')
+        self.assertTrue(res['message'] == 'The request body is too large once decompressed.')
+
+    def test_unsupported_content_encoding_fails(self):
+        """
+        Test that a body compressed in a way the API doesn't support is rejected
+        """
+        response = self.post_hierarchy(b'{}', **{'Content-Encoding': 'br'})
+        self.assertEqual(response.status_code, 415)
+        self.assertTrue(json.loads(response.data.decode())['status'] == 'fail')
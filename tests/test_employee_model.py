@@ -1,12 +1,24 @@
-import uuid
+import os
+import subprocess
+import sys
+import unittest
+from sqlalchemy import event
 from tests.base_test import BaseTestCase
-from models.employee import Employee
+from benchmarks.org_generator import generate_org
+from hierarchy.parse_hierarchy import compile_hierarchy, new_employee_id, sequential_id_factory
+from models.employee import Employee, INTEGER_IDS
+from models.model_mixin import db
 
 
 class TestEmployeeModel(BaseTestCase):
 
+    def setUp(self):
+        super().setUp()
+        # the ids of the employees of a test, of the type the employee table is created with
+        self.new_id = sequential_id_factory(1) if INTEGER_IDS else new_employee_id
+
     def test_insert_employee(self):
-        emp_id = uuid.uuid4().hex
+        emp_id = self.new_id("Jack Hughes")
         employee = Employee(
             employee_id=emp_id,
             name="Jack Hughes",
@@ -22,9 +34,9 @@ class TestEmployeeModel(BaseTestCase):
         self.assertEqual(db_employee.name, "Jack Hughes")
 
     def test_delete_all_employees(self):
-        emp_id = uuid.uuid4().hex
+        emp_id = self.new_id("Jack Hughes")
         employee1 = Employee(
-            employee_id=uuid.uuid4().hex,
+            employee_id=emp_id,
             name="Jack Hughes",
             supervisor_id=None,
             lft=1,
@@ -32,7 +44,7 @@ class TestEmployeeModel(BaseTestCase):
         )
         employee1.save()
         employee2 = Employee(
-            employee_id=uuid.uuid4().hex,
+            employee_id=self.new_id("Ryan Reynolds"),
             name="Ryan Reynolds",
             supervisor_id=emp_id,
             lft=2,
@@ -46,3 +58,94 @@ class TestEmployeeModel(BaseTestCase):
         self.assertTrue(result)
         current_employees = Employee.fetch_all()
         self.assertEqual(len(current_employees), 0)
+
+    @unittest.skipUnless(INTEGER_IDS, 'the employee table uses UUID ids')
+    def test_next_integer_id(self):
+        self.assertEqual(Employee.next_integer_id(), 1)
+        Employee(employee_id=7, name="Jack Hughes", supervisor_id=None, lft=1, rgt=2).save()
+        self.assertEqual(Employee.next_integer_id(), 8)
+
+    def test_bulk_insert_sends_one_statement_per_chunk(self):
+        tree, ids = compile_hierarchy(generate_org('random', 3000), self.new_id)
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement.split()[0], executemany, len(parameters)))
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            Employee.bulk_insert(Employee.hierarchy_rows(tree, ids), chunk_size=1000)
+            db.session.commit()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+        self.assertListEqual(statements, [('INSERT', True, 1000)] * 3)
+        # the rows are inserted without creating an Employee instance for each of them
+        self.assertEqual(len(db.session.identity_map), 0)
+        self.assertEqual(len(Employee.fetch_all()), 3000)
+
+    def test_apply_restructure(self):
+        tree, ids = compile_hierarchy({"Ham": "Peter", "Jam": "Peter"}, self.new_id)
+        self.assertTrue(Employee.rebuild_hierarchy(tree, ids))
+        stored = Employee.stored_hierarchy()
+        self.assertDictEqual(stored["Jam"], {
+            'employee_id': ids[tree.index("Jam")],
+            'supervisor_id': ids[tree.index("Peter")],
+            'lft': 4,
+            'rgt': 5,
+            'depth': 1,
+            'headcount': 0,
+            'direct_reports': 0
+        })
+        plan = {
+            'inserts': [{'employee_id': self.new_id("Spam"), 'name': "Spam", 'supervisor_id': ids[tree.index("Ham")],
+                         'lft': 3, 'rgt': 4}],
+            'updates': [{'employee_id': ids[tree.index("Ham")], 'lft': 2, 'rgt': 5},
+                        {'employee_id': ids[tree.index("Peter")], 'lft': 1, 'rgt': 6}],
+            'deletes': [ids[tree.index("Jam")]]
+        }
+        self.assertTrue(Employee.apply_restructure(plan, chunk_size=1))
+        stored = Employee.stored_hierarchy()
+        self.assertListEqual(sorted(stored), ["Ham", "Peter", "Spam"])
+        self.assertEqual((stored["Ham"]['lft'], stored["Ham"]['rgt']), (2, 5))
+        self.assertEqual(stored["Ham"]['supervisor_id'], ids[tree.index("Peter")])
+        self.assertEqual(stored["Peter"]['rgt'], 6)
+
+    def test_rebuild_hierarchy_swaps_in_a_new_table(self):
+        tree, ids = compile_hierarchy({"Ham": "Peter", "Jam": "Peter"}, self.new_id)
+        self.assertTrue(Employee.rebuild_hierarchy(tree, ids))
+        new_tree, new_ids = compile_hierarchy({"Sophie": "Jonas", "Nick": "Sophie"}, self.new_id)
+        self.assertTrue(Employee.rebuild_hierarchy(new_tree, new_ids, chunk_size=2))
+        stored = Employee.stored_hierarchy()
+        self.assertListEqual(sorted(stored), ["Jonas", "Nick", "Sophie"])
+        self.assertEqual(stored["Nick"]['supervisor_id'], new_ids[new_tree.index("Sophie")])
+        # the replaced table is dropped and the swapped in table keeps the constraints
+        self.assertListEqual(sorted(db.engine.table_names()), sorted(db.metadata.tables))
+        duplicate = Employee(employee_id=self.new_id("Nick"), name="Nick", supervisor_id=None, lft=1, rgt=2)
+        self.assertFalse(duplicate.save())
+
+    def test_failed_rebuild_keeps_the_stored_hierarchy(self):
+        tree, ids = compile_hierarchy({"Ham": "Peter"}, self.new_id)
+        self.assertTrue(Employee.rebuild_hierarchy(tree, ids))
+        new_tree, new_ids = compile_hierarchy({"Sophie": "Jonas", "Nick": "Sophie"}, self.new_id)
+        new_tree.names[new_tree.index("Nick")] = "Sophie"
+        self.assertFalse(Employee.rebuild_hierarchy(new_tree, new_ids))
+        self.assertListEqual(sorted(Employee.stored_hierarchy()), ["Ham", "Peter"])
+        self.assertListEqual(sorted(db.engine.table_names()), sorted(db.metadata.tables))
+
+
+class TestEmployeeModelWithIntegerIds(unittest.TestCase):
+
+    @unittest.skipIf(INTEGER_IDS, 'the suite already runs with integer ids')
+    def test_employee_model_with_integer_ids(self):
+        """
+        Test the employee model with an employee table of integer ids. The column types are set when the model is
+        imported, so the tests run again in a new process
+        """
+        result = subprocess.run(
+            [sys.executable, '-m', 'pytest', '-q', '-p', 'no:cacheprovider', __file__],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=dict(os.environ, EMPLOYEE_ID_TYPE='integer'),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT
+        )
+        self.assertEqual(result.returncode, 0, result.stdout.decode())
@@ -0,0 +1,55 @@
+import random
+import unittest
+from array import array
+from hierarchy.ancestors import AncestorIndex
+from hierarchy.compact_tree import INDEX_TYPE
+
+
+class TestEulerTourIndex(unittest.TestCase):
+
+    def setUp(self):
+        # Jonas > (Sophie > Nick > (Pete, Barbara), Anna > Tom), in the order of their lft values
+        self.index = AncestorIndex(["Jonas", "Sophie", "Nick", "Pete", "Barbara", "Anna", "Tom"],
+                                   array(INDEX_TYPE, [-1, 0, 1, 2, 2, 0, 5]))
+        self.euler_tour = self.index.euler_tour()
+
+    def common_manager(self, first, second):
+        manager, distance = self.euler_tour.distance(self.index.index(first), self.index.index(second))
+        return self.index.names[manager], distance
+
+    def test_tour_visits_every_employee(self):
+        self.assertEqual(len(self.euler_tour.table[0]), 2 * len(self.index) - 1)
+        self.assertIs(self.index.euler_tour(), self.euler_tour)
+
+    def test_common_manager(self):
+        self.assertTupleEqual(self.common_manager("Pete", "Barbara"), ("Nick", 2))
+        self.assertTupleEqual(self.common_manager("Pete", "Tom"), ("Jonas", 5))
+        self.assertTupleEqual(self.common_manager("Tom", "Sophie"), ("Jonas", 3))
+
+    def test_common_manager_of_a_supervisor_and_a_subordinate(self):
+        self.assertTupleEqual(self.common_manager("Sophie", "Barbara"), ("Sophie", 2))
+        self.assertTupleEqual(self.common_manager("Barbara", "Jonas"), ("Jonas", 3))
+        self.assertTupleEqual(self.common_manager("Nick", "Nick"), ("Nick", 0))
+
+    def test_common_manager_matches_walking_up(self):
+        rng = random.Random(18)
+        size = 2000
+        # in the order of lft values, the supervisor of each employee is on the path down to the one before them
+        parents = array(INDEX_TYPE, [-1])
+        path = [0]
+        for position in range(1, size):
+            del path[rng.randint(1, len(path)):]
+            parents.append(path[-1])
+            path.append(position)
+        index = AncestorIndex([str(position) for position in range(size)], parents)
+        euler_tour = index.euler_tour()
+        for _ in range(500):
+            first, second = rng.randrange(size), rng.randrange(size)
+            above_first = [first] + [index.index(name) for name in index.chain(first)]
+            above_second = {second, *(index.index(name) for name in index.chain(second))}
+            expected = next(position for position in above_first if position in above_second)
+            self.assertEqual(euler_tour.common_manager(first, second), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,44 +1,11 @@
 import json
 import unittest
-from tests.base_test import BaseTestCase
-
-
-def register_user(self, username="user@test", password="test1234", name="tester"):
-    """
-    Helper method to help register a test user
-    """
-    user_data = json.dumps({
-        'username': username,
-        'password': password,
-        'name': name
-    })
-    return self.client.post(
-        '/api/v1/auth/register', data=user_data,
-        content_type='application/json')
-
-
-def login_user(self, username="user@test", password="test1234"):
-    """
-    Helper method to help login a test user
-    """
-    user_data = json.dumps({
-        'username': username,
-        'password': password
-    })
-    return self.client.post(
-        'api/v1/auth/login', data=user_data, content_type='application/json')
-
-
-def post_hierarchy(self, data=None, access_token=""):
-    """
-    Helper method to help post hierarchy data to the endpoint
-    """
-    return self.client.post(
-        '/api/v1/hierarchy/structure',
-        headers=dict(Authorization="Bearer " + access_token),
-        data=data,
-        content_type='application/json'
-    )
+from tests.base_test import BaseTestCase, login_user, post_hierarchy, register_user
+from hierarchy.parse_hierarchy import organize_hierarchy
+from hierarchy.read_cache import read_cache
+from models.employee import Employee
+from models.hierarchy_version import HierarchyVersion
+from models.model_mixin import db
 
 
 single_root_json = {
@@ -123,8 +90,10 @@ class TestStructureHierarchy(BaseTestCase):
         data = json.dumps(single_root_json)
         # make a POST request to structure JSON
         response = post_hierarchy(self, data, access_token)
+        self.assertTrue(response.is_streamed)
         res = json.loads(response.data.decode())
         self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.content_type, 'application/json')
         self.assertTrue(res['status'] == 'success')
         self.assertEqual(res['employee_hierarchy'], formatted_structure)
 
@@ -184,6 +153,110 @@ class TestStructureHierarchy(BaseTestCase):
         self.assertTrue(res['status'] == 'fail')
         self.assertTrue(res['message'] == "There are multiple roots in the hierarchy: ['Jonas', 'Reenah']")
 
+    def test_that_hierarchy_with_a_cycle_fails_without_touching_the_database(self):
+        """
+        Test that employee JSON where employees supervise each other is rejected and the stored hierarchy is kept
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        response = self.client.post('/api/v1/hierarchy/structure', headers=headers,
+                                    data='{"Pete": "Nick", "Nick": "Pete", "Sophie": "Jonas"}',
+                                    content_type='application/json')
+        res = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(res['status'] == 'fail')
+        self.assertTrue(res['message'] == "The posted JSON contains loops. "
+                                          "These employees supervise each other in a cycle: [['Pete', 'Nick']]")
+        self.assertEqual(len(Employee.fetch_all()), 5)
+
+    def test_that_self_supervised_employee_fails(self):
+        """
+        Test that employee JSON where an employee supervises themselves is rejected
+        """
+        register_user(self)
+        result = login_user(self)
+        access_token = json.loads(result.data.decode())['auth_token']
+        response = post_hierarchy(self, '{"Pete": "Pete", "Nick": "Jonas"}', access_token)
+        res = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(res['message'] == "The posted JSON contains loops. "
+                                          "These employees supervise themselves: ['Pete']")
+
+    def test_that_invalid_supervisor_name_fails(self):
+        """
+        Test that employee JSON where a supervisor is not a string is rejected
+        """
+        register_user(self)
+        result = login_user(self)
+        access_token = json.loads(result.data.decode())['auth_token']
+        response = post_hierarchy(self, '{"Pete": ["Nick"], "Nick": "Jonas"}', access_token)
+        res = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(res['message'] == "These employees don't have a valid supervisor name: ['Pete']")
+
+    def test_that_empty_employee_name_fails(self):
+        """
+        Test that employee JSON with an empty employee or supervisor name is rejected
+        """
+        register_user(self)
+        result = login_user(self)
+        access_token = json.loads(result.data.decode())['auth_token']
+        for data in ('{"": "Nick", "Nick": "Jonas"}', '{"Pete": " ", "Nick": "Jonas"}'):
+            response = post_hierarchy(self, data, access_token)
+            res = json.loads(response.data.decode())
+            self.assertEqual(response.status_code, 400)
+            self.assertTrue(res['message'] == 'The employee and supervisor names should not be empty')
+        self.assertEqual(len(Employee.fetch_all()), 0)
+
+    def test_names_are_stored_without_whitespace_around_them(self):
+        """
+        Test that the whitespace around the posted names is stripped, and that names which are the same once stripped
+        are the same employee
+        """
+        register_user(self)
+        result = login_user(self)
+        access_token = json.loads(result.data.decode())['auth_token']
+        response = post_hierarchy(self, '{" Pete ": "Nick", "Nick": " Jonas"}', access_token)
+        self.assertEqual(response.status_code, 201)
+        self.assertDictEqual(json.loads(response.data.decode())['employee_hierarchy'],
+                             {"Jonas": {"Nick": {"Pete": {}}}})
+        self.assertEqual(Employee.find_first(name="Pete").supervisor_id, Employee.find_first(name="Nick").employee_id)
+        response = post_hierarchy(self, '{"Pete": "Nick", "Pete ": "Jonas", "Nick": "Jonas"}', access_token)
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(json.loads(response.data.decode())['message'] == 'The posted JSON contains loops. '
+                        "These employees have more than one supervisor: ['Pete']")
+
+    def test_posted_hierarchy_is_returned_organized(self):
+        """
+        Test that the hierarchy in the response is the organized hierarchy of the posted JSON
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        hierarchy = {"Pete": "Nick", "Ham": "Jonas", "Barbara": "Nick", "Nick": "Sophie", "Sophie": "Jonas"}
+        response = self.client.post('/api/v1/hierarchy/structure', headers=headers, data=json.dumps(hierarchy),
+                                    content_type='application/json')
+        # the subordinates are in the same order too
+        self.assertEqual(json.dumps(json.loads(response.data.decode())['employee_hierarchy']),
+                         json.dumps(organize_hierarchy(hierarchy)))
+
+    def test_reposting_hierarchy_only_writes_changes(self):
+        """
+        Test that posting a changed hierarchy keeps the ids of the employees who are still in it
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        stored = Employee.stored_hierarchy()
+
+        changed_json = {"Barbara": "Sophie", "Nick": "Sophie", "Sophie": "Jonas", "Jane": "Barbara"}
+        response = self.client.post('/api/v1/hierarchy/structure', headers=headers, data=json.dumps(changed_json),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        restructured = Employee.stored_hierarchy()
+        self.assertListEqual(sorted(restructured), ["Barbara", "Jane", "Jonas", "Nick", "Sophie"])
+        for name in ["Barbara", "Jonas", "Nick", "Sophie"]:
+            self.assertEqual(restructured[name]['employee_id'], stored[name]['employee_id'])
+        self.assertEqual(restructured["Barbara"]['supervisor_id'], stored["Sophie"]['employee_id'])
+        self.assertEqual(restructured["Jane"]['supervisor_id'], stored["Barbara"]['employee_id'])
+        gap = self.app.config['HIERARCHY_GAP']
+        self.assertEqual((restructured["Jonas"]['lft'], restructured["Jonas"]['rgt']), (gap, 10 * gap))
+
 
 class TestTwoImmediateSupervisors(BaseTestCase):
 
@@ -288,6 +361,819 @@ class TestTwoImmediateSupervisors(BaseTestCase):
         supervisors = {'supervisor': 'Jonas', 'supervisor_of_supervisor': None}
         self.assertDictEqual(res['supervisors'], supervisors)
 
+    def test_get_supervisors_as_of_a_version(self):
+        """
+        Test that the supervisors of an employee can be read as of an earlier version of the hierarchy
+        """
+        register_user(self)
+        result = login_user(self)
+        access_token = json.loads(result.data.decode())['auth_token']
+        response = post_hierarchy(self, json.dumps(single_root_json), access_token)
+        first_version = json.loads(response.data.decode())['version']
+        post_hierarchy(self, json.dumps(dict(single_root_json, Pete='Sophie')), access_token)
+        response = self.client.get(
+            f'/api/v1/hierarchy/two_supervisors/Pete?as_of={first_version}',
+            headers=dict(Authorization="Bearer " + access_token),
+        )
+        res = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        supervisors = {'supervisor': 'Nick', 'supervisor_of_supervisor': 'Sophie'}
+        self.assertDictEqual(res['supervisors'], supervisors)
+        response = self.client.get(
+            '/api/v1/hierarchy/two_supervisors/Pete',
+            headers=dict(Authorization="Bearer " + access_token),
+        )
+        supervisors = {'supervisor': 'Sophie', 'supervisor_of_supervisor': 'Jonas'}
+        self.assertDictEqual(json.loads(response.data.decode())['supervisors'], supervisors)
+
+    def test_get_supervisors_as_of_an_invalid_version_fails(self):
+        """
+        Test that the as_of parameter should be an existing version number or a timestamp
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        response = self.client.get(
+            '/api/v1/hierarchy/two_supervisors/Pete?as_of=yesterday',
+            headers=headers,
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            '/api/v1/hierarchy/two_supervisors/Pete?as_of=2000-01-01T00:00:00',
+            headers=headers,
+        )
+        res = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(res['message'] == "There is no hierarchy version as of '2000-01-01T00:00:00'")
+
+    def post_names(self, names, query=''):
+        """
+        Helper method to log in a test user, post the single root hierarchy and get the supervisors of many employees
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        return self.client.post(
+            '/api/v1/hierarchy/two_supervisors' + query,
+            headers=headers,
+            data=json.dumps({'names': names}),
+            content_type='application/json'
+        )
+
+    def test_get_supervisors_of_many_employees(self):
+        """
+        Test that the two immediate supervisors of many employees are returned in one streamed response
+        """
+        response = self.post_names(['Pete', 'Sophie', 'pokeman', 'Jonas'])
+        self.assertTrue(response.is_streamed)
+        res = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(res['supervisors'], [
+            {'employee': 'Pete', 'found': True, 'supervisor': 'Nick', 'supervisor_of_supervisor': 'Sophie'},
+            {'employee': 'Sophie', 'found': True, 'supervisor': 'Jonas', 'supervisor_of_supervisor': None},
+            {'employee': 'pokeman', 'found': False, 'supervisor': None, 'supervisor_of_supervisor': None},
+            {'employee': 'Jonas', 'found': True, 'supervisor': None, 'supervisor_of_supervisor': None}
+        ])
+
+    def test_get_supervisors_of_many_employees_as_of_a_version(self):
+        """
+        Test that the two immediate supervisors of many employees can be read as of a version
+        """
+        response = self.post_names(['Pete', 'Sophie', 'pokeman'], '?as_of=1')
+        res = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual([(item['supervisor'], item['supervisor_of_supervisor']) for item in res['supervisors']],
+                             [('Nick', 'Sophie'), ('Jonas', None), (None, None)])
+
+    def test_get_supervisors_of_invalid_names_fails(self):
+        """
+        Test that the names should be a non empty list of strings
+        """
+        for names in ([], 'Pete', ['Pete', 1]):
+            response = self.post_names(names)
+            self.assertEqual(response.status_code, 400)
+
+
+class TestAncestors(BaseTestCase):
+
+    def get_ancestors(self, query):
+        """
+        Helper method to log in a test user, post the single root hierarchy and get the ancestors of an employee
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        response = self.client.get(
+            f'/api/v1/hierarchy/ancestors/{query}',
+            headers=headers,
+        )
+        return response, json.loads(response.data.decode())
+
+    def test_unauthenticated_user_fails(self):
+        """
+        Test that a user who is not authenticated can't get the ancestors of an employee
+        """
+        response = self.client.get('/api/v1/hierarchy/ancestors/Pete')
+        self.assertEqual(response.status_code, 401)
+
+    def test_get_all_ancestors(self):
+        """
+        Test that the whole chain of command above an employee is returned by default and for depth=all
+        """
+        for query in ('Pete', 'Pete?depth=all'):
+            response, res = self.get_ancestors(query)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(res['status'] == 'success')
+            self.assertListEqual(res['ancestors'], ['Nick', 'Sophie', 'Jonas'])
+
+    def test_get_ancestors_up_to_a_depth(self):
+        """
+        Test that only the given number of levels above an employee are returned
+        """
+        response, res = self.get_ancestors('Barbara?depth=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(res['ancestors'], ['Nick', 'Sophie'])
+
+    def test_get_ancestor_at_a_level(self):
+        """
+        Test that the single supervisor a number of levels above an employee is returned
+        """
+        response, res = self.get_ancestors('Barbara?level=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(res['ancestor'], 'Jonas')
+        response, res = self.get_ancestors('Barbara?level=4')
+        self.assertIsNone(res['ancestor'])
+
+    def test_invalid_depth_fails(self):
+        """
+        Test that the depth should be a positive number or all
+        """
+        response, res = self.get_ancestors('Pete?depth=-1')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(res['message'] == "The depth parameter should be a positive number or 'all'")
+        response, res = self.get_ancestors('Pete?level=all')
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_ancestors_of_non_existent_employee_fails(self):
+        """
+        Test that the ancestors of an employee who doesn't exist can't be returned
+        """
+        response, res = self.get_ancestors('pokeman')
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(res['message'] == "The requested employee: 'pokeman' doesn't exist")
+
+    def test_get_read_cache_counters(self):
+        """
+        Test that the counters of the read cache are exposed, and that a lookup is served from the cache
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        response = self.client.get('/api/v1/hierarchy/cache', headers=headers)
+        hits = json.loads(response.data.decode())['cache']['hits']
+        self.client.get('/api/v1/hierarchy/two_supervisors/Pete', headers=headers)
+        response = self.client.get('/api/v1/hierarchy/cache', headers=headers)
+        res = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(res['cache']['hits'], hits + 1)
+        self.assertEqual(res['cache']['employees'], 5)
+
+
+class TestDescendants(BaseTestCase):
+
+    def get_descendants(self, query):
+        """
+        Helper method to log in a test user, post the single root hierarchy and stream the descendants of an employee
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        return self.client.get(
+            f'/api/v1/hierarchy/descendants/{query}',
+            headers=headers,
+        )
+
+    def test_stream_descendants(self):
+        """
+        Test that everyone under an employee is streamed as NDJSON in the order of the hierarchy, across several
+        keyset pages
+        """
+        self.app.config['DESCENDANTS_PAGE_SIZE'] = 2
+        response = self.get_descendants('Jonas')
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content_type, 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertListEqual([(line['name'], line['supervisor']) for line in lines],
+                             [('Sophie', 'Jonas'), ('Nick', 'Sophie'), ('Pete', 'Nick'), ('Barbara', 'Nick')])
+
+    def test_resume_descendants_after_a_cursor(self):
+        """
+        Test that the stream can be resumed after the cursor of a line, and limited
+        """
+        response = self.get_descendants('Sophie?limit=1')
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertListEqual([line['name'] for line in lines], ['Nick'])
+        response = self.get_descendants(f"Sophie?after={lines[-1]['cursor']}")
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertListEqual([line['name'] for line in lines], ['Pete', 'Barbara'])
+
+    def test_descendants_of_an_employee_without_subordinates(self):
+        """
+        Test that the stream is empty for an employee who supervises nobody
+        """
+        response = self.get_descendants('Pete')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'')
+
+    def test_descendants_with_invalid_parameters_fail(self):
+        """
+        Test that the cursor and the limit should be whole numbers
+        """
+        self.assertEqual(self.get_descendants('Jonas?after=abc').status_code, 400)
+        response = self.get_descendants('Jonas?limit=0')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(json.loads(response.data.decode())['message'] ==
+                        'The limit parameter should be a whole number of at least 1')
+
+    def test_descendants_of_non_existent_employee_fails(self):
+        """
+        Test that the descendants of an employee who doesn't exist can't be streamed
+        """
+        response = self.get_descendants('pokeman')
+        self.assertEqual(response.status_code, 404)
+
+    def test_descendants_as_of_a_version_fails(self):
+        """
+        Test that the descendants can only be streamed from the current hierarchy
+        """
+        response = self.get_descendants('Jonas?as_of=1')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(json.loads(response.data.decode())['message'] ==
+                        'The as_of parameter is not supported by this endpoint, which only reads the current hierarchy')
+
+
+class TestOrgChart(BaseTestCase):
+
+    def get_org_chart(self, path=''):
+        """
+        Helper method to log in a test user, post the single root hierarchy and get the nested hierarchy back
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        response = self.client.get(
+            f'/api/v1/hierarchy/org_chart{path}',
+            headers=headers,
+        )
+        return response, json.loads(response.data.decode())
+
+    def test_org_chart(self):
+        """
+        Test that the whole hierarchy is returned nested, as it was structured when posted
+        """
+        response, res = self.get_org_chart()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(res['status'] == 'success')
+        self.assertEqual(res['version'], 1)
+        self.assertDictEqual(res['employee_hierarchy'], formatted_structure)
+
+    def test_org_chart_of_an_employee(self):
+        """
+        Test that the hierarchy under an employee is returned, with them at the top
+        """
+        response, res = self.get_org_chart('/Nick')
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(res['employee_hierarchy'], {'Nick': {'Pete': {}, 'Barbara': {}}})
+
+    def test_org_chart_cut_at_a_depth(self):
+        """
+        Test that the hierarchy is cut the given number of levels below its top
+        """
+        response, res = self.get_org_chart('?depth=1')
+        self.assertDictEqual(res['employee_hierarchy'], {'Jonas': {'Sophie': {}}})
+        response, res = self.get_org_chart('/Sophie?depth=1')
+        self.assertDictEqual(res['employee_hierarchy'], {'Sophie': {'Nick': {}}})
+        response, res = self.get_org_chart('/Sophie?depth=0')
+        self.assertDictEqual(res['employee_hierarchy'], {'Sophie': {}})
+
+    def test_org_chart_with_invalid_depth_fails(self):
+        """
+        Test that the depth parameter should be a whole number of at least 0
+        """
+        response, res = self.get_org_chart('?depth=deep')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(res['message'] == 'The depth parameter should be a whole number of at least 0')
+
+    def test_org_chart_of_non_existent_employee_fails(self):
+        """
+        Test that the hierarchy under an employee who doesn't exist can't be retrieved
+        """
+        response, res = self.get_org_chart('/pokeman')
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(res['message'] == "The requested employee: 'pokeman' doesn't exist")
+
+    def test_org_chart_as_of_a_version_fails(self):
+        """
+        Test that the nested hierarchy can only be read from the current hierarchy
+        """
+        response, res = self.get_org_chart('?as_of=1')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(res['status'] == 'fail')
+
+    def test_org_chart_of_an_employee_named_like_an_endpoint(self):
+        """
+        Test that the hierarchy under an employee named like another endpoint can be retrieved, and that the other
+        endpoints still answer as before
+        """
+        headers = self.login_and_post_hierarchy({"search": "Nick", "Nick": "Sophie"})
+        response = self.client.get('/api/v1/hierarchy/org_chart/search', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(json.loads(response.data.decode())['employee_hierarchy'], {'search': {}})
+        response = self.client.get('/api/v1/hierarchy/structure', headers=headers)
+        self.assertEqual(response.status_code, 405)
+
+
+class TestDepth(BaseTestCase):
+
+    def get_depth(self, query):
+        """
+        Helper method to log in a test user, post the single root hierarchy and get the depth of an employee
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        response = self.client.get(
+            f'/api/v1/hierarchy/depth/{query}',
+            headers=headers,
+        )
+        return response, json.loads(response.data.decode())
+
+    def test_depth(self):
+        """
+        Test that the number of levels above an employee is returned
+        """
+        response, res = self.get_depth('Nick')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(res['status'] == 'success')
+        self.assertEqual(res['depth'], 2)
+        self.assertNotIn('employees', res)
+
+    def test_employees_levels_below(self):
+        """
+        Test that the employees exactly a number of levels below an employee are returned in the order of the
+        hierarchy
+        """
+        response, res = self.get_depth('Sophie?levels=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(res['depth'], 1)
+        self.assertEqual(res['levels'], 2)
+        self.assertListEqual(res['employees'], ['Pete', 'Barbara'])
+        response, res = self.get_depth('Sophie?levels=4')
+        self.assertListEqual(res['employees'], [])
+
+    def test_depth_with_invalid_levels_fails(self):
+        """
+        Test that the levels parameter should be a positive number
+        """
+        response, res = self.get_depth('Sophie?levels=0')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(res['message'] == 'The levels parameter should be a positive number')
+
+    def test_depth_of_non_existent_employee_fails(self):
+        """
+        Test that the depth of an employee who doesn't exist can't be retrieved
+        """
+        response, res = self.get_depth('pokeman')
+        self.assertEqual(response.status_code, 404)
+
+    def test_depth_as_of_a_version_fails(self):
+        """
+        Test that the depth can only be read from the current hierarchy
+        """
+        response, res = self.get_depth('Nick?as_of=1')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(res['status'] == 'fail')
+
+
+class TestSearch(BaseTestCase):
+
+    def search(self, query):
+        """
+        Helper method to log in a test user, post the single root hierarchy and search the employees by name
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        response = self.client.get(
+            f'/api/v1/hierarchy/search?{query}',
+            headers=headers,
+        )
+        return response, json.loads(response.data.decode())
+
+    def test_search(self):
+        """
+        Test that the employees whose names start with the query are returned with their supervisor
+        """
+        response, res = self.search('q=p')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(res['status'] == 'success')
+        self.assertListEqual(res['results'], [{'name': 'Pete', 'supervisor': 'Nick', 'match': 'prefix'}])
+
+    def test_search_with_typos_and_a_limit(self):
+        """
+        Test that names are found despite typos, and that the number of results can be limited
+        """
+        response, res = self.search('q=Bararba')
+        self.assertListEqual(res['results'], [{'name': 'Barbara', 'supervisor': 'Nick', 'match': 'fuzzy'}])
+        response, res = self.search('q=jonas&limit=1')
+        self.assertListEqual(res['results'], [{'name': 'Jonas', 'supervisor': None, 'match': 'exact'}])
+
+    def test_search_under_an_employee(self):
+        """
+        Test that the search can be limited to the employees someone supervises
+        """
+        response, res = self.search('q=sophie&under=Nick')
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(res['results'], [])
+        response, res = self.search('q=pete&under=pokeman')
+        self.assertEqual(response.status_code, 404)
+
+    def test_search_without_a_query_fails(self):
+        """
+        Test that a search needs a non empty query
+        """
+        response, res = self.search('q=%20')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(res['message'] == 'The q parameter should be a non empty search text')
+
+    def test_search_as_of_a_version_fails(self):
+        """
+        Test that only the current hierarchy can be searched
+        """
+        response, res = self.search('q=p&as_of=1')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(res['status'] == 'fail')
+
+
+class TestCommonManager(BaseTestCase):
+
+    def get_common_manager(self, first_name, second_name):
+        """
+        Helper method to log in a test user, post the single root hierarchy and get the common manager of two employees
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        response = self.client.get(
+            f'/api/v1/hierarchy/common_manager/{first_name}/{second_name}',
+            headers=headers,
+        )
+        return response, json.loads(response.data.decode())
+
+    def test_common_manager(self):
+        """
+        Test that the lowest common manager of two employees and the distance between them are returned
+        """
+        response, res = self.get_common_manager('Pete', 'Barbara')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(res['status'] == 'success')
+        self.assertListEqual(res['employees'], ['Pete', 'Barbara'])
+        self.assertTrue(res['common_manager'] == 'Nick')
+        self.assertEqual(res['distance'], 2)
+
+    def test_common_manager_of_a_supervisor(self):
+        """
+        Test that the common manager of an employee and someone above them is the one above
+        """
+        response, res = self.get_common_manager('Pete', 'Sophie')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(res['common_manager'] == 'Sophie')
+        self.assertEqual(res['distance'], 2)
+
+    def test_common_manager_follows_changes(self):
+        """
+        Test that the common manager is looked up in the hierarchy as changed by later operations
+        """
+        self.get_common_manager('Pete', 'Barbara')
+        result = login_user(self)
+        headers = dict(Authorization="Bearer " + json.loads(result.data.decode())['auth_token'])
+        self.client.put('/api/v1/hierarchy/employees/Barbara', headers=headers,
+                        data=json.dumps({'supervisor': 'Jonas'}), content_type='application/json')
+        response = self.client.get('/api/v1/hierarchy/common_manager/Pete/Barbara', headers=headers)
+        res = json.loads(response.data.decode())
+        self.assertTrue(res['common_manager'] == 'Jonas')
+        self.assertEqual(res['distance'], 4)
+
+    def test_common_manager_of_non_existent_employee_fails(self):
+        """
+        Test that the common manager of an employee who doesn't exist can't be retrieved
+        """
+        response, res = self.get_common_manager('Pete', 'pokeman')
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(res['message'] == "The requested employee: 'pokeman' doesn't exist")
+
+    def test_common_manager_as_of_a_version_fails(self):
+        """
+        Test that the common manager can only be read from the current hierarchy
+        """
+        response, res = self.get_common_manager('Pete', 'Barbara?as_of=1')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(res['status'] == 'fail')
+
+
+class TestManagerStats(BaseTestCase):
+
+    def get_manager_stats(self, query=''):
+        """
+        Helper method to log in a test user, post the single root hierarchy and get the managers with the largest
+        teams
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        response = self.client.get(
+            f'/api/v1/hierarchy/stats/managers{query}',
+            headers=headers,
+        )
+        return response, json.loads(response.data.decode())
+
+    def test_managers_by_total_headcount(self):
+        """
+        Test that the managers are ranked by everyone under them, with their counts and supervisor
+        """
+        response, res = self.get_manager_stats()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(res['status'] == 'success')
+        self.assertTrue(res['by'] == 'total')
+        self.assertListEqual([manager['name'] for manager in res['managers']], ['Jonas', 'Sophie', 'Nick'])
+        self.assertDictEqual(res['managers'][2], {
+            'name': 'Nick',
+            'supervisor': 'Sophie',
+            'headcount': 2,
+            'direct_reports': 2,
+            'depth': 2
+        })
+        self.assertIsNone(res['managers'][0]['supervisor'])
+
+    def test_managers_by_direct_reports(self):
+        """
+        Test that the managers are ranked by their direct reports, ties in the order of the hierarchy
+        """
+        response, res = self.get_manager_stats('?by=direct')
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual([(manager['name'], manager['direct_reports']) for manager in res['managers']],
+                             [('Nick', 2), ('Jonas', 1), ('Sophie', 1)])
+
+    def test_managers_with_filters(self):
+        """
+        Test that the ranked managers are limited and filtered by their count, their supervisor and their depth
+        """
+        response, res = self.get_manager_stats('?limit=1')
+        self.assertListEqual([manager['name'] for manager in res['managers']], ['Jonas'])
+        response, res = self.get_manager_stats('?min=3')
+        self.assertListEqual([manager['name'] for manager in res['managers']], ['Jonas', 'Sophie'])
+        response, res = self.get_manager_stats('?by=direct&min=2')
+        self.assertListEqual([manager['name'] for manager in res['managers']], ['Nick'])
+        response, res = self.get_manager_stats('?under=Sophie')
+        self.assertListEqual([manager['name'] for manager in res['managers']], ['Nick'])
+        response, res = self.get_manager_stats('?depth=1')
+        self.assertListEqual([manager['name'] for manager in res['managers']], ['Sophie'])
+
+    def test_manager_stats_follow_changes(self):
+        """
+        Test that the counts are kept up to date by later operations
+        """
+        self.get_manager_stats()
+        result = login_user(self)
+        headers = dict(Authorization="Bearer " + json.loads(result.data.decode())['auth_token'])
+        self.client.put('/api/v1/hierarchy/employees/Barbara', headers=headers,
+                        data=json.dumps({'supervisor': 'Jonas'}), content_type='application/json')
+        response = self.client.get('/api/v1/hierarchy/stats/managers?by=direct', headers=headers)
+        res = json.loads(response.data.decode())
+        self.assertListEqual([(manager['name'], manager['headcount'], manager['direct_reports'])
+                              for manager in res['managers']], [('Jonas', 4, 2), ('Sophie', 2, 1), ('Nick', 1, 1)])
+
+    def test_manager_stats_with_invalid_parameters_fail(self):
+        """
+        Test that the ranking should be known and the filters valid
+        """
+        response, res = self.get_manager_stats('?by=salary')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(res['message'] == "The by parameter should be one of ['total', 'direct']")
+        response, res = self.get_manager_stats('?depth=-1')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(res['message'] == 'The depth parameter should be a whole number of at least 0')
+        response, res = self.get_manager_stats('?under=pokeman')
+        self.assertEqual(response.status_code, 404)
+
+    def test_manager_stats_as_of_a_version_fails(self):
+        """
+        Test that the manager stats can only be read from the current hierarchy
+        """
+        response, res = self.get_manager_stats('?as_of=1')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(res['status'] == 'fail')
+
+
+class TestConditionalGet(BaseTestCase):
+
+    def test_reads_have_version_validators(self):
+        """
+        Test that the answers of the read endpoints have the ETag and Last-Modified of the hierarchy version
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        response = self.client.get('/api/v1/hierarchy/two_supervisors/Pete', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.headers.get('ETag'))
+        self.assertIsNotNone(response.headers.get('Last-Modified'))
+        other_response = self.client.get('/api/v1/hierarchy/depth/Pete', headers=headers)
+        self.assertEqual(other_response.headers['ETag'], response.headers['ETag'])
+
+    def test_unchanged_hierarchy_is_not_modified(self):
+        """
+        Test that a read sending the ETag or the Last-Modified time of the current version gets a 304 without a body
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        first_response = self.client.get('/api/v1/hierarchy/ancestors/Pete', headers=headers)
+        response = self.client.get('/api/v1/hierarchy/ancestors/Pete', headers=dict(
+            headers, **{'If-None-Match': first_response.headers['ETag']}))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers.get('ETag'), first_response.headers['ETag'])
+        response = self.client.get('/api/v1/hierarchy/ancestors/Pete', headers=dict(
+            headers, **{'If-Modified-Since': first_response.headers['Last-Modified']}))
+        self.assertEqual(response.status_code, 304)
+
+    def test_version_of_the_same_second_is_sent_again(self):
+        """
+        Test that If-Modified-Since, which only has whole seconds, doesn't hide a newer version created in the same
+        second as the one the client has
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        last_modified = self.client.get('/api/v1/hierarchy/ancestors/Pete', headers=headers).headers['Last-Modified']
+        self.client.put('/api/v1/hierarchy/employees/Pete', headers=headers,
+                        data=json.dumps({'supervisor': 'Jonas'}), content_type='application/json')
+        first_version, second_version = HierarchyVersion.query.order_by(HierarchyVersion.version_id).all()
+        second_version.created_at = first_version.created_at.replace(microsecond=999999)
+        db.session.commit()
+        read_cache.clear()
+        response = self.client.get('/api/v1/hierarchy/ancestors/Pete', headers=dict(
+            headers, **{'If-Modified-Since': last_modified}))
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(json.loads(response.data.decode())['ancestors'], ['Jonas'])
+
+    def test_changed_hierarchy_is_sent_again(self):
+        """
+        Test that the ETag changes with every stored version, so older ones get the full answer
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        etag = self.client.get('/api/v1/hierarchy/ancestors/Pete', headers=headers).headers['ETag']
+        self.client.put('/api/v1/hierarchy/employees/Pete', headers=headers,
+                        data=json.dumps({'supervisor': 'Jonas'}), content_type='application/json')
+        response = self.client.get('/api/v1/hierarchy/ancestors/Pete', headers=dict(headers, **{'If-None-Match': etag}))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertListEqual(json.loads(response.data.decode())['ancestors'], ['Jonas'])
+
+    def test_failed_reads_have_no_validators(self):
+        """
+        Test that answers other than 200 OK don't get an ETag
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        response = self.client.get('/api/v1/hierarchy/ancestors/pokeman', headers=headers)
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNone(response.headers.get('ETag'))
+
+
+class TestEmployeeOperations(BaseTestCase):
+
+    def test_unauthenticated_user_fails_to_add_employee(self):
+        """
+        Test that a user who is not authenticated can't add an employee
+        """
+        response = self.client.post(
+            '/api/v1/hierarchy/employees',
+            data=json.dumps({'name': 'Jane', 'supervisor': 'Nick'}),
+            content_type='application/json'
+        )
+        res = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 401)
+        self.assertTrue(res['status'] == 'fail')
+
+    def test_add_employee_is_successful(self):
+        """
+        Test that an employee is added under an existing supervisor
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        response = self.client.post(
+            '/api/v1/hierarchy/employees',
+            headers=headers,
+            data=json.dumps({'name': 'Jane', 'supervisor': 'Nick'}),
+            content_type='application/json'
+        )
+        res = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(res['status'] == 'success')
+        self.assertTrue(res['message'] == "The employee: 'Jane' has been added")
+        response = self.client.get('/api/v1/hierarchy/two_supervisors/Jane', headers=headers)
+        supervisors = {'supervisor': 'Nick', 'supervisor_of_supervisor': 'Sophie'}
+        self.assertDictEqual(json.loads(response.data.decode())['supervisors'], supervisors)
+
+    def test_add_employee_under_non_existent_supervisor_fails(self):
+        """
+        Test that an employee can't be added under a supervisor who doesn't exist
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        response = self.client.post(
+            '/api/v1/hierarchy/employees',
+            headers=headers,
+            data=json.dumps({'name': 'Jane', 'supervisor': 'Dre'}),
+            content_type='application/json'
+        )
+        res = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(res['status'] == 'fail')
+        self.assertTrue(res['message'] == "The supervisor: 'Dre' doesn't exist")
+
+    def test_add_employee_with_non_json_body_fails(self):
+        """
+        Test that the employee to add should be posted as JSON
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        response = self.client.post('/api/v1/hierarchy/employees', headers=headers, data='name=Jane')
+        self.assertEqual(response.status_code, 415)
+
+    def test_move_employee_is_successful(self):
+        """
+        Test that an employee is moved, with everyone they supervise, under another supervisor
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        response = self.client.put(
+            '/api/v1/hierarchy/employees/Nick',
+            headers=headers,
+            data=json.dumps({'supervisor': 'Jonas'}),
+            content_type='application/json'
+        )
+        res = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(res['message'] == "The employee: 'Nick' is now supervised by 'Jonas'")
+        response = self.client.get('/api/v1/hierarchy/two_supervisors/Pete', headers=headers)
+        supervisors = {'supervisor': 'Nick', 'supervisor_of_supervisor': 'Jonas'}
+        self.assertDictEqual(json.loads(response.data.decode())['supervisors'], supervisors)
+
+    def test_move_employee_under_own_subordinate_fails(self):
+        """
+        Test that an employee can't be moved under someone they supervise
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        response = self.client.put(
+            '/api/v1/hierarchy/employees/Sophie',
+            headers=headers,
+            data=json.dumps({'supervisor': 'Pete'}),
+            content_type='application/json'
+        )
+        res = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(res['status'] == 'fail')
+
+    def test_remove_employee_is_successful(self):
+        """
+        Test that a removed employee's subordinates are now supervised by the removed employee's supervisor
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        response = self.client.delete('/api/v1/hierarchy/employees/Nick', headers=headers)
+        res = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(res['message'] == "The employee: 'Nick' has been removed")
+        response = self.client.get('/api/v1/hierarchy/two_supervisors/Barbara', headers=headers)
+        supervisors = {'supervisor': 'Sophie', 'supervisor_of_supervisor': 'Jonas'}
+        self.assertDictEqual(json.loads(response.data.decode())['supervisors'], supervisors)
+
+    def test_batch_operations_are_applied(self):
+        """
+        Test that a batch of operations is applied together
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        operations = [
+            {'action': 'add', 'name': 'Jane', 'supervisor': 'Barbara'},
+            {'action': 'move', 'name': 'Barbara', 'supervisor': 'Jonas'},
+            {'action': 'remove', 'name': 'Pete'}
+        ]
+        response = self.client.post(
+            '/api/v1/hierarchy/employees/batch',
+            headers=headers,
+            data=json.dumps({'operations': operations}),
+            content_type='application/json'
+        )
+        res = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(res['message'] == '3 operations have been applied')
+        self.assertIsNone(Employee.find_first(name='Pete'))
+        response = self.client.get('/api/v1/hierarchy/two_supervisors/Jane', headers=headers)
+        supervisors = {'supervisor': 'Barbara', 'supervisor_of_supervisor': 'Jonas'}
+        self.assertDictEqual(json.loads(response.data.decode())['supervisors'], supervisors)
+
+    def test_failed_batch_operation_changes_nothing(self):
+        """
+        Test that no operation of a batch is applied when one of them fails
+        """
+        headers = self.login_and_post_hierarchy(single_root_json)
+        operations = [
+            {'action': 'add', 'name': 'Jane', 'supervisor': 'Barbara'},
+            {'action': 'fire', 'name': 'Pete'}
+        ]
+        response = self.client.post(
+            '/api/v1/hierarchy/employees/batch',
+            headers=headers,
+            data=json.dumps({'operations': operations}),
+            content_type='application/json'
+        )
+        res = json.loads(response.data.decode())
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(res['message'].startswith('Operation 1:'))
+        self.assertIsNone(Employee.find_first(name='Jane'))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,82 @@
+import datetime
+import json
+import unittest
+import uuid
+from flask import json as flask_json
+from app import app
+from helpers.json_provider import JSON_PROVIDERS, StdlibJSONProvider, configure_json, get_json_provider
+
+payloads = [
+    {'status': 'success', 'supervisors': [{'employee': 'Nick', 'found': True, 'supervisor': 'Sophie',
+                                           'supervisor_of_supervisor': None}]},
+    {'names': ['Jonas', 'Sophie', 'Nick'], 'parents': [-1, 0, 1], 'ratio': 0.1},
+    {'Zoë': {'Ünal': {}}, 'André': {}},
+    {1: 'one', 2: ['two', 2.5, False]},
+    {'created_at': datetime.datetime(2020, 5, 17, 10, 30), 'id': uuid.UUID('49f5a90b0d6749a1ac557cdf3a0a4d7c')},
+    [],
+    'Jonas'
+]
+
+
+class TestJSONProviders(unittest.TestCase):
+
+    def test_get_json_provider(self):
+        self.assertIs(get_json_provider('auto'), next(iter(JSON_PROVIDERS.values())))
+        self.assertIs(get_json_provider('stdlib'), StdlibJSONProvider)
+        with self.assertRaisesRegex(ValueError, 'should be \'auto\' or one of the installed providers'):
+            get_json_provider('simplejson')
+
+    def test_dumps_matches_the_standard_library(self):
+        for provider in JSON_PROVIDERS.values():
+            for payload in payloads:
+                for sort_keys in (False, True):
+                    for ensure_ascii in (False, True):
+                        self.assertEqual(
+                            provider.dumps(payload, sort_keys=sort_keys, ensure_ascii=ensure_ascii),
+                            StdlibJSONProvider.dumps(payload, sort_keys=sort_keys, ensure_ascii=ensure_ascii))
+
+    def test_loads_matches_the_standard_library(self):
+        for provider in JSON_PROVIDERS.values():
+            for payload in payloads[:4]:
+                text = StdlibJSONProvider.dumps(payload, ensure_ascii=False)
+                self.assertEqual(provider.loads(text), json.loads(text))
+                self.assertEqual(provider.loads(text.encode()), json.loads(text))
+            # the standard library extensions are still decoded
+            self.assertEqual(str(provider.loads('[NaN]')), '[nan]')
+            with self.assertRaises(ValueError):
+                provider.loads('{"Pete": "Nick",}')
+
+    def test_dumps_falls_back_for_what_orjson_cannot_encode(self):
+        deep = []
+        for _ in range(300):
+            deep = [deep]
+        for provider in JSON_PROVIDERS.values():
+            self.assertEqual(provider.dumps({'id': 2 ** 70}), '{"id":1180591620717411303424}')
+            self.assertEqual(provider.dumps(deep), '[' * 301 + ']' * 301)
+
+
+class TestConfigureJSON(unittest.TestCase):
+
+    def tearDown(self):
+        configure_json(app)
+
+    def test_configure_json_sets_the_app_encoder_and_decoder(self):
+        for name, provider in JSON_PROVIDERS.items():
+            app.config['JSON_PROVIDER'] = name
+            try:
+                self.assertIs(configure_json(app), provider)
+            finally:
+                app.config['JSON_PROVIDER'] = 'auto'
+            self.assertIs(app.json_encoder, provider.encoder)
+            self.assertIs(app.json_decoder, provider.decoder)
+            with app.app_context():
+                for payload in payloads:
+                    self.assertEqual(flask_json.dumps(payload, indent=2), json.dumps(
+                        payload, indent=2, sort_keys=True, cls=StdlibJSONProvider.encoder))
+                self.assertEqual(flask_json.loads('{"Nick": "Sophie"}'), {'Nick': 'Sophie'})
+                with self.assertRaises(ValueError):
+                    flask_json.loads('{"Nick": }')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import json
+import unittest
+from helpers.json_stream import StreamedObject, iter_json
+
+
+class TestIterJSON(unittest.TestCase):
+
+    def test_iter_json_matches_json_dumps(self):
+        data = {
+            "status": "success",
+            "employee_hierarchy": {"Jonas": {"Sophie": {"Nick": {"Pete": {}, "Barbara": {}}}}},
+            "values": [1, 2.5, None, True, False, [], {}, ["a", {"b": "ü"}]],
+            7: "number key"
+        }
+        expected = json.dumps(data, separators=(',', ':'))
+        self.assertEqual(''.join(iter_json(data)), expected)
+        expected = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+        self.assertEqual(''.join(iter_json(data, ensure_ascii=False)), expected)
+
+    def test_iter_json_sorts_keys(self):
+        data = {"Pete": {}, "Barbara": {"Zed": {}, "Ann": {}}}
+        self.assertEqual(''.join(iter_json(data, sort_keys=True)), '{"Barbara":{"Ann":{},"Zed":{}},"Pete":{}}')
+
+    def test_iter_json_scalars(self):
+        self.assertEqual(''.join(iter_json("Jonas")), '"Jonas"')
+        self.assertEqual(''.join(iter_json(None)), 'null')
+        self.assertEqual(''.join(iter_json([])), '[]')
+
+    def test_iter_json_encodes_generators_as_lists(self):
+        consumed = []
+
+        def items():
+            for i in range(3):
+                consumed.append(i)
+                yield {"employee": i}
+        chunks = iter_json({"items": items(), "empty": iter(())})
+        self.assertListEqual(consumed, [])
+        self.assertEqual(''.join(chunks), '{"items":[{"employee":0},{"employee":1},{"employee":2}],"empty":[]}')
+
+    def test_iter_json_encodes_streamed_objects_in_their_order(self):
+        consumed = []
+
+        def items():
+            for name in ("Pete", "Barbara"):
+                consumed.append(name)
+                yield name, StreamedObject(iter(()))
+        chunks = iter_json({"Nick": StreamedObject(items()), "Anna": {}}, sort_keys=True)
+        self.assertListEqual(consumed, [])
+        self.assertEqual(''.join(chunks), '{"Anna":{},"Nick":{"Pete":{},"Barbara":{}}}')
+
+    def test_iter_json_yields_chunks(self):
+        data = {f"Employee {i}": {} for i in range(1000)}
+        chunks = list(iter_json(data, chunk_size=100))
+        self.assertGreater(len(chunks), 100)
+        self.assertEqual(json.loads(''.join(chunks)), data)
+
+    def test_iter_json_deep_hierarchy(self):
+        depth = 100000
+        hierarchy = {}
+        current = hierarchy
+        for i in range(depth):
+            current[f"E{i}"] = {}
+            current = current[f"E{i}"]
+        encoded = ''.join(iter_json(hierarchy))
+        self.assertTrue(encoded.startswith('{"E0":{"E1":{"E2":'))
+        self.assertTrue(encoded.endswith('{"E99999":{}' + '}' * depth))
+
+
+if __name__ == '__main__':
+    unittest.main()
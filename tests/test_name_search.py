@@ -0,0 +1,102 @@
+import random
+import unittest
+from unittest import mock
+from array import array
+from hierarchy.compact_tree import INDEX_TYPE
+from hierarchy.name_search import EXACT, FUZZY, PREFIX, NameSearchIndex, _prefix_edit_distance
+
+
+def edit_distances(first, second):
+    """
+    Helper to get the Levenshtein distance between the first text and every start of the second one
+    """
+    previous = list(range(len(second) + 1))
+    for row, first_character in enumerate(first, 1):
+        current = [row]
+        for column, second_character in enumerate(second, 1):
+            current.append(min(previous[column] + 1, current[column - 1] + 1,
+                               previous[column - 1] + (first_character != second_character)))
+        previous = current
+    return previous
+
+
+class CountingList(list):
+    """
+    Helper list which counts how many of its items are read
+    """
+    reads = 0
+
+    def __getitem__(self, item):
+        self.reads += 1
+        return super().__getitem__(item)
+
+
+class TestNameSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        # Jonas > (Sophie > (Nick > Pete, Nicole), Anna > (Annabel, Nicky)), in the order of their lft values
+        self.names = ["Jonas", "Sophie", "Nick", "Pete", "Nicole", "Anna", "Annabel", "Nicky"]
+        self.index = NameSearchIndex(self.names, array(INDEX_TYPE, [-1, 0, 1, 2, 1, 0, 5, 5]))
+
+    def search(self, query, limit=10, under=None):
+        under = None if under is None else self.names.index(under)
+        return [(self.names[index], match) for index, match in self.index.search(query, limit, under)]
+
+    def test_prefix_search(self):
+        self.assertListEqual(self.search('nic'), [("Nick", PREFIX), ("Nicky", PREFIX), ("Nicole", PREFIX)])
+        self.assertListEqual(self.search('NIC', limit=2), [("Nick", PREFIX), ("Nicky", PREFIX)])
+
+    def test_exact_match_comes_first(self):
+        self.assertListEqual(self.search('anna'), [("Anna", EXACT), ("Annabel", PREFIX)])
+
+    def test_search_with_typos(self):
+        self.assertListEqual(self.search('Sohpie'), [("Sophie", FUZZY)])
+        self.assertListEqual(self.search('Jnoas'), [("Jonas", FUZZY)])
+        # a typo in the start of a longer name
+        self.assertIn(("Annabel", FUZZY), self.search('Anabe'))
+        self.assertListEqual(self.search('Xavier'), [])
+
+    def test_search_under_an_employee(self):
+        self.assertListEqual(self.search('nic', under='Sophie'), [("Nick", PREFIX), ("Nicole", PREFIX)])
+        self.assertListEqual(self.search('nic', under='Anna'), [("Nicky", PREFIX)])
+        self.assertListEqual(self.search('anna', under='Anna'), [("Annabel", PREFIX)])
+        self.assertListEqual(self.search('nic', under='Pete'), [])
+
+    def test_search_with_typos_under_an_employee(self):
+        self.assertListEqual(self.search('Nikcy', under='Anna'), [("Nicky", FUZZY)])
+        self.assertListEqual(self.search('Nikcy', under='Sophie'), [("Nick", FUZZY), ("Nicole", FUZZY)])
+        self.assertListEqual(self.search('Nikcy', under='Pete'), [])
+
+    def test_search_under_a_small_team_reads_only_the_team(self):
+        # a small team under the CEO, and many more names starting with the query elsewhere in the hierarchy
+        names = ["CEO", "Anna", "Annabel", "Anne"] + [f"Ann {number}" for number in range(1000)]
+        parents = array(INDEX_TYPE, [-1, 0, 1, 1] + [0] * 1000)
+        index = NameSearchIndex(names, parents)
+        index.sorted_keys = CountingList(index.sorted_keys)
+        index.sorted_indexes = CountingList(index.sorted_indexes)
+        results = index.search('ann', 10, under=1)
+        self.assertListEqual([(names[position], match) for position, match in results],
+                             [("Annabel", PREFIX), ("Anne", PREFIX)])
+        # the sorted names are only looked up to find where the names starting with the query are
+        self.assertLess(index.sorted_keys.reads + index.sorted_indexes.reads, 30)
+
+    def test_search_with_typos_reads_the_rarest_trigrams_first(self):
+        # many names share the common trigrams of the query, and only one shares its rare ones
+        names = ["Boss"] + [f"Nina Smith {number}" for number in range(300)] + ["Xylophone Smith"]
+        index = NameSearchIndex(names, array(INDEX_TYPE, [-1] + [0] * (len(names) - 1)))
+        with mock.patch('hierarchy.name_search.MAX_FUZZY_POSTINGS', 50):
+            results = index.search('xylophne smith', 10)
+        self.assertListEqual([names[position] for position, match in results], ["Xylophone Smith"])
+
+    def test_prefix_edit_distance(self):
+        rng = random.Random(20)
+        for _ in range(2000):
+            query = ''.join(rng.choice('ab c') for _ in range(rng.randint(1, 10)))
+            key = ''.join(rng.choice('ab c') for _ in range(rng.randint(0, 14)))
+            limit = rng.randint(0, 3)
+            expected = min(edit_distances(query, key[:len(query) + limit]))
+            self.assertEqual(_prefix_edit_distance(query, key, limit), min(expected, limit + 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+from tests.base_test import BaseTestCase
+from hierarchy.operations import HierarchyOperationError, apply_operations, rebalance, restructure_hierarchy
+from models.employee import Employee
+from models.model_mixin import db
+
+single_root_json = {
+    "Pete": "Nick",
+    "Barbara": "Nick",
+    "Nick": "Sophie",
+    "Sophie": "Jonas"
+}
+
+
+class TestOperations(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        restructure_hierarchy(single_root_json)
+
+    def assert_valid_nested_sets(self):
+        """
+        Helper to check that every employee's interval lies within their supervisor's, that intervals of
+        employees who don't supervise each other don't overlap, and that every employee is one level below their
+        supervisor, with headcounts and direct report counts matching the hierarchy
+        """
+        stored = Employee.stored_hierarchy()
+        by_id = {values['employee_id']: values for values in stored.values()}
+        for values in stored.values():
+            self.assertLess(values['lft'], values['rgt'])
+            supervisor = by_id.get(values['supervisor_id'])
+            if supervisor:
+                self.assertLess(supervisor['lft'], values['lft'])
+                self.assertLess(values['rgt'], supervisor['rgt'])
+                self.assertEqual(values['depth'], supervisor['depth'] + 1)
+            else:
+                self.assertEqual(values['depth'], 0)
+        intervals = sorted((values['lft'], values['rgt']) for values in stored.values())
+        for (lft, rgt), (next_lft, next_rgt) in zip(intervals, intervals[1:]):
+            self.assertTrue(next_rgt < rgt or next_lft > rgt)
+        for values in stored.values():
+            self.assertEqual(values['headcount'], sum(
+                values['lft'] < other['lft'] < values['rgt'] for other in stored.values()))
+            self.assertEqual(values['direct_reports'], sum(
+                other['supervisor_id'] == values['employee_id'] for other in stored.values()))
+        return stored
+
+    def supervisor_of(self, name):
+        stored = Employee.stored_hierarchy()
+        names = {values['employee_id']: employee_name for employee_name, values in stored.items()}
+        return names.get(stored[name]['supervisor_id'])
+
+    def test_add_employee(self):
+        before = Employee.stored_hierarchy()
+        apply_operations([{'action': 'add', 'name': 'Jane', 'supervisor': 'Nick'}])
+        stored = self.assert_valid_nested_sets()
+        self.assertEqual(self.supervisor_of('Jane'), 'Nick')
+        # nobody else was renumbered
+        for name, values in before.items():
+            self.assertEqual((stored[name]['lft'], stored[name]['rgt']), (values['lft'], values['rgt']))
+        # the teams above Jane grew by one
+        self.assertListEqual([stored[name]['headcount'] - before[name]['headcount'] for name in before],
+                             [1 if name in ('Jonas', 'Sophie', 'Nick') else 0 for name in before])
+        self.assertEqual(stored['Nick']['direct_reports'], 3)
+
+    def test_add_existing_employee_fails(self):
+        with self.assertRaises(HierarchyOperationError) as context:
+            apply_operations([{'action': 'add', 'name': 'Pete', 'supervisor': 'Nick'}])
+        self.assertEqual(context.exception.status_code, 409)
+
+    def test_add_employee_without_supervisor_fails(self):
+        with self.assertRaisesRegex(HierarchyOperationError, 'A supervisor is required'):
+            apply_operations([{'action': 'add', 'name': 'Jane', 'supervisor': None}])
+        with self.assertRaisesRegex(HierarchyOperationError, "The supervisor: 'Dre' doesn't exist"):
+            apply_operations([{'action': 'add', 'name': 'Jane', 'supervisor': 'Dre'}])
+
+    def test_add_employees_until_the_gaps_run_out(self):
+        supervisor = 'Pete'
+        for number in range(20):
+            apply_operations([{'action': 'add', 'name': f'E{number}', 'supervisor': supervisor}])
+            supervisor = f'E{number}'
+        self.assert_valid_nested_sets()
+        self.assertEqual(self.supervisor_of('E19'), 'E18')
+
+    def test_move_employee(self):
+        before = Employee.stored_hierarchy()
+        apply_operations([{'action': 'move', 'name': 'Nick', 'supervisor': 'Jonas'}])
+        stored = self.assert_valid_nested_sets()
+        self.assertEqual(self.supervisor_of('Nick'), 'Jonas')
+        self.assertEqual(self.supervisor_of('Pete'), 'Nick')
+        self.assertEqual((stored['Nick']['depth'], stored['Pete']['depth']), (1, 2))
+        # Sophie and Jonas are not renumbered, and only Sophie's team shrinks
+        for name in ('Sophie', 'Jonas'):
+            self.assertEqual((stored[name]['lft'], stored[name]['rgt']), (before[name]['lft'], before[name]['rgt']))
+        self.assertEqual((stored['Sophie']['headcount'], stored['Sophie']['direct_reports']), (0, 0))
+        self.assertEqual((stored['Jonas']['headcount'], stored['Jonas']['direct_reports']), (4, 2))
+
+    def test_move_team_without_room_only_renumbers_the_team_around_it(self):
+        Employee.delete_all_records()
+        restructure_hierarchy(dict(single_root_json, Anna='Jonas', Zed='Anna',
+                                   **{f'E{number}': 'Barbara' for number in range(40)}))
+        before = Employee.stored_hierarchy()
+        # Barbara's team of 41 needs more room than the free room inside Pete's interval
+        apply_operations([{'action': 'move', 'name': 'Barbara', 'supervisor': 'Pete'}])
+        stored = self.assert_valid_nested_sets()
+        self.assertEqual(self.supervisor_of('Barbara'), 'Pete')
+        self.assertEqual(stored['E39']['depth'], 5)
+        # the room is made, and then spread again, inside Sophie's team, and nobody outside it is renumbered
+        for name in ('Jonas', 'Sophie', 'Anna', 'Zed'):
+            self.assertEqual((stored[name]['lft'], stored[name]['rgt']), (before[name]['lft'], before[name]['rgt']))
+
+    def test_move_employee_under_their_subordinate_fails(self):
+        with self.assertRaisesRegex(HierarchyOperationError, "can't be supervised by 'Pete', who they supervise"):
+            apply_operations([{'action': 'move', 'name': 'Sophie', 'supervisor': 'Pete'}])
+
+    def test_remove_employee(self):
+        apply_operations([{'action': 'remove', 'name': 'Nick'}])
+        stored = self.assert_valid_nested_sets()
+        self.assertNotIn('Nick', stored)
+        self.assertEqual(self.supervisor_of('Pete'), 'Sophie')
+        self.assertEqual(self.supervisor_of('Barbara'), 'Sophie')
+
+    def test_remove_top_most_supervisor_fails(self):
+        with self.assertRaisesRegex(HierarchyOperationError, 'is the top most supervisor'):
+            apply_operations([{'action': 'remove', 'name': 'Jonas'}])
+
+    def test_batch_is_applied_all_or_nothing(self):
+        before = Employee.stored_hierarchy()
+        with self.assertRaisesRegex(HierarchyOperationError, "Operation 1: The employee: 'Dre' doesn't exist"):
+            apply_operations([
+                {'action': 'add', 'name': 'Jane', 'supervisor': 'Nick'},
+                {'action': 'remove', 'name': 'Dre'}
+            ])
+        self.assertDictEqual(Employee.stored_hierarchy(), before)
+
+        apply_operations([
+            {'action': 'add', 'name': 'Jane', 'supervisor': 'Nick'},
+            {'action': 'move', 'name': 'Jane', 'supervisor': 'Pete'},
+            {'action': 'remove', 'name': 'Barbara'}
+        ])
+        stored = self.assert_valid_nested_sets()
+        self.assertEqual(self.supervisor_of('Jane'), 'Pete')
+        self.assertNotIn('Barbara', stored)
+
+    def test_rebalance(self):
+        apply_operations([{'action': 'move', 'name': 'Barbara', 'supervisor': 'Jonas'}])
+        rebalance(gap=1)
+        db.session.commit()
+        stored = self.assert_valid_nested_sets()
+        self.assertEqual((stored['Jonas']['lft'], stored['Jonas']['rgt']), (1, 10))
+        self.assertEqual((stored['Barbara']['lft'], stored['Barbara']['rgt']), (8, 9))
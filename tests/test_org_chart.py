@@ -0,0 +1,89 @@
+import json
+import random
+import unittest
+from collections import namedtuple
+from helpers.json_stream import iter_json
+from hierarchy.org_chart import org_chart
+from hierarchy.parse_hierarchy import compile_hierarchy
+
+Row = namedtuple('Row', ['name', 'depth'])
+
+
+def scan(tree, top=None, max_depth=None):
+    """
+    Helper to get the rows a scan of the lft index would return for a compiled hierarchy
+    """
+    rows = [Row(name, depth) for name, depth in tree.depth_rows()]
+    if top is not None:
+        top_index = tree.index(top)
+        rows = [row for row in rows if tree.lft[top_index] <= tree.lft[tree.index(row.name)] < tree.rgt[top_index]]
+    return [row for row in rows if max_depth is None or row.depth <= max_depth]
+
+
+def organize(hierarchy_dict):
+    """
+    Helper to nest a flat {employee: supervisor} hierarchy
+    """
+    subordinates_of = {}
+    for employee, supervisor in hierarchy_dict.items():
+        subordinates_of.setdefault(supervisor, {})[employee] = subordinates_of.setdefault(employee, {})
+    return {name: subordinates for name, subordinates in subordinates_of.items() if name not in hierarchy_dict}
+
+
+def cut(hierarchy, levels):
+    """
+    Helper to cut a nested hierarchy a number of levels below its top
+    """
+    return {name: cut(subordinates, levels - 1) if levels > 0 else {} for name, subordinates in hierarchy.items()}
+
+
+class TestOrgChart(unittest.TestCase):
+
+    def encode(self, chart):
+        return json.loads(''.join(iter_json(chart)))
+
+    def test_org_chart_rebuilds_the_hierarchy(self):
+        generator = random.Random(5)
+        names = [f'E{number}' for number in range(300)]
+        hierarchy_dict = {names[number]: names[generator.randrange(number)] for number in range(1, 300)}
+        organized_hierarchy = organize(hierarchy_dict)
+        tree, _ = compile_hierarchy(hierarchy_dict)
+        self.assertEqual(self.encode(org_chart(scan(tree))), organized_hierarchy)
+        self.assertEqual(''.join(iter_json(org_chart(tree.depth_rows()))),
+                         json.dumps(organized_hierarchy, separators=(',', ':')))
+
+    def test_org_chart_of_a_subtree_cut_at_a_depth(self):
+        hierarchy_dict = {"Pete": "Nick", "Barbara": "Nick", "Nick": "Sophie", "Sophie": "Jonas", "Anna": "Jonas"}
+        organized_hierarchy = organize(hierarchy_dict)
+        tree, _ = compile_hierarchy(hierarchy_dict)
+        sophie = organized_hierarchy['Jonas']['Sophie']
+        self.assertEqual(self.encode(org_chart(scan(tree, 'Sophie'), 1)), {'Sophie': sophie})
+        self.assertEqual(self.encode(org_chart(scan(tree, 'Sophie', 2), 1)), {'Sophie': {'Nick': {}}})
+        self.assertEqual(self.encode(org_chart(scan(tree, max_depth=1))), cut(organized_hierarchy, 1))
+        self.assertEqual(self.encode(org_chart(scan(tree, max_depth=0))), {'Jonas': {}})
+        self.assertEqual(self.encode(org_chart([])), {})
+
+    def test_org_chart_reads_the_rows_as_it_is_encoded(self):
+        tree, _ = compile_hierarchy({"Nick": "Sophie", "Sophie": "Jonas"})
+        read = []
+
+        def rows():
+            for row in scan(tree):
+                read.append(row.name)
+                yield row
+        chunks = iter_json(org_chart(rows()), chunk_size=1)
+        self.assertListEqual(read, ['Jonas'])
+        self.assertEqual(next(chunks), '{')
+        self.assertEqual(''.join(chunks), '"Jonas":{"Sophie":{"Nick":{}}}}')
+        self.assertListEqual(read, ['Jonas', 'Sophie', 'Nick'])
+
+    def test_org_chart_deep_hierarchy(self):
+        depth = 100000
+        rows = (Row(f'E{number}', number) for number in range(depth))
+        encoded = ''.join(iter_json(org_chart(rows)))
+        self.assertTrue(encoded.startswith('{"E0":{"E1":{"E2":'))
+        self.assertTrue(encoded.endswith('{"E99999":{}' + '}' * depth))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
-from hierarchy.parse_hierarchy import construct_hierarchy_tree, do_mptt_traversal, organize_hierarchy
+from hierarchy.parse_hierarchy import compile_hierarchy, construct_hierarchy_tree, organize_hierarchy, \
+    sequential_id_factory
 
 
 class TestOrganizeHierarchy(unittest.TestCase):
@@ -93,50 +94,109 @@ class TestConstructHierarchyTree(unittest.TestCase):
         root_employee = construct_hierarchy_tree(hierarchy)
         self.assertIsNone(root_employee)
 
-
-class TestDoMPTTtraversal(unittest.TestCase):
-
-    def test_do_mptt_traversal_with_multiple_children(self):
+    def test_construct_hierarchy_tree_with_wide_branches(self):
         hierarchy = {
             "Jonas": {
                 "Sophie": {
-                    "Nick": {
-                        "Pete": {},
-                        "Barbara": {}
-                    }
+                    "Pete": {}
+                },
+                "Nick": {
+                    "Barbara": {}
                 }
             }
         }
-        mppt_dict = do_mptt_traversal(hierarchy)
-        self.assertListEqual(list(mppt_dict.keys()), ["Jonas", "Sophie", "Nick", "Pete", "Barbara"])
-        self.assertIsNone(mppt_dict["Jonas"]["supervisor_id"])
-        self.assertEqual(mppt_dict["Jonas"]["lft"], 1)
-        self.assertEqual(mppt_dict["Jonas"]["rgt"], 10)
-        self.assertEqual(mppt_dict['Sophie']['lft'], 2)
-        self.assertEqual(mppt_dict['Sophie']['rgt'], 9)
-        self.assertEqual(mppt_dict['Barbara']['lft'], 6)
-        self.assertEqual(mppt_dict['Barbara']['rgt'], 7)
-
-    def test_do_mptt_traversal_with_one_child(self):
-        hierarchy = {"Peter": {"Ham": {}}}
-        mppt_dict = do_mptt_traversal(hierarchy)
-        self.assertListEqual(list(mppt_dict.keys()), ["Peter", "Ham"])
-        self.assertIsNone(mppt_dict["Peter"]["supervisor_id"])
-        self.assertEqual(mppt_dict["Peter"]["lft"], 1)
-        self.assertEqual(mppt_dict["Peter"]["rgt"], 4)
-        self.assertEqual(mppt_dict['Ham']['lft'], 2)
-        self.assertEqual(mppt_dict['Ham']['rgt'], 3)
-
-    def test_do_mptt_traversal_with_no_child(self):
-        hierarchy = {"Tender": {}}
-        mppt_dict = do_mptt_traversal(hierarchy)
-        print(mppt_dict)
-        self.assertListEqual(list(mppt_dict.keys()), ["Tender"])
-        self.assertIsNone(mppt_dict["Tender"]["supervisor_id"])
-        self.assertEqual(mppt_dict["Tender"]["lft"], 1)
-        self.assertEqual(mppt_dict["Tender"]["rgt"], 2)
+        root_employee = construct_hierarchy_tree(hierarchy)
+        sophie, nick = root_employee.subordinates
+        self.assertEqual(sophie.subordinates[0].name, "Pete")
+        self.assertEqual(nick.subordinates[0].name, "Barbara")
+        self.assertEqual(nick.subordinates[0].supervisor, nick)
+
+
+class TestCompileHierarchy(unittest.TestCase):
+
+    def values(self, tree, ids, name):
+        """
+        Helper to get the mptt values of an employee of a compiled hierarchy
+        """
+        index = tree.index(name)
+        parent = tree.parents[index]
+        return {
+            'id': ids[index],
+            'supervisor_id': ids[parent] if parent >= 0 else None,
+            'lft': tree.lft[index],
+            'rgt': tree.rgt[index],
+            'depth': tree.depths[index],
+            'headcount': tree.headcounts[index],
+            'direct_reports': tree.direct_reports(index)
+        }
 
-    def test_construct_hierarchy_tree_with_no_employee(self):
-        hierarchy = {}
-        mppt_dict = do_mptt_traversal(hierarchy)
-        self.assertDictEqual(mppt_dict, {})
+    def test_compile_hierarchy_single_root(self):
+        entry = {
+            "Pete": "Nick",
+            "Barbara": "Nick",
+            "Nick": "Sophie",
+            "Sophie": "Jonas",
+        }
+        tree, ids = compile_hierarchy(entry)
+        self.assertListEqual(list(tree.depth_rows()),
+                             [("Jonas", 0), ("Sophie", 1), ("Nick", 2), ("Pete", 3), ("Barbara", 3)])
+        jonas, sophie, nick, pete, barbara = (
+            self.values(tree, ids, name) for name in ("Jonas", "Sophie", "Nick", "Pete", "Barbara"))
+        self.assertIsNone(jonas["supervisor_id"])
+        self.assertEqual(nick["supervisor_id"], sophie["id"])
+        self.assertEqual(barbara["supervisor_id"], nick["id"])
+        self.assertEqual((jonas["lft"], jonas["rgt"]), (1, 10))
+        self.assertEqual((sophie["lft"], sophie["rgt"]), (2, 9))
+        self.assertEqual((pete["lft"], pete["rgt"]), (4, 5))
+        self.assertEqual((barbara["lft"], barbara["rgt"]), (6, 7))
+        self.assertListEqual([values['headcount'] for values in (jonas, sophie, nick, pete, barbara)], [4, 3, 2, 0, 0])
+        self.assertListEqual([values['direct_reports'] for values in (jonas, sophie, nick, pete, barbara)],
+                             [1, 1, 2, 0, 0])
+
+    def test_compile_hierarchy_with_a_gap(self):
+        tree, ids = compile_hierarchy({"Ham": "Peter", "Jam": "Peter"}, gap=64)
+        self.assertListEqual(list(tree.lft), [64, 128, 256])
+        self.assertListEqual(list(tree.rgt), [384, 192, 320])
+        self.assertListEqual(list(tree.headcounts), [2, 0, 0])
+
+    def test_compile_hierarchy_multiple_roots(self):
+        entry = {
+            "Pete": "Nick",
+            "Nick": "Sophie",
+            "Jane": "Reenah",
+        }
+        tree, ids = compile_hierarchy(entry)
+        self.assertListEqual([tree.names[root] for root in tree.roots], ["Sophie", "Reenah"])
+        self.assertIsNone(self.values(tree, ids, "Reenah")["supervisor_id"])
+
+    def test_compile_hierarchy_assigns_one_id_per_employee(self):
+        calls = []
+
+        def id_factory(name):
+            calls.append(name)
+            return len(calls)
+        tree, ids = compile_hierarchy({"Ham": "Peter", "Jam": "Peter"}, id_factory)
+        self.assertListEqual(calls, ["Peter", "Ham", "Jam"])
+        self.assertEqual(self.values(tree, ids, "Jam")["id"], 3)
+        self.assertEqual(self.values(tree, ids, "Jam")["supervisor_id"], 1)
+
+    def test_compile_hierarchy_with_sequential_ids(self):
+        tree, ids = compile_hierarchy({"Ham": "Peter", "Jam": "Ham"}, sequential_id_factory(41))
+        self.assertListEqual([ids[index] for index in tree.preorder()], [41, 42, 43])
+        self.assertListEqual([self.values(tree, ids, name)['supervisor_id'] for name in ("Peter", "Ham", "Jam")],
+                             [None, 41, 42])
+
+    def test_compile_hierarchy_deep_chain(self):
+        depth = 100000
+        entry = {f"E{i}": f"E{i - 1}" for i in range(1, depth)}
+        tree, ids = compile_hierarchy(entry)
+        self.assertListEqual([tree.names[root] for root in tree.roots], ["E0"])
+        self.assertEqual(tree.rgt[tree.index("E0")], depth * 2)
+        self.assertEqual(tree.lft[tree.index(f"E{depth - 1}")], depth)
+        self.assertEqual(tree.depths[tree.index(f"E{depth - 1}")], depth - 1)
+        self.assertEqual(tree.headcounts[tree.index("E0")], depth - 1)
+
+    def test_compile_hierarchy_empty_dict(self):
+        tree, ids = compile_hierarchy({})
+        self.assertEqual(len(tree), 0)
+        self.assertListEqual(ids, [])
@@ -0,0 +1,148 @@
+import threading
+import time
+from unittest import mock
+from sqlalchemy import event
+from tests.base_test import BaseTestCase
+from hierarchy.ancestors import AncestorIndex
+from hierarchy.operations import apply_operations, restructure_hierarchy
+from hierarchy.read_cache import read_cache, warm_read_cache
+from hierarchy.storage import get_storage
+from hierarchy.versions import latest_version, record_version
+from models.employee import Employee
+from models.model_mixin import db
+
+single_root_json = {
+    "Pete": "Nick",
+    "Barbara": "Nick",
+    "Nick": "Sophie",
+    "Sophie": "Jonas"
+}
+
+
+class TestReadCache(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        restructure_hierarchy(single_root_json)
+
+    def count_queries(self, function):
+        """
+        Helper to count the statements run against the database while calling a function
+        """
+        statements = []
+
+        def before_cursor_execute(*args):
+            statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            function()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        return len(statements)
+
+    def test_lookups_dont_touch_the_database(self):
+        # the upload swapped the hierarchy in
+        self.assertEqual(read_cache.stats()['employees'], 5)
+        hits = read_cache.hits
+        self.assertEqual(self.count_queries(read_cache.ancestor_index), 0)
+        self.assertEqual(read_cache.hits, hits + 1)
+
+    def test_writes_swap_the_cache(self):
+        swaps = read_cache.swaps
+        apply_operations([{'action': 'move', 'name': 'Pete', 'supervisor': 'Jonas'}])
+        self.assertEqual(read_cache.swaps, swaps + 1)
+        ancestor_index = read_cache.ancestor_index()
+        self.assertListEqual(ancestor_index.chain(ancestor_index.index('Pete')), ['Jonas'])
+
+    def test_writes_dont_wait_for_the_cache(self):
+        loaded = AncestorIndex.from_stored
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_from_stored():
+            started.set()
+            release.wait(5)
+            return loaded()
+        swaps = read_cache.swaps
+        self.app.config['RUN_MAINTENANCE_IN_BACKGROUND'] = True
+        self.app.config['HIERARCHY_CACHE_TTL'] = 0
+        try:
+            with mock.patch('hierarchy.read_cache.AncestorIndex.from_stored', side_effect=slow_from_stored):
+                apply_operations([{'action': 'add', 'name': 'Jane', 'supervisor': 'Pete'}])
+                started.wait(5)
+                apply_operations([{'action': 'add', 'name': 'Zed', 'supervisor': 'Pete'}])
+                # the writes returned while the index is rebuilt, and their changes are read until it is swapped in
+                self.assertTrue(read_cache.pending())
+                self.assertEqual(read_cache.version(), tuple(latest_version()))
+                self.assertListEqual(get_storage().ancestors('Zed', 2), ['Pete', 'Nick'])
+                self.assertEqual(get_storage().ancestor_at('Jane', 4), (True, 'Jonas'))
+                release.set()
+                deadline = time.monotonic() + 5
+                while read_cache.swaps < swaps + 2 and time.monotonic() < deadline:
+                    time.sleep(0.01)
+        finally:
+            self.app.config['RUN_MAINTENANCE_IN_BACKGROUND'] = False
+            self.app.config['HIERARCHY_CACHE_TTL'] = 1
+        # the second write was picked up by one more refresh after the running one
+        self.assertEqual(read_cache.swaps, swaps + 2)
+        self.assertFalse(read_cache.pending())
+        ancestor_index = read_cache.ancestor_index()
+        self.assertListEqual(ancestor_index.chain(ancestor_index.index('Zed')), ['Pete', 'Nick', 'Sophie', 'Jonas'])
+
+    def test_lookups_of_the_index_wait_for_the_swap(self):
+        loaded = AncestorIndex.from_stored
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_from_stored():
+            started.set()
+            release.wait(5)
+            return loaded()
+        self.app.config['RUN_MAINTENANCE_IN_BACKGROUND'] = True
+        try:
+            with mock.patch('hierarchy.read_cache.AncestorIndex.from_stored', side_effect=slow_from_stored):
+                apply_operations([{'action': 'add', 'name': 'Jane', 'supervisor': 'Pete'}])
+                started.wait(5)
+                threading.Timer(0.1, release.set).start()
+                ancestor_index = read_cache.ancestor_index()
+        finally:
+            self.app.config['RUN_MAINTENANCE_IN_BACKGROUND'] = False
+        self.assertTrue(release.is_set())
+        self.assertListEqual(ancestor_index.chain(ancestor_index.index('Jane'), 1), ['Pete'])
+
+    def test_writes_build_the_name_search_index(self):
+        apply_operations([{'action': 'add', 'name': 'Jane', 'supervisor': 'Pete'}])
+        ancestor_index = read_cache.ancestor_index()
+        # the index was built before the swap, so the search doesn't build it
+        with mock.patch('hierarchy.ancestors.NameSearchIndex') as name_search_index:
+            self.assertEqual(ancestor_index.name_search().search('jane', 1)[0][1], 'exact')
+        name_search_index.assert_not_called()
+
+    def test_empty_cache_is_loaded_on_a_miss(self):
+        read_cache.clear()
+        misses = read_cache.misses
+        ancestor_index = read_cache.ancestor_index()
+        self.assertEqual(read_cache.misses, misses + 1)
+        self.assertEqual(len(ancestor_index), 5)
+
+    def test_newer_version_of_another_process_is_loaded_after_the_ttl(self):
+        # another process moves Pete and records a version without touching this process' cache
+        pete = Employee.find_first(name='Pete')
+        pete.supervisor_id = Employee.find_first(name='Sophie').employee_id
+        record_version([pete.employee_id], "move 'Pete'")
+        db.session.commit()
+
+        ancestor_index = read_cache.ancestor_index()
+        self.assertListEqual(ancestor_index.chain(ancestor_index.index('Pete')), ['Nick', 'Sophie', 'Jonas'])
+        self.app.config['HIERARCHY_CACHE_TTL'] = 0.000001
+        try:
+            ancestor_index = read_cache.ancestor_index()
+        finally:
+            self.app.config['HIERARCHY_CACHE_TTL'] = 1
+        self.assertListEqual(ancestor_index.chain(ancestor_index.index('Pete')), ['Sophie', 'Jonas'])
+
+    def test_warm_read_cache(self):
+        read_cache.clear()
+        warm_read_cache()
+        self.assertEqual(read_cache.stats()['employees'], 5)
+        self.assertIsNotNone(read_cache.stats()['version'])
@@ -0,0 +1,171 @@
+import random
+import unittest
+from benchmarks.org_generator import generate_org
+from hierarchy.parse_hierarchy import compile_hierarchy, sequential_id_factory
+from hierarchy.restructure import fit_into_stored_intervals, needs_rebuild, plan_restructure, reuse_stored_ids
+from models.employee import Employee
+
+
+def stored_from(tree, ids):
+    """
+    Helper to turn a compiled hierarchy into stored employee values
+    """
+    return {row.pop('name'): row for row in Employee.hierarchy_rows(tree, ids)}
+
+
+class TestReuseStoredIds(unittest.TestCase):
+
+    def test_reuse_stored_ids(self):
+        stored = {"Jonas": {'employee_id': 5, 'supervisor_id': None, 'lft': 1, 'rgt': 2}}
+        id_factory = reuse_stored_ids(stored, sequential_id_factory(10))
+        self.assertEqual(id_factory("Jonas"), 5)
+        self.assertEqual(id_factory("Sophie"), 10)
+        self.assertEqual(id_factory("Nick"), 11)
+
+
+class TestPlanRestructure(unittest.TestCase):
+
+    def setUp(self):
+        self.stored = stored_from(*compile_hierarchy({
+            "Pete": "Nick",
+            "Barbara": "Nick",
+            "Nick": "Sophie",
+            "Sophie": "Jonas"
+        }, sequential_id_factory(1)))
+
+    def plan(self, hierarchy_dict):
+        tree, ids = compile_hierarchy(hierarchy_dict, reuse_stored_ids(self.stored, sequential_id_factory(100)))
+        return plan_restructure(self.stored, tree, Employee.hierarchy_rows(tree, ids))
+
+    def test_plan_restructure_unchanged_hierarchy(self):
+        plan = self.plan({"Pete": "Nick", "Barbara": "Nick", "Nick": "Sophie", "Sophie": "Jonas"})
+        self.assertDictEqual(plan, {'inserts': [], 'updates': [], 'deletes': []})
+
+    def test_plan_restructure_changes(self):
+        # Pete leaves, Barbara now reports to Sophie and Jane joins under Barbara
+        plan = self.plan({"Barbara": "Sophie", "Nick": "Sophie", "Sophie": "Jonas", "Jane": "Barbara"})
+        self.assertListEqual(plan['deletes'], [self.stored['Pete']['employee_id']])
+        self.assertListEqual(plan['inserts'], [{
+            'employee_id': 100,
+            'name': 'Jane',
+            'supervisor_id': self.stored['Barbara']['employee_id'],
+            'lft': 4,
+            'rgt': 5,
+            'depth': 3,
+            'headcount': 0,
+            'direct_reports': 0
+        }])
+        updated = {row['employee_id']: row for row in plan['updates']}
+        barbara = updated[self.stored['Barbara']['employee_id']]
+        self.assertEqual(barbara['supervisor_id'], self.stored['Sophie']['employee_id'])
+        self.assertNotIn('name', barbara)
+        # Jonas keeps their lft, rgt and headcount, so they are not updated
+        self.assertNotIn(self.stored['Jonas']['employee_id'], updated)
+        # Sophie keeps their lft and rgt, but now has Barbara reporting to them too
+        sophie = updated[self.stored['Sophie']['employee_id']]
+        self.assertEqual((sophie['lft'], sophie['rgt']), (self.stored['Sophie']['lft'], self.stored['Sophie']['rgt']))
+        self.assertEqual((sophie['headcount'], sophie['direct_reports']), (3, 2))
+
+    def test_plan_restructure_from_empty_table(self):
+        tree, ids = compile_hierarchy({"Ham": "Peter"})
+        plan = plan_restructure({}, tree, Employee.hierarchy_rows(tree, ids))
+        self.assertEqual(len(plan['inserts']), 2)
+        self.assertListEqual(plan['updates'], [])
+        self.assertListEqual(plan['deletes'], [])
+
+
+class TestFitIntoStoredIntervals(unittest.TestCase):
+
+    def setUp(self):
+        self.hierarchy_dict = generate_org('random', 2000, seed=3)
+        self.stored = stored_from(*compile_hierarchy(self.hierarchy_dict, sequential_id_factory(1), gap=64))
+
+    def plan(self, hierarchy_dict):
+        tree, ids = compile_hierarchy(hierarchy_dict, reuse_stored_ids(self.stored, sequential_id_factory(5000)), 64)
+        kept = fit_into_stored_intervals(self.stored, tree, ids, 64)
+        self.assertNestedSets(tree)
+        return kept, plan_restructure(self.stored, tree, Employee.hierarchy_rows(tree, ids))
+
+    def assertNestedSets(self, tree):
+        """
+        Helper to check that every employee's interval is inside their supervisor's and apart from their fellow
+        subordinates'
+        """
+        for index in tree.preorder():
+            self.assertLess(tree.lft[index], tree.rgt[index])
+            previous_rgt = tree.lft[index]
+            for subordinate in sorted(tree.subordinates(index), key=lambda subordinate: tree.lft[subordinate]):
+                self.assertLess(previous_rgt, tree.lft[subordinate])
+                previous_rgt = tree.rgt[subordinate]
+            self.assertLess(previous_rgt, tree.rgt[index])
+
+    def test_reordered_hierarchy_writes_nothing(self):
+        reordered = dict(sorted(self.hierarchy_dict.items(), reverse=True))
+        kept, plan = self.plan(reordered)
+        self.assertTrue(kept)
+        self.assertDictEqual(plan, {'inserts': [], 'updates': [], 'deletes': []})
+
+    def test_one_new_employee_only_writes_the_supervisors_above(self):
+        supervisor = max(self.stored, key=lambda name: self.stored[name]['depth'])
+        kept, plan = self.plan(dict(self.hierarchy_dict, Jane=supervisor))
+        self.assertTrue(kept)
+        self.assertEqual(len(plan['inserts']), 1)
+        self.assertEqual(plan['inserts'][0]['depth'], self.stored[supervisor]['depth'] + 1)
+        # the supervisor and everyone above them have one more employee under them, nobody else changes
+        self.assertEqual(len(plan['updates']), self.stored[supervisor]['depth'] + 1)
+        self.assertTrue(all(set(row) == {'employee_id', 'supervisor_id', 'lft', 'rgt', 'depth', 'headcount',
+                                         'direct_reports'} for row in plan['updates']))
+        self.assertListEqual(plan['deletes'], [])
+
+    def test_moved_employee_only_writes_their_team_and_the_supervisors_above(self):
+        leaves = sorted(name for name, values in self.stored.items() if values['headcount'] == 0)
+        moved, supervisor = leaves[0], leaves[-1]
+        kept, plan = self.plan(dict(self.hierarchy_dict, **{moved: supervisor}))
+        self.assertTrue(kept)
+        updated = {row['employee_id'] for row in plan['updates']}
+        self.assertIn(self.stored[moved]['employee_id'], updated)
+        self.assertLessEqual(len(updated), 1 + self.stored[moved]['depth'] + self.stored[supervisor]['depth'] + 1)
+
+    def test_many_changes_keep_valid_intervals(self):
+        generator = random.Random(7)
+        hierarchy_dict = dict(self.hierarchy_dict)
+        names = sorted(hierarchy_dict)
+        for name in generator.sample(names, 30):
+            # only leaves are removed, so nobody is left without a supervisor
+            if name not in hierarchy_dict.values():
+                del hierarchy_dict[name]
+        remaining = sorted(set(hierarchy_dict) | set(hierarchy_dict.values()))
+        for number in range(200):
+            # a crowd of new hires under a few supervisors takes more room than is free in their intervals
+            hierarchy_dict[f'New {number}'] = remaining[number % 3]
+        kept, plan = self.plan(hierarchy_dict)
+        self.assertTrue(kept)
+        self.assertEqual(len(plan['inserts']), 200)
+        self.assertLess(len(plan['updates']), len(self.stored) // 2)
+
+    def test_hierarchy_without_room_grows_the_top_most_interval(self):
+        stored = stored_from(*compile_hierarchy({"Ham": "Peter"}, sequential_id_factory(1)))
+        tree, ids = compile_hierarchy({"Ham": "Peter", "Jam": "Ham"},
+                                      reuse_stored_ids(stored, sequential_id_factory(9)))
+        self.assertTrue(fit_into_stored_intervals(stored, tree, ids, 1))
+        self.assertListEqual(list(tree.lft), [1, 2, 3])
+        self.assertListEqual(list(tree.rgt), [6, 5, 4])
+
+    def test_new_top_most_supervisor_keeps_the_compiled_values(self):
+        tree, ids = compile_hierarchy(dict(self.hierarchy_dict, **{'Employee 0000000': 'Owner'}),
+                                      reuse_stored_ids(self.stored, sequential_id_factory(5000)), 64)
+        self.assertFalse(fit_into_stored_intervals(self.stored, tree, ids, 64))
+        self.assertEqual(tree.lft[tree.index('Owner')], 64)
+
+
+class TestNeedsRebuild(unittest.TestCase):
+
+    def test_needs_rebuild(self):
+        plan = {'inserts': [{}], 'updates': [{}, {}], 'deletes': []}
+        self.assertTrue(needs_rebuild(plan, 4, 5, 0.5))
+        self.assertFalse(needs_rebuild(plan, 10, 11, 0.5))
+        self.assertFalse(needs_rebuild({'inserts': [], 'updates': [], 'deletes': []}, 0, 0, 0.5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import json
+from unittest import mock
+from tests.base_test import BaseTestCase
+from hierarchy.operations import apply_operations, restructure_hierarchy
+from hierarchy.storage import get_storage, PATH_SEPARATOR, STORAGE_STRATEGIES
+from models.employee import Employee
+from models.hierarchy_storage import EmployeeClosure, EmployeePath
+from models.model_mixin import db
+
+single_root_json = {
+    "Pete": "Nick",
+    "Barbara": "Nick",
+    "Nick": "Sophie",
+    "Sophie": "Jonas"
+}
+
+
+class StorageTestMixin:
+    """
+    The tests every storage strategy should pass. Each subclass selects a strategy
+    """
+    strategy = None
+
+    def setUp(self):
+        super().setUp()
+        self.default_strategy = self.app.config['HIERARCHY_STORAGE']
+        self.app.config['HIERARCHY_STORAGE'] = self.strategy
+        restructure_hierarchy(single_root_json)
+        self.storage = get_storage()
+
+    def tearDown(self):
+        self.app.config['HIERARCHY_STORAGE'] = self.default_strategy
+        super().tearDown()
+
+    def test_storage_is_selected_by_config(self):
+        self.assertIsInstance(self.storage, STORAGE_STRATEGIES[self.strategy])
+
+    def test_ancestors(self):
+        self.assertListEqual(self.storage.ancestors('Pete'), ['Nick', 'Sophie', 'Jonas'])
+        self.assertListEqual(self.storage.ancestors('Pete', 2), ['Nick', 'Sophie'])
+        self.assertListEqual(self.storage.ancestors('Jonas'), [])
+        self.assertIsNone(self.storage.ancestors('Reenah'))
+
+    def test_descendants(self):
+        self.assertListEqual(self.storage.descendants('Sophie'), ['Nick', 'Pete', 'Barbara'])
+        self.assertListEqual(self.storage.descendants('Pete'), [])
+        self.assertIsNone(self.storage.descendants('Reenah'))
+
+    def test_ancestor_at(self):
+        self.assertTupleEqual(self.storage.ancestor_at('Pete', 2), (True, 'Sophie'))
+        self.assertTupleEqual(self.storage.ancestor_at('Pete', 4), (True, None))
+        self.assertTupleEqual(self.storage.ancestor_at('Reenah', 1), (False, None))
+
+    def test_two_supervisors(self):
+        self.assertDictEqual(self.storage.two_supervisors(['Pete', 'Sophie', 'Jonas', 'Reenah']), {
+            'Pete': ('Nick', 'Sophie'),
+            'Sophie': ('Jonas', None),
+            'Jonas': (None, None)
+        })
+
+    def test_descendants_page(self):
+        sophie = self.storage.employee('Sophie')
+        page = self.storage.descendants_page(sophie, sophie.lft, 2)
+        self.assertListEqual([(name, supervisor) for _, name, supervisor in page],
+                             [('Nick', 'Sophie'), ('Pete', 'Nick')])
+        page = self.storage.descendants_page(sophie, page[-1].lft, 2)
+        self.assertListEqual([(name, supervisor) for _, name, supervisor in page], [('Barbara', 'Nick')])
+        self.assertIsNone(self.storage.employee('Reenah'))
+
+    def test_subtree_scan(self):
+        self.assertListEqual([tuple(row) for row in self.storage.subtree_scan()],
+                             [('Jonas', 0), ('Sophie', 1), ('Nick', 2), ('Pete', 3), ('Barbara', 3)])
+        self.assertListEqual([tuple(row) for row in self.storage.subtree_scan(self.storage.employee('Sophie'), 2)],
+                             [('Sophie', 1), ('Nick', 2)])
+
+    def test_level_below(self):
+        jonas = self.storage.employee('Jonas')
+        self.assertListEqual(self.storage.level_below(jonas, 3), ['Pete', 'Barbara'])
+        self.assertListEqual(self.storage.level_below(jonas, 4), [])
+
+    def test_top_managers(self):
+        managers = self.storage.top_managers('direct', 2, supervisor=self.storage.employee('Jonas'))
+        self.assertListEqual([(manager.name, manager.direct_reports) for manager in managers],
+                             [('Nick', 2), ('Sophie', 1)])
+
+    def test_views_read_through_the_strategy(self):
+        headers = self.login_and_post_hierarchy(single_root_json)
+        strategy = type(self.storage)
+        with mock.patch.object(strategy, 'level_below', autospec=True, side_effect=strategy.level_below) as level_below:
+            response = self.client.get('/api/v1/hierarchy/depth/Jonas?levels=3', headers=headers)
+        level_below.assert_called_once()
+        self.assertListEqual(json.loads(response.data.decode())['employees'], ['Pete', 'Barbara'])
+        response = self.client.get('/api/v1/hierarchy/descendants/Sophie', headers=headers)
+        self.assertListEqual([json.loads(line)['name'] for line in response.data.decode().splitlines()],
+                             ['Nick', 'Pete', 'Barbara'])
+        response = self.client.get('/api/v1/hierarchy/org_chart/Sophie?depth=1', headers=headers)
+        self.assertDictEqual(json.loads(response.data.decode())['employee_hierarchy'], {'Sophie': {'Nick': {}}})
+
+    def test_reads_follow_changes(self):
+        apply_operations([
+            {'action': 'add', 'name': 'Jane', 'supervisor': 'Barbara'},
+            {'action': 'move', 'name': 'Barbara', 'supervisor': 'Jonas'}
+        ])
+        self.assertListEqual(self.storage.ancestors('Jane'), ['Barbara', 'Jonas'])
+        self.assertListEqual(self.storage.descendants('Sophie'), ['Nick', 'Pete'])
+
+        restructure_hierarchy({"Pete": "Sophie", "Sophie": "Jonas"})
+        self.assertListEqual(self.storage.ancestors('Pete'), ['Sophie', 'Jonas'])
+        self.assertIsNone(self.storage.ancestors('Jane'))
+
+
+class TestAncestorIndexStorage(StorageTestMixin, BaseTestCase):
+    strategy = 'ancestor_index'
+
+
+class TestNestedSetStorage(StorageTestMixin, BaseTestCase):
+    strategy = 'nested_set'
+
+
+class TestClosureTableStorage(StorageTestMixin, BaseTestCase):
+    strategy = 'closure_table'
+
+    def test_sync_only_rewrites_the_moved_team(self):
+        pete_id = Employee.find_first(name='Pete').employee_id
+        # a marker row for Pete, who is outside the moved team, which a rewrite would drop
+        EmployeeClosure.bulk_insert([{'descendant_id': pete_id, 'depth': 9, 'ancestor_id': pete_id}])
+        db.session.commit()
+        apply_operations([{'action': 'add', 'name': 'Jane', 'supervisor': 'Barbara'},
+                          {'action': 'move', 'name': 'Barbara', 'supervisor': 'Jonas'}])
+        self.assertEqual(EmployeeClosure.query.filter_by(descendant_id=pete_id, depth=9).count(), 1)
+        self.assertListEqual(self.storage.ancestors('Jane'), ['Barbara', 'Jonas'])
+
+        apply_operations([{'action': 'remove', 'name': 'Nick'}])
+        self.assertEqual(EmployeeClosure.query.filter_by(descendant_id=pete_id, depth=9).count(), 0)
+        self.assertListEqual(self.storage.ancestors('Pete'), ['Sophie', 'Jonas'])
+
+
+class TestMaterializedPathStorage(StorageTestMixin, BaseTestCase):
+    strategy = 'materialized_path'
+
+    def test_sync_only_rewrites_the_moved_team(self):
+        pete_id = Employee.find_first(name='Pete').employee_id
+        path = EmployeePath.query.get(pete_id).path
+        # a marker on the path of Pete, who is outside the moved team, which a rewrite would drop
+        EmployeePath.query.filter_by(employee_id=pete_id).update({'path': path + PATH_SEPARATOR})
+        db.session.commit()
+        apply_operations([{'action': 'add', 'name': 'Jane', 'supervisor': 'Barbara'},
+                          {'action': 'move', 'name': 'Barbara', 'supervisor': 'Jonas'}])
+        self.assertEqual(EmployeePath.query.get(pete_id).path, path + PATH_SEPARATOR)
+        self.assertListEqual(self.storage.descendants('Barbara'), ['Jane'])
+
+        apply_operations([{'action': 'move', 'name': 'Nick', 'supervisor': 'Barbara'}])
+        self.assertNotEqual(EmployeePath.query.get(pete_id).path, path + PATH_SEPARATOR)
+        self.assertListEqual(self.storage.ancestors('Pete'), ['Nick', 'Barbara', 'Jonas'])
+
+
+class TestSnapshotStorage(StorageTestMixin, BaseTestCase):
+    strategy = 'snapshot'
+
+
+class TestUnknownStorage(BaseTestCase):
+
+    def test_unknown_storage_fails(self):
+        default_strategy = self.app.config['HIERARCHY_STORAGE']
+        self.app.config['HIERARCHY_STORAGE'] = 'linked_list'
+        try:
+            with self.assertRaisesRegex(ValueError, 'Unknown HIERARCHY_STORAGE'):
+                get_storage()
+        finally:
+            self.app.config['HIERARCHY_STORAGE'] = default_strategy
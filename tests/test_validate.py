@@ -1,6 +1,7 @@
 import unittest
 import uuid
-from helpers.validate import validate_json, validate_uuid, check_json_contains_loop
+from helpers.validate import validate_json, validate_uuid, check_json_contains_loop, decode_hierarchy, \
+    check_hierarchy_structure, strip_names
 
 
 class TestValidateUUID(unittest.TestCase):
@@ -91,5 +92,103 @@ class TestCheckJsonContainsLoop(unittest.TestCase):
         self.assertListEqual(duplicates, [])
 
 
+class TestDecodeHierarchy(unittest.TestCase):
+
+    def test_decode_hierarchy_gets_dict_and_duplicates(self):
+        with_loop = b"""
+            {
+                "Pete": "Nick",
+                "Barbara": "Nick",
+                "Nick": "Sophie",
+                "Sophie": "Jonas",
+                "Barbara": "Sophie",
+                "Nick": "Dre"
+            }
+        """
+        hierarchy_dict, duplicates = decode_hierarchy(with_loop)
+        self.assertListEqual(duplicates, ['Barbara', 'Nick'])
+        self.assertDictEqual(hierarchy_dict, {"Pete": "Nick", "Barbara": "Sophie", "Nick": "Dre", "Sophie": "Jonas"})
+
+    def test_decode_hierarchy_no_duplicates(self):
+        hierarchy_dict, duplicates = decode_hierarchy('{"Pete": "Nick", "Nick": "Sophie"}')
+        self.assertDictEqual(hierarchy_dict, {"Pete": "Nick", "Nick": "Sophie"})
+        self.assertListEqual(duplicates, [])
+
+    def test_decode_hierarchy_invalid_json(self):
+        self.assertEqual(decode_hierarchy(b"just a string"), (False, []))
+        self.assertEqual(decode_hierarchy(6789), (False, []))
+        self.assertEqual(decode_hierarchy(b"[5, 2, 2]"), (False, []))
+        self.assertEqual(decode_hierarchy(b"{'color': 'white'}"), (False, []))
+
+
+class TestStripNames(unittest.TestCase):
+
+    def test_strip_names(self):
+        hierarchy, duplicates = strip_names({" Pete ": "Nick", "Nick": " Sophie", "Jane": 5})
+        self.assertDictEqual(hierarchy, {"Pete": "Nick", "Nick": "Sophie", "Jane": 5})
+        self.assertListEqual(duplicates, [])
+        self.assertListEqual(list(strip_names({"   ": "Nick"})[0]), [""])
+
+    def test_strip_names_without_whitespace_keeps_the_dictionary(self):
+        hierarchy = {"Pete": "Nick", "Nick": "Sophie"}
+        self.assertIs(strip_names(hierarchy)[0], hierarchy)
+
+    def test_strip_names_gets_the_same_employee_twice(self):
+        hierarchy, duplicates = strip_names({"Pete": "Nick", "Pete ": "Sophie"})
+        self.assertDictEqual(hierarchy, {"Pete": "Sophie"})
+        self.assertListEqual(duplicates, ["Pete"])
+
+
+class TestCheckHierarchyStructure(unittest.TestCase):
+
+    def test_check_hierarchy_structure_valid_hierarchy(self):
+        structure = check_hierarchy_structure({"Pete": "Nick", "Barbara": "Nick", "Nick": "Sophie"})
+        self.assertDictEqual(structure, {'invalid': [], 'empty': [], 'self_supervised': [], 'cycles': [],
+                                         'roots': ['Sophie']})
+
+    def test_check_hierarchy_structure_multiple_roots(self):
+        structure = check_hierarchy_structure({"Pete": "Nick", "Nick": "Sophie", "Jane": "Reenah", "Dre": "Sophie"})
+        self.assertListEqual(structure['roots'], ['Sophie', 'Reenah'])
+        self.assertListEqual(structure['cycles'], [])
+
+    def test_check_hierarchy_structure_cycles(self):
+        structure = check_hierarchy_structure({
+            "A": "B",
+            "B": "A",
+            "Pete": "Nick",
+            "Nick": "Sophie",
+            "Sophie": "Dre",
+            "Dre": "Nick",
+            "Jane": "Pete",
+            "Jonas": "CEO"
+        })
+        self.assertListEqual(structure['cycles'], [['A', 'B'], ['Nick', 'Sophie', 'Dre']])
+        self.assertListEqual(structure['roots'], ['CEO'])
+
+    def test_check_hierarchy_structure_self_supervised(self):
+        structure = check_hierarchy_structure({"A": "A", "B": "A", "C": "D"})
+        self.assertListEqual(structure['self_supervised'], ['A'])
+        self.assertListEqual(structure['cycles'], [])
+        self.assertListEqual(structure['roots'], ['D'])
+
+    def test_check_hierarchy_structure_invalid_supervisor(self):
+        structure = check_hierarchy_structure({"A": 5, "B": "A", "C": {"D": "E"}, "F": None})
+        self.assertListEqual(structure['invalid'], ['A', 'C', 'F'])
+        self.assertListEqual(structure['roots'], [])
+
+    def test_check_hierarchy_structure_empty_names(self):
+        structure = check_hierarchy_structure({"": "Nick", "Pete": "", "Nick": "Sophie"})
+        self.assertListEqual(structure['empty'], ['', 'Pete'])
+        self.assertListEqual(structure['roots'], ['Sophie'])
+
+    def test_check_hierarchy_structure_long_chain(self):
+        chain = {f"E{i}": f"E{i + 1}" for i in range(100000)}
+        self.assertListEqual(check_hierarchy_structure(chain)['roots'], ['E100000'])
+        chain["E100000"] = "E0"
+        cycles = check_hierarchy_structure(chain)['cycles']
+        self.assertEqual(len(cycles), 1)
+        self.assertEqual(len(cycles[0]), 100001)
+
+
 if __name__ == '__main__':
     unittest.main()
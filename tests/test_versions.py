@@ -0,0 +1,79 @@
+from datetime import timedelta
+from unittest import mock
+from sqlalchemy.exc import OperationalError
+from tests.base_test import BaseTestCase
+from hierarchy.operations import apply_operations, rebalance, restructure_hierarchy
+from hierarchy.versions import current_version, resolve_version, VersionStorage
+from models.employee import Employee
+from models.hierarchy_version import EmployeeVersion, HierarchyVersion
+from models.model_mixin import db
+
+single_root_json = {
+    "Pete": "Nick",
+    "Barbara": "Nick",
+    "Nick": "Sophie",
+    "Sophie": "Jonas"
+}
+
+
+class TestVersions(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        _, self.first_version = restructure_hierarchy(single_root_json)
+
+    def test_every_change_is_a_version(self):
+        self.assertEqual(current_version(), self.first_version)
+        self.assertEqual(EmployeeVersion.query.count(), 5)
+        second_version = apply_operations([{'action': 'add', 'name': 'Jane', 'supervisor': 'Pete'}])
+        self.assertGreater(second_version, self.first_version)
+        self.assertEqual(current_version(), second_version)
+
+    def test_history_grows_with_the_change(self):
+        # moving Nick moves everyone under him, but only his own supervisor changes
+        apply_operations([{'action': 'move', 'name': 'Nick', 'supervisor': 'Jonas'}])
+        self.assertEqual(EmployeeVersion.query.count(), 6)
+
+        # renumbering the lft and rgt values doesn't change the hierarchy
+        rebalance(gap=1)
+        db.session.commit()
+        _, version_id = restructure_hierarchy(dict(single_root_json, Nick='Jonas'))
+        self.assertIsNotNone(version_id)
+        self.assertEqual(EmployeeVersion.query.count(), 6)
+
+    def test_upload_is_not_saved_without_its_version(self):
+        stored = Employee.stored_hierarchy()
+        failing_storage = mock.Mock()
+        failing_storage.sync.side_effect = OperationalError('sync', {}, Exception('locked'))
+        with mock.patch('hierarchy.operations.get_storage', return_value=failing_storage):
+            # a single added employee is written in place, and a new organization replaces the whole table
+            for hierarchy_dict in (dict(single_root_json, Jane='Pete'), {'Ham': 'Peter', 'Jam': 'Peter'}):
+                _, version_id = restructure_hierarchy(hierarchy_dict)
+                self.assertIsNone(version_id)
+                self.assertDictEqual(Employee.stored_hierarchy(), stored)
+                self.assertEqual(current_version(), self.first_version)
+                self.assertEqual(EmployeeVersion.query.count(), 5)
+
+    def test_reads_as_of_a_version(self):
+        second_version = apply_operations([
+            {'action': 'move', 'name': 'Barbara', 'supervisor': 'Jonas'},
+            {'action': 'remove', 'name': 'Nick'}
+        ])
+        first, second = VersionStorage(self.first_version), VersionStorage(second_version)
+        self.assertListEqual(first.ancestors('Pete'), ['Nick', 'Sophie', 'Jonas'])
+        self.assertListEqual(second.ancestors('Pete'), ['Sophie', 'Jonas'])
+        self.assertListEqual(first.ancestors('Pete', 1), ['Nick'])
+        self.assertListEqual(first.descendants('Sophie'), ['Nick', 'Barbara', 'Pete'])
+        self.assertListEqual(second.descendants('Jonas'), ['Barbara', 'Sophie', 'Pete'])
+        self.assertIsNone(second.ancestors('Nick'))
+        self.assertIsNone(first.ancestors('Jane'))
+
+    def test_resolve_version(self):
+        self.assertEqual(resolve_version(str(self.first_version)), self.first_version)
+        self.assertIsNone(resolve_version('100'))
+        created_at = HierarchyVersion.query.get(self.first_version).created_at
+        self.assertEqual(resolve_version(created_at.isoformat()), self.first_version)
+        self.assertEqual(resolve_version((created_at + timedelta(days=1)).isoformat() + '+00:00'), self.first_version)
+        self.assertIsNone(resolve_version((created_at - timedelta(days=1)).isoformat()))
+        with self.assertRaises(ValueError):
+            resolve_version('yesterday')